@@ -4,12 +4,20 @@ Permet de spécifier le fichier Python et le venv à utiliser
 """
 import streamlit as st
 import os
-import sys
+import queue
+import uuid
 
 # Import des modules
-from src.executeur import executer_script
 from src.ai_debugger import AIDebugger
 from src.file_patcher import FilePatcher
+from src.job_queue import JobQueue, EN_ATTENTE
+from src.worker import DebugWorker, ETAPES
+
+
+# Nombre de lignes de log affichées : le rendu ne dépend pas de la taille du log
+LIGNES_AFFICHEES = 300
+# Nombre maximal de débogages simultanés, toutes sessions confondues
+MAX_JOBS = int(os.environ.get("AGENT_MAX_JOBS", "2"))
 
 
 # ═══════════════════════════════════════════════════════════
@@ -33,20 +41,38 @@ if 'venv_python' not in st.session_state:
     st.session_state.venv_python = r"venv\Scripts\python.exe"
 if 'backup_cree' not in st.session_state:
     st.session_state.backup_cree = False
+if 'fork_server' not in st.session_state:
+    st.session_state.fork_server = False
+if 'multi_fault' not in st.session_state:
+    st.session_state.multi_fault = False
+if 'worker' not in st.session_state:
+    st.session_state.worker = None
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+
+
+@st.cache_resource
+def obtenir_debugger() -> AIDebugger:
+    """Agent partagé entre les itérations et les sessions (client HTTP, prompts, cache)."""
+    return AIDebugger()
 
 
-def lire_fichier(chemin: str) -> str:
-    """Lit le contenu d'un fichier."""
-    with open(chemin, 'r', encoding='utf-8') as f:
-        return f.read()
+@st.cache_resource
+def obtenir_file() -> JobQueue:
+    """File de jobs partagée par toutes les sessions (plafond global MAX_JOBS)."""
+    return JobQueue(max_concurrent=MAX_JOBS)
 
 
 def demarrer_debogage():
-    """Démarre le processus de débogage."""
+    """Soumet le processus de débogage à la file de jobs partagée."""
     st.session_state.en_cours = True
     st.session_state.iteration = 0
     st.session_state.total_corrections = 0
     st.session_state.backup_cree = False
+    st.session_state.attente_confirmation = False
+    st.session_state.operations_en_attente = None
     st.session_state.logs = []
     st.session_state.logs.append("=" * 70)
     st.session_state.logs.append("🤖 AGENT DE DÉBOGAGE PYTHON")
@@ -63,116 +89,58 @@ def demarrer_debogage():
     st.session_state.logs.append(f"📝 Script: {st.session_state.script_path}")
     st.session_state.logs.append(f"🐍 Python: {st.session_state.venv_python}")
     st.session_state.logs.append("=" * 70)
-
-
-def continuer_iteration():
-    """Continue une nouvelle itération après confirmation."""
-    st.session_state.attente_confirmation = False
-    st.session_state.operations_en_attente = None
+    
+    worker = DebugWorker(
+        st.session_state.script_path,
+        st.session_state.venv_python,
+        debugger_factory=obtenir_debugger,
+        fork_server=st.session_state.fork_server,
+        multi_fault=st.session_state.multi_fault
+    )
+    job = obtenir_file().soumettre(st.session_state.session_id, worker)
+    st.session_state.worker = worker
+    st.session_state.job_id = job.id
+    st.session_state.logs.append(f"📥 Job #{job.id} soumis à la file d'attente")
 
 
 def annuler_debogage():
     """Annule le débogage en cours."""
+    if st.session_state.job_id is not None:
+        obtenir_file().annuler(st.session_state.job_id)
     st.session_state.logs.append("\n❌ Débogage annulé par l'utilisateur")
     st.session_state.en_cours = False
     st.session_state.attente_confirmation = False
 
 
-def executer_iteration():
-    """Exécute une itération de débogage."""
-    script_path = st.session_state.script_path
-    venv_python = st.session_state.venv_python
-    
-    st.session_state.iteration += 1
-    
-    # Exécution silencieuse
-    resultat = executer_script(script_path, venv_python)
-    
-    # SUCCESS
-    if not resultat['stderr']:
-        st.session_state.logs.append("\n" + "=" * 70)
-        st.session_state.logs.append("✅ SUCCESS ! Le script fonctionne sans erreur !")
-        st.session_state.logs.append(f"📊 Corrections appliquées: {st.session_state.total_corrections}")
-        st.session_state.logs.append("=" * 70)
-        st.session_state.en_cours = False
-        return
-    
-    # Analyse IA silencieuse
-    code_source = lire_fichier(script_path)
-    
-    try:
-        debugger = AIDebugger()
-        corrections = debugger.analyze_error(
-            code=code_source,
-            error=resultat['stderr'],
-            filename=os.path.basename(script_path)
-        )
-    except Exception as e:
-        st.session_state.logs.append(f"\n❌ Erreur API: {e}")
-        st.session_state.en_cours = False
-        return
-    
-    # Affichage correction (format simplifié)
-    if 'corrections' in corrections and corrections['corrections']:
-        num_correction = st.session_state.total_corrections + 1
-        st.session_state.logs.append(f"\nCorrection {num_correction} :")
-        
-        for corr in corrections['corrections']:
-            st.session_state.logs.append(f"  📍 Ligne: {corr.get('ligne')}")
-            st.session_state.logs.append(f"  🔴 Type: {corrections.get('type_erreur', 'N/A')}")
-            st.session_state.logs.append(f"  ❌ Code actuel: {corr.get('code_original', 'N/A')}")
-            st.session_state.logs.append(f"  ✅ Code corrigé: {corr.get('code_corrige', 'N/A')}")
-    else:
-        st.session_state.logs.append("\n⚠️  Aucune correction proposée")
-        st.session_state.en_cours = False
-        return
-    
-    # Préparation des opérations
-    operations = []
-    for corr in corrections['corrections']:
-        ligne = corr.get('ligne')
-        code_corrige = corr.get('code_corrige')
-        
-        if ligne and code_corrige:
-            operations.append({
-                'action': 'replace',
-                'line': ligne,
-                'content': code_corrige.strip()
-            })
-    
-    if not operations:
-        st.session_state.logs.append("  ⚠️ Aucune opération valide")
-        st.session_state.en_cours = False
-        return
-    
-    # Mettre en attente de confirmation
-    st.session_state.attente_confirmation = True
-    st.session_state.operations_en_attente = operations
-
-
 def appliquer_patch():
-    """Applique le patch après confirmation."""
-    operations = st.session_state.operations_en_attente
-    script_path = st.session_state.script_path
-    
-    patcher = FilePatcher()
-    # Ne pas créer de backup (déjà créé au début)
-    success = patcher.apply_patch(script_path, operations, create_backup=False)
-    
-    if not success:
-        st.session_state.logs.append("  ❌ Échec de l'application")
-        st.session_state.en_cours = False
-        st.session_state.attente_confirmation = False
-        return
-    
-    st.session_state.logs.append("  ✅ Appliqué")
-    st.session_state.total_corrections += 1
-    
-    # Réinitialiser et continuer
+    """Autorise le worker à appliquer le patch en attente."""
+    st.session_state.worker.confirmer(True)
     st.session_state.attente_confirmation = False
     st.session_state.operations_en_attente = None
 
 
+def recuperer_evenements():
+    """Transfère les nouveaux événements du worker dans la session."""
+    worker = st.session_state.worker
+    while True:
+        try:
+            evenement = worker.events.get_nowait()
+        except queue.Empty:
+            break
+        
+        if evenement['type'] == 'log':
+            st.session_state.logs.append(evenement['message'])
+        elif evenement['type'] == 'confirmation':
+            st.session_state.attente_confirmation = True
+            st.session_state.operations_en_attente = evenement['operations']
+        elif evenement['type'] == 'fin':
+            st.session_state.en_cours = False
+            st.session_state.attente_confirmation = False
+    
+    st.session_state.iteration = worker.iteration
+    st.session_state.total_corrections = worker.total_corrections
+
+
 # ═══════════════════════════════════════════════════════════
 # INTERFACE STREAMLIT
 # ═══════════════════════════════════════════════════════════
@@ -188,6 +156,31 @@ st.markdown("**Correction automatique d'erreurs avec boucle jusqu'à succès**")
 
 st.divider()
 
+# Mesures du dernier débogage de la session
+with st.sidebar:
+    st.subheader("📈 Temps par étape")
+    worker = st.session_state.worker
+    mesures = worker.tracer.resume() if worker is not None else []
+    if mesures:
+        st.dataframe(
+            [
+                {
+                    "Étape": m['etape'],
+                    "Appels": m['appels'],
+                    "Total (s)": m['total'],
+                    "p95 (ms)": round(m['p95'] * 1000, 1),
+                    "Tokens": m['tokens_entree'] + m['tokens_sortie'],
+                    "Cache": m['cache_hits']
+                }
+                for m in mesures
+            ],
+            hide_index=True
+        )
+        st.download_button("⬇️ Métriques Prometheus", worker.tracer.prometheus(),
+                           file_name="metriques.prom", mime="text/plain")
+    else:
+        st.caption("Aucune mesure pour l'instant")
+
 # Layout
 col1, col2 = st.columns([1, 2])
 
@@ -209,10 +202,26 @@ with col1:
         help="Chemin vers l'exécutable Python du virtual environment"
     )
     
+    fork_input = st.checkbox(
+        "⚡ Interpréteur pré-chauffé (fork-server)",
+        value=st.session_state.fork_server,
+        disabled=st.session_state.en_cours,
+        help="Réutilise un interpréteur ayant déjà importé les modules du script (Linux/macOS)"
+    )
+    
+    multi_input = st.checkbox(
+        "🧪 Mode multi-erreurs",
+        value=st.session_state.multi_fault,
+        disabled=st.session_state.en_cours,
+        help="Collecte toutes les erreurs d'une exécution et les corrige en une seule requête"
+    )
+    
     # Mise à jour des valeurs
     if not st.session_state.en_cours:
         st.session_state.script_path = script_input
         st.session_state.venv_python = venv_input
+        st.session_state.fork_server = fork_input
+        st.session_state.multi_fault = multi_input
     
     st.divider()
     
@@ -237,15 +246,54 @@ with col1:
         if st.button("🚀 Démarrer le Débogage", type="primary", disabled=(not script_exists or not venv_exists)):
             demarrer_debogage()
             st.rerun()
+    
+    # Vue d'ensemble de la file partagée
+    with st.expander(f"📋 File des jobs ({MAX_JOBS} simultanés max)"):
+        jobs = obtenir_file().apercu()
+        if jobs:
+            st.dataframe(
+                [
+                    {
+                        "Job": f"#{j['id']}" + (" (vous)" if j['session'] == st.session_state.session_id else ""),
+                        "Script": os.path.basename(j['script']),
+                        "Statut": j['statut'],
+                        "Itération": j['iteration'],
+                        "Durée (s)": j['duree']
+                    }
+                    for j in reversed(jobs)
+                ],
+                hide_index=True
+            )
+        else:
+            st.caption("Aucun job")
 
-with col2:
-    st.subheader("📊 Logs d'exécution")
+
+@st.fragment(run_every=0.5)
+def panneau_logs():
+    """Logs et progression, rafraîchis sans relancer toute la page."""
+    etait_en_cours = st.session_state.en_cours
+    if etait_en_cours and st.session_state.worker is not None:
+        recuperer_evenements()
+    
+    # Progression du job en cours
+    etat = obtenir_file().etat(st.session_state.job_id) if st.session_state.job_id else None
+    if st.session_state.en_cours and etat is not None:
+        if etat['statut'] == EN_ATTENTE:
+            st.caption(f"⏳ Job #{st.session_state.job_id} en attente "
+                       f"(position {etat['position']}, début estimé dans ~{etat['eta']:.0f}s)")
+            st.button("❌ Retirer de la file", key="dequeue_btn", on_click=annuler_debogage)
+        elif etat['etape']:
+            st.caption(f"🔁 Itération {etat['iteration']} — {ETAPES[etat['etape']]}... ({etat['duree']:.0f}s)")
     
-    # Affichage des logs
-    if st.session_state.logs:
+    # Affichage des logs (seulement les dernières lignes)
+    logs = st.session_state.logs
+    if logs:
+        masquees = len(logs) - LIGNES_AFFICHEES
+        if masquees > 0:
+            st.caption(f"… {masquees} ligne(s) précédente(s) masquée(s)")
         st.text_area(
             "Logs",
-            value="\n".join(st.session_state.logs),
+            value="\n".join(logs[-LIGNES_AFFICHEES:]),
             height=500,
             label_visibility="collapsed"
         )
@@ -253,22 +301,22 @@ with col2:
         st.info("👈 Configurez les paramètres et cliquez sur 'Démarrer le Débogage'")
     
     # Gestion du workflow
-    if st.session_state.en_cours:
-        if st.session_state.attente_confirmation:
-            # Afficher les boutons de confirmation
-            st.warning("⚠️ Confirmation requise pour appliquer les corrections")
-            col_yes, col_no = st.columns(2)
-            
-            with col_yes:
-                if st.button("✅ Oui, appliquer", type="primary", key="apply_btn"):
-                    appliquer_patch()
-                    st.rerun()
-            
-            with col_no:
-                if st.button("❌ Non, annuler", key="cancel_btn"):
-                    annuler_debogage()
-                    st.rerun()
-        else:
-            # Continuer automatiquement l'itération
-            executer_iteration()
-            st.rerun()
+    if st.session_state.en_cours and st.session_state.attente_confirmation:
+        # Afficher les boutons de confirmation
+        st.warning("⚠️ Confirmation requise pour appliquer les corrections")
+        col_yes, col_no = st.columns(2)
+        
+        with col_yes:
+            st.button("✅ Oui, appliquer", type="primary", key="apply_btn", on_click=appliquer_patch)
+        
+        with col_no:
+            st.button("❌ Non, annuler", key="cancel_btn", on_click=annuler_debogage)
+    
+    # Fin du débogage : relance complète pour réactiver la configuration
+    if etait_en_cours and not st.session_state.en_cours:
+        st.rerun()
+
+
+with col2:
+    st.subheader("📊 Logs d'exécution")
+    panneau_logs()
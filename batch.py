@@ -0,0 +1,262 @@
+"""
+Débogage en lot, sans interaction
+Lance la boucle de débogage sur de nombreux scripts (fichiers, dossiers, globs)
+avec une concurrence bornée (asyncio), des appels LLM limités en débit, et
+écrit un rapport JSON et un journal par script.
+
+Politiques d'application :
+    auto        les corrections sont appliquées au fichier
+    si-tests    appliquées puis annulées si la boucle échoue ou si --tests échoue
+    simulation  la boucle travaille sur une copie : le fichier n'est jamais modifié
+"""
+import argparse
+import asyncio
+import contextlib
+import difflib
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from main import main
+from src.ai_debugger import AIDebugger
+from src.analysis_cache import AnalysisCache
+from src.file_patcher import FilePatcher
+from src.llm_backends import creer_backend
+from src.sortie import SortieParThread
+from src.tracing import Tracer, utiliser_tracer
+
+
+POLITIQUES = ('auto', 'si-tests', 'simulation')
+# Dossiers ignorés lors du parcours récursif
+DOSSIERS_IGNORES = {'venv', '.venv', '__pycache__', 'backups', '.agent_cache', 'node_modules'}
+
+
+def collecter_scripts(motifs: list) -> list:
+    """Liste les scripts désignés par des fichiers, dossiers (récursif) ou globs."""
+    trouves = []
+    for motif in motifs:
+        if os.path.isdir(motif):
+            for racine, dossiers, fichiers in os.walk(motif):
+                dossiers[:] = sorted(d for d in dossiers if d not in DOSSIERS_IGNORES and not d.startswith('.'))
+                trouves += [os.path.join(racine, f) for f in sorted(fichiers)
+                            if f.endswith('.py') and not f.startswith('.')]
+        elif os.path.isfile(motif):
+            trouves.append(motif)
+        else:
+            trouves += sorted(f for f in glob.glob(motif, recursive=True) if f.endswith('.py'))
+
+    vus, scripts = set(), []
+    for chemin in trouves:
+        chemin = os.path.abspath(chemin)
+        if chemin not in vus:
+            vus.add(chemin)
+            scripts.append(chemin)
+    return scripts
+
+
+def nom_rapport(script: str) -> str:
+    """Nom de fichier unique dérivé du chemin relatif du script."""
+    relatif = os.path.relpath(script)
+    if relatif.startswith('..'):
+        relatif = script.lstrip(os.sep)
+    return relatif.replace(os.sep, '__').replace(':', '')
+
+
+def executer_tests(commande: str, script: str, timeout: float) -> dict:
+    """Exécute la commande de tests ({script} remplacé par le chemin du script)."""
+    debut = time.perf_counter()
+    try:
+        processus = subprocess.run(commande.format(script=script), shell=True, capture_output=True,
+                                   text=True, timeout=timeout)
+        returncode, sortie = processus.returncode, processus.stdout + processus.stderr
+    except subprocess.TimeoutExpired:
+        returncode, sortie = None, f"Timeout après {timeout}s"
+    return {
+        'commande': commande,
+        'returncode': returncode,
+        'duree': round(time.perf_counter() - debut, 3),
+        'sortie': sortie[-2000:]
+    }
+
+
+def deboguer_script(script: str, options, backend, cache: AnalysisCache, sortie: SortieParThread) -> dict:
+    """Débogue un script selon la politique choisie (appelé dans un thread).
+
+    Returns:
+        dict: Rapport du script (aussi écrit dans le dossier des rapports)
+    """
+    nom = nom_rapport(script)
+    journal = os.path.join(options.rapports, f"{nom}.log")
+    with open(script, 'r', encoding='utf-8') as f:
+        original = f.read()
+
+    # En simulation, la boucle corrige une copie voisine (mêmes imports relatifs)
+    cible = script
+    if options.politique == 'simulation':
+        cible = os.path.join(os.path.dirname(script), f".simulation_{os.path.basename(script)}")
+        with open(cible, 'w', encoding='utf-8') as f:
+            f.write(original)
+
+    patcher = FilePatcher()
+    revision_initiale = patcher.store.snapshot(script)['revision']
+    mesures = {}
+    tracer = Tracer()
+    erreur = None
+    debugger = None
+    debut = time.perf_counter()
+    with open(journal, 'w', encoding='utf-8') as flux, sortie.capturer(flux), utiliser_tracer(tracer):
+        try:
+            debugger = AIDebugger(cache=cache, use_cache=not options.sans_cache, backend=backend)
+            succes = main(cible, auto_apply=True, multi_fault=options.multi, debugger=debugger,
+                          timeout=options.timeout, max_iterations=options.max_iterations,
+                          mesures=mesures, conversation=options.conversation,
+                          max_secondes=options.max_duree, budget_tokens=options.budget_tokens,
+                          on_line=None)
+        except Exception as e:
+            print(f"❌ Exception: {e}")
+            erreur = str(e)
+            succes = False
+
+        with open(cible, 'r', encoding='utf-8') as f:
+            final = f.read()
+
+        tests = None
+        if options.politique == 'si-tests' and succes and options.tests:
+            tests = executer_tests(options.tests, script, options.timeout_tests)
+            print(f"🧪 Tests: code retour {tests['returncode']}")
+
+        applique = final != original
+        if options.politique == 'simulation':
+            os.remove(cible)
+            applique = False
+        elif options.politique == 'si-tests' and applique and not (succes and (tests is None or tests['returncode'] == 0)):
+            print("↩️  Corrections annulées (boucle ou tests en échec)")
+            patcher.restore_backup(script, revision_initiale)
+            applique = False
+
+    diff = "".join(difflib.unified_diff(
+        original.splitlines(keepends=True), final.splitlines(keepends=True),
+        fromfile=f"a/{os.path.basename(script)}", tofile=f"b/{os.path.basename(script)}"
+    ))
+    rapport = {
+        'script': script,
+        'politique': options.politique,
+        'succes': succes,
+        'applique': applique,
+        'iterations': mesures.get('iterations', 0),
+        'corrections': mesures.get('corrections', 0),
+        'escalades': mesures.get('escalades', []),
+        'duree': round(time.perf_counter() - debut, 3),
+        'tokens_entree': debugger.tokens_entree if debugger else 0,
+        'tokens_sortie': debugger.tokens_sortie if debugger else 0,
+        'etapes': tracer.resume(),
+        'tests': tests,
+        'erreur': erreur,
+        'diff': diff,
+        'journal': journal
+    }
+    with open(os.path.join(options.rapports, f"{nom}.json"), 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    return rapport
+
+
+async def executer_lot(scripts: list, options, backend, cache: AnalysisCache, sortie: SortieParThread) -> list:
+    """Débogue les scripts avec au plus `options.jobs` boucles simultanées."""
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=options.jobs))
+    places = asyncio.Semaphore(options.jobs)
+    termines = 0
+
+    async def traiter(script: str) -> dict:
+        nonlocal termines
+        async with places:
+            rapport = await asyncio.to_thread(deboguer_script, script, options, backend, cache, sortie)
+        termines += 1
+        statut = "✅" if rapport['succes'] else "❌"
+        applique = " (appliqué)" if rapport['applique'] else ""
+        print(f"[{termines}/{len(scripts)}] {statut} {os.path.relpath(script)} - "
+              f"{rapport['iterations']} itération(s), {rapport['duree']:.1f}s{applique}")
+        return rapport
+
+    return await asyncio.gather(*(traiter(s) for s in scripts))
+
+
+def synthese(rapports: list, duree: float) -> dict:
+    """Agrégats du lot."""
+    return {
+        'scripts': len(rapports),
+        'succes': sum(r['succes'] for r in rapports),
+        'appliques': sum(r['applique'] for r in rapports),
+        'echecs': [r['script'] for r in rapports if not r['succes']],
+        'iterations': sum(r['iterations'] for r in rapports),
+        'tokens_entree': sum(r['tokens_entree'] for r in rapports),
+        'tokens_sortie': sum(r['tokens_sortie'] for r in rapports),
+        'duree': round(duree, 3)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débogage en lot, sans interaction")
+    parser.add_argument("chemins", nargs="+", help="Scripts, dossiers (récursif) ou globs ('notebooks/**/*.py')")
+    parser.add_argument("--politique", choices=POLITIQUES, default="simulation",
+                        help="auto: applique ; si-tests: applique si la boucle et --tests réussissent ; "
+                             "simulation: ne modifie aucun fichier (défaut)")
+    parser.add_argument("--tests", default=None, metavar="COMMANDE",
+                        help="Commande de validation pour si-tests ({script} = chemin du script)")
+    parser.add_argument("--timeout-tests", type=float, default=600, metavar="S",
+                        help="Timeout de la commande de tests (défaut: 600)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 4, metavar="N",
+                        help="Scripts débogués simultanément (défaut: nombre de CPU)")
+    parser.add_argument("--llm-concurrent", type=int, default=None, metavar="N",
+                        help="Requêtes LLM simultanées (Groq défaut: 4)")
+    parser.add_argument("--llm-par-minute", type=float, default=None, metavar="N",
+                        help="Requêtes LLM maximales par minute (Groq défaut: 30)")
+    parser.add_argument("--llm-tokens-par-minute", type=float, default=None, metavar="N",
+                        help="Tokens LLM maximaux par minute (Groq défaut: 6000)")
+    parser.add_argument("--rapports", default="rapports_lot", metavar="DOSSIER",
+                        help="Dossier des rapports JSON et journaux (défaut: rapports_lot)")
+    parser.add_argument("--max-iterations", type=int, default=10, metavar="N",
+                        help="Itérations maximales par script (défaut: 10)")
+    parser.add_argument("--max-duree", type=float, default=None, metavar="S",
+                        help="Durée maximale par script en secondes")
+    parser.add_argument("--budget-tokens", type=int, default=None, metavar="N",
+                        help="Tokens maximaux par script")
+    parser.add_argument("--timeout", type=float, default=None, metavar="S",
+                        help="Timeout d'exécution des scripts (défaut: adaptatif)")
+    parser.add_argument("--multi", action="store_true", help="Mode multi-erreurs")
+    parser.add_argument("--conversation", action="store_true", help="Mode conversationnel (diffs)")
+    parser.add_argument("--sans-cache", action="store_true", help="Désactive le cache des analyses")
+    args = parser.parse_args()
+
+    scripts = collecter_scripts(args.chemins)
+    if not scripts:
+        print("⚠️  Aucun script trouvé")
+        sys.exit(1)
+    os.makedirs(args.rapports, exist_ok=True)
+
+    # Un seul backend (et donc une seule file de requêtes) pour tous les scripts
+    backend = creer_backend(requetes_par_minute=args.llm_par_minute, tokens_par_minute=args.llm_tokens_par_minute,
+                            max_concurrent=args.llm_concurrent)
+    cache = AnalysisCache()
+    print(f"🗂️  Lot: {len(scripts)} script(s), politique {args.politique}, "
+          f"{args.jobs} en parallèle, backend {backend.model}")
+
+    sortie = SortieParThread(sys.stdout)
+    debut = time.perf_counter()
+    with contextlib.redirect_stdout(sortie):
+        rapports = asyncio.run(executer_lot(scripts, args, backend, cache, sortie))
+    resume = synthese(rapports, time.perf_counter() - debut)
+
+    chemin_resume = os.path.join(args.rapports, "resume.json")
+    with open(chemin_resume, 'w', encoding='utf-8') as f:
+        json.dump({'synthese': resume, 'rapports': [r['script'] for r in rapports]}, f,
+                  ensure_ascii=False, indent=2)
+
+    print("=" * 70)
+    print(f"📊 {resume['succes']}/{resume['scripts']} script(s) corrigé(s), {resume['appliques']} appliqué(s) "
+          f"• {resume['iterations']} itérations • {resume['duree']:.1f}s")
+    print(f"💾 Rapports: {args.rapports}/ (synthèse: {chemin_resume})")
+    sys.exit(0 if not resume['echecs'] else 1)
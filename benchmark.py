@@ -0,0 +1,221 @@
+"""
+Benchmark de bout en bout de la boucle de débogage (sans réseau)
+Exécute main() en mode non interactif sur scripts/ et sur un corpus généré,
+avec le répondeur local (ou une cassette) à la place de l'API Groq.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from main import main
+from src.ai_debugger import AIDebugger
+from src.llm_backends import CassetteBackend, RuleBasedBackend
+
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
+
+# Bugs injectés dans le corpus : (instructions avant l'appel, appel fautif)
+_BUGS = [
+    ("diviseur = 0", "valeur = total / diviseur"),
+    ("compteur = 3", "valeur = compteurr + 1"),
+    ("config = {'nom': 'demo'}", "valeur = config['port']"),
+    ("elements = [1, 2, 3]", "valeur = elements.push(4)"),
+    ("age = 30", "valeur = 'Age : ' + age"),
+    ("", "import module_absent_du_benchmark"),
+]
+
+
+def generer_corpus(dossier: str, nombre: int, graine: int = 0) -> list:
+    """Génère des scripts contenant de 1 à 3 bugs indépendants.
+
+    Returns:
+        list: Chemins des scripts générés
+    """
+    aleatoire = random.Random(graine)
+    chemins = []
+    for i in range(1, nombre + 1):
+        lignes = [f'"""Script généré {i} (benchmark)"""', "", "total = 100", ""]
+        for j, (preparation, appel) in enumerate(aleatoire.sample(_BUGS, aleatoire.randint(1, 3)), 1):
+            lignes += [f"def etape_{j}():"]
+            if preparation:
+                lignes.append(f"    {preparation}")
+            lignes += [f"    {appel}",
+                       "    return 'ok'" if appel.startswith("import") else "    return valeur",
+                       "", f"print(etape_{j}())", ""]
+        chemin = os.path.join(dossier, f"genere_{i:03d}.py")
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lignes))
+        chemins.append(chemin)
+    return chemins
+
+
+def percentile(valeurs: list, q: float) -> float:
+    """Percentile (plus proche rang) d'une liste de valeurs."""
+    if not valeurs:
+        return 0.0
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(q * (len(valeurs) - 1))))]
+
+
+def executer_cas(script: str, espace: str, backend, max_iterations: int, multi_fault: bool,
+                 verbose: bool, conversation: bool = False) -> dict:
+    """Débogue une copie du script et retourne ses mesures."""
+    copie = os.path.join(espace, os.path.basename(script))
+    shutil.copy2(script, copie)
+
+    mesures = {}
+    sortie = io.StringIO()
+    debut = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else sortie):
+        debugger = AIDebugger(use_cache=False, backend=backend)
+        try:
+            succes = main(copie, auto_apply=True, multi_fault=multi_fault, debugger=debugger,
+                          max_iterations=max_iterations, mesures=mesures, conversation=conversation)
+        except Exception as e:
+            print(f"❌ Exception: {e}")
+            succes = False
+    duree = time.perf_counter() - debut
+
+    return {
+        'script': os.path.basename(script),
+        'succes': succes,
+        'iterations': mesures.get('iterations', 0),
+        'corrections': mesures.get('corrections', 0),
+        'duree': round(duree, 3),
+        'etapes': {nom: [round(d, 4) for d in durees] for nom, durees in mesures.get('etapes', {}).items()},
+        'latences': [round(l, 4) for l in debugger.latences],
+        'tokens_entree': debugger.tokens_entree,
+        'tokens_sortie': debugger.tokens_sortie
+    }
+
+
+def synthese(cas: list) -> dict:
+    """Agrégats du benchmark (taux de succès, itérations, p50/p95, tokens)."""
+    latences = [l for c in cas for l in c['latences']]
+    etapes = {}
+    for c in cas:
+        for nom, durees in c['etapes'].items():
+            etapes.setdefault(nom, []).extend(durees)
+    return {
+        'scripts': len(cas),
+        'taux_succes': round(sum(c['succes'] for c in cas) / len(cas), 3) if cas else 0.0,
+        'iterations': sum(c['iterations'] for c in cas),
+        'duree_totale': round(sum(c['duree'] for c in cas), 3),
+        'tokens_entree': sum(c['tokens_entree'] for c in cas),
+        'tokens_sortie': sum(c['tokens_sortie'] for c in cas),
+        'latence_p50': round(percentile(latences, 0.5), 4),
+        'latence_p95': round(percentile(latences, 0.95), 4),
+        'etapes': {
+            nom: {'total': round(sum(d), 3), 'p50': round(percentile(d, 0.5), 4),
+                  'p95': round(percentile(d, 0.95), 4)}
+            for nom, d in etapes.items()
+        }
+    }
+
+
+def afficher_rapport(cas: list, resume: dict):
+    """Affiche le tableau par script puis la synthèse."""
+    print("=" * 86)
+    print(f"{'Script':<24}{'OK':>4}{'Itér.':>7}{'Total (s)':>11}{'Exéc. (s)':>11}"
+          f"{'Analyse (s)':>13}{'Patch (s)':>11}{'Tokens':>9}")
+    print("-" * 86)
+    for c in cas:
+        print(f"{c['script']:<24}{'✅' if c['succes'] else '❌':>3}{c['iterations']:>7}{c['duree']:>11.2f}"
+              f"{sum(c['etapes'].get('execution', [])):>11.2f}{sum(c['etapes'].get('analyse', [])):>13.2f}"
+              f"{sum(c['etapes'].get('patch', [])):>11.3f}{c['tokens_entree'] + c['tokens_sortie']:>9}")
+    print("=" * 86)
+    print(f"📊 Succès: {resume['taux_succes']:.0%} • Itérations: {resume['iterations']} • "
+          f"Durée: {resume['duree_totale']:.2f}s • Tokens: {resume['tokens_entree']} + {resume['tokens_sortie']}")
+    print(f"⏱️  Latence LLM: p50 {resume['latence_p50'] * 1000:.1f} ms • p95 {resume['latence_p95'] * 1000:.1f} ms")
+    for nom, valeurs in resume['etapes'].items():
+        print(f"   • {nom:<10} total {valeurs['total']:.2f}s • p50 {valeurs['p50'] * 1000:.1f} ms "
+              f"• p95 {valeurs['p95'] * 1000:.1f} ms")
+
+
+def regressions(resume: dict, reference: dict, tolerance: float) -> list:
+    """Compare la synthèse à une référence et liste les régressions."""
+    problemes = []
+    if resume['taux_succes'] < reference['taux_succes']:
+        problemes.append(f"taux de succès {resume['taux_succes']:.0%} < {reference['taux_succes']:.0%}")
+    if resume['iterations'] > reference['iterations']:
+        problemes.append(f"itérations {resume['iterations']} > {reference['iterations']}")
+    for nom, valeurs in resume['etapes'].items():
+        p95_reference = reference.get('etapes', {}).get(nom, {}).get('p95')
+        if p95_reference and valeurs['p95'] > p95_reference * (1 + tolerance):
+            problemes.append(f"p95 {nom} {valeurs['p95'] * 1000:.1f} ms > "
+                             f"{p95_reference * 1000:.1f} ms (+{tolerance:.0%})")
+    return problemes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la boucle de débogage (hors ligne)")
+    parser.add_argument("--corpus", type=int, default=10, metavar="N",
+                        help="Nombre de scripts buggés générés en plus de scripts/ (défaut: 10)")
+    parser.add_argument("--graine", type=int, default=0, help="Graine du corpus généré")
+    parser.add_argument("--latence", type=float, default=0.0, metavar="S",
+                        help="Latence simulée du répondeur local par requête")
+    parser.add_argument("--cassette", default=None, metavar="FICHIER",
+                        help="Rejoue les réponses d'une cassette (enregistre les manquantes "
+                             "avec le répondeur local)")
+    parser.add_argument("--multi", action="store_true", help="Mode multi-erreurs")
+    parser.add_argument("--conversation", action="store_true", help="Mode conversationnel (diffs)")
+    parser.add_argument("--max-iterations", type=int, default=10,
+                        help="Itérations maximales par script (défaut: 10)")
+    parser.add_argument("--json", default=None, metavar="FICHIER", help="Écrit le rapport JSON")
+    parser.add_argument("--reference", default=None, metavar="FICHIER",
+                        help="Rapport JSON de référence : code de sortie 1 en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Dégradation tolérée des p95 par rapport à la référence (défaut: 0.5)")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie de main()")
+    args = parser.parse_args()
+
+    backend = RuleBasedBackend(latence=args.latence)
+    if args.cassette:
+        backend = CassetteBackend(os.path.abspath(args.cassette), backend)
+    rapport_json = os.path.abspath(args.json) if args.json else None
+    reference = os.path.abspath(args.reference) if args.reference else None
+
+    # Espace de travail isolé : copies des scripts, backups et historiques
+    espace = tempfile.mkdtemp(prefix='agent_bench_')
+    dossier_initial = os.getcwd()
+    try:
+        os.chdir(espace)
+        scripts = sorted(
+            os.path.join(SCRIPTS_DIR, nom) for nom in os.listdir(SCRIPTS_DIR) if nom.endswith('.py')
+        )
+        scripts += generer_corpus(espace, args.corpus, args.graine)
+        travail = os.path.join(espace, 'travail')
+        os.makedirs(travail)
+
+        print(f"🏁 Benchmark: {len(scripts)} script(s), backend {backend.model}")
+        cas = [executer_cas(s, travail, backend, args.max_iterations, args.multi, args.verbose,
+                            args.conversation)
+               for s in scripts]
+    finally:
+        os.chdir(dossier_initial)
+        shutil.rmtree(espace, ignore_errors=True)
+
+    resume = synthese(cas)
+    afficher_rapport(cas, resume)
+
+    if rapport_json:
+        with open(rapport_json, 'w', encoding='utf-8') as f:
+            json.dump({'synthese': resume, 'cas': cas}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Rapport: {rapport_json}")
+
+    if reference:
+        with open(reference, 'r', encoding='utf-8') as f:
+            problemes = regressions(resume, json.load(f)['synthese'], args.tolerance)
+        if problemes:
+            print("\n❌ Régressions détectées:")
+            for probleme in problemes:
+                print(f"   • {probleme}")
+            sys.exit(1)
+        print("\n✅ Aucune régression par rapport à la référence")
@@ -2,22 +2,63 @@
 Agent de Débogage Python - Point d'entrée principal
 Workflow: Exécution → Analyse IA → Patch automatique (EN BOUCLE)
 """
+import argparse
 import os
 import sys
+import time
 
 # Import des modules
-from src.executeur import executer_script
-from src.ai_debugger import AIDebugger
-from src.file_patcher import FilePatcher
+from src.executeur import executer_script, executer_script_multi
+from src.ai_debugger import AIDebugger, texte_erreurs
+from src.analysis_cache import signature_erreur
+from src.demon import DemonDebogage, adresse_demon, soumettre
+from src.file_patcher import FilePatcher, corrections_vers_operations, decrire_operation
+from src.limites import LimitesExecution
+from src.progression import BudgetSession, SuiviProgression, nombre_erreurs
+from src.speculatif import evaluer_candidats
+from src.surveillance import Surveillance
+from src.tracing import span, tableau_resume, tracer_actif
 
 
 def lire_fichier(chemin: str) -> str:
     """Lit le contenu d'un fichier."""
-    with open(chemin, 'r', encoding='utf-8') as f:
-        return f.read()
+    with span('lecture', fichier=os.path.basename(chemin)) as etape:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            contenu = f.read()
+        etape.attributs['caracteres'] = len(contenu)
+        return contenu
 
 
-def main(script_path: str, auto_apply: bool = True):
+def afficher_sortie(flux: str, ligne: str):
+    """Affiche en direct la sortie standard du script exécuté."""
+    if flux == 'stdout':
+        print(f"   │ {ligne}")
+
+
+def demander_confirmation(operations: list) -> bool:
+    """Demande à l'utilisateur s'il faut appliquer les corrections."""
+    reponse = input("\n❓ Appliquer ces corrections ? (oui/non) : ").strip().lower()
+    return reponse in ['oui', 'o', 'yes', 'y']
+
+
+def revenir_au_meilleur(patcher: FilePatcher, script_path: str, suivi: SuiviProgression) -> bool:
+    """Restaure le meilleur état rencontré s'il est meilleur que l'état actuel."""
+    if not suivi.historique or suivi.meilleur is None or suivi.meilleur['revision'] is None:
+        return False
+    actuel = suivi.historique[-1]
+    if suivi.meilleur['erreurs'] >= actuel['erreurs'] or suivi.meilleur['hash'] == actuel['hash']:
+        return False
+    print(f"⏪ Retour au meilleur état (itération {suivi.meilleur['iteration']}, "
+          f"{suivi.meilleur['erreurs']} erreur(s) au lieu de {actuel['erreurs']})")
+    return patcher.restore_backup(script_path, suivi.meilleur['revision'])
+
+
+def main(script_path: str, auto_apply: bool = True, fork_server: bool = False,
+         multi_fault: bool = False, speculatif: int = 0, timeout: float = None,
+         limites: LimitesExecution = None, debugger: AIDebugger = None,
+         max_iterations: int = None, mesures: dict = None, conversation: bool = False,
+         max_secondes: float = None, budget_tokens: int = None, on_line=afficher_sortie,
+         confirmer=demander_confirmation, patcher: FilePatcher = None, annulation=None):
     """
     Workflow complet de débogage automatique AVEC BOUCLE.
     Continue à corriger jusqu'à ce qu'il n'y ait plus d'erreurs.
@@ -25,23 +66,74 @@ def main(script_path: str, auto_apply: bool = True):
     Args:
         script_path: Chemin du script à déboguer
         auto_apply: Si True, applique automatiquement les corrections
+        fork_server: Si True, exécute le script via un interpréteur pré-chauffé
+        multi_fault: Si True, collecte toutes les erreurs d'une exécution et
+            les corrige en une seule requête
+        speculatif: Si > 1, nombre de candidats demandés à l'IA et validés
+            en parallèle avant application
+        timeout: Timeout d'exécution en secondes (défaut: adaptatif)
+        limites: Limites de ressources du script (CPU, mémoire, fichiers, processus)
+        debugger: Agent IA à utiliser (par défaut: créé à la première erreur)
+        max_iterations: Nombre maximal d'itérations (None: jusqu'au succès)
+        mesures: Dict rempli avec les mesures du run ('iterations', 'corrections',
+            'etapes': durées par étape en secondes)
+        conversation: Si True, garde l'historique avec le modèle et n'envoie
+            que le diff et la nouvelle erreur après le premier tour
+        max_secondes: Durée maximale de la session (None: illimitée)
+        budget_tokens: Tokens maximaux consommés auprès du modèle (None: illimité)
+        on_line: Callback on_line(flux, ligne) des lignes produites par le
+            script (None: pas d'affichage en direct)
+        confirmer: Callback confirmer(operations) -> bool appelé avant chaque
+            patch quand auto_apply est False (client du démon, interface)
+        patcher: FilePatcher à utiliser (par défaut: un nouveau)
+        annulation: threading.Event ; s'il est levé, la session s'arrête au plus
+            tôt : exécution tuée, analyse ignorée, aucun patch appliqué
+
+    Sans progrès (oscillation, même erreur répétée, stagnation), l'agent
+    escalade : contexte complet, puis candidats spéculatifs, puis retour au
+    meilleur état rencontré et arrêt.
     """
     print("=" * 70)
     print("🤖 AGENT DE DÉBOGAGE PYTHON (Mode Boucle Automatique)")
     print("=" * 70)
     print(f"📝 Script: {script_path}")
-    print(f"🔄 Mode: Boucle infinie jusqu'à succès")
+    if max_iterations is None and max_secondes is None and budget_tokens is None:
+        print(f"🔄 Mode: Boucle jusqu'à succès (arrêt si aucun progrès)")
+    else:
+        print(f"🔄 Mode: Boucle jusqu'à succès ou épuisement du budget")
     print("=" * 70)
     
     venv_python = r"venv\Scripts\python.exe"
     iteration = 0
     total_corrections = 0
+    patcher = patcher or FilePatcher()
+    session = None
+    budget = BudgetSession(iterations=max_iterations, secondes=max_secondes, tokens=budget_tokens)
+    suivi = SuiviProgression()
+    # Dernières corrections appliquées, mémorisées si l'exécution suivante réussit
+    # ou compte moins d'erreurs
+    a_valider = None
+    if mesures is None:
+        mesures = {}
+    mesures.update({'iterations': 0, 'corrections': 0,
+                    'etapes': {'execution': [], 'analyse': [], 'patch': []}})
     
     # ═══════════════════════════════════════════════════════════
     # BOUCLE PRINCIPALE : Continue jusqu'à success
     # ═══════════════════════════════════════════════════════════
     while True:
+        if annulation is not None and annulation.is_set():
+            print("\n⏹️  Session annulée")
+            return False
         iteration += 1
+        mesures['iterations'] = iteration
+        tokens = debugger.tokens_entree + debugger.tokens_sortie if debugger is not None else 0
+        depassement = budget.depasse(iteration, tokens)
+        if depassement:
+            mesures['iterations'] = iteration - 1
+            print(f"\n⛔ {depassement[0].upper()}{depassement[1:]} - arrêt du processus")
+            revenir_au_meilleur(patcher, script_path, suivi)
+            return False
         
         print(f"\n{'🔁' * 35}")
         print(f"🔁 ITÉRATION {iteration}")
@@ -53,11 +145,36 @@ def main(script_path: str, auto_apply: bool = True):
         print("\n📍 ÉTAPE 1/5 : Exécution du script")
         print("-" * 70)
         
-        resultat = executer_script(script_path, venv_python)
+        debut = time.perf_counter()
+        if multi_fault:
+            resultat = executer_script_multi(script_path, venv_python, on_line=on_line,
+                                             timeout=timeout, limites=limites, annulation=annulation)
+        else:
+            resultat = executer_script(script_path, venv_python, fork_server=fork_server,
+                                       on_line=on_line, timeout=timeout, limites=limites,
+                                       annulation=annulation)
+        mesures['etapes']['execution'].append(time.perf_counter() - debut)
+        if annulation is not None and annulation.is_set():
+            print("\n⏹️  Session annulée (exécution interrompue)")
+            return False
+        
+        if a_valider is not None:
+            erreurs = nombre_erreurs(resultat)
+            if not resultat['stderr'] or erreurs < a_valider['erreurs']:
+                debugger.memoriser(a_valider['erreur'], a_valider['code'], a_valider['corrections'],
+                                   os.path.basename(script_path))
+            elif (erreurs > a_valider['erreurs'] or resultat.get('tue_par')
+                  or signature_erreur(resultat['stderr']) == a_valider['signature']):
+                # Correction de la base sans effet ou nuisible : elle n'est plus proposée
+                if debugger.oublier(a_valider['corrections']):
+                    print("🗑️  Correction réutilisée inefficace - retirée de la base de connaissances")
+            a_valider = None
         
         # Affichage résumé
         status = "✅" if resultat['returncode'] == 0 else "❌"
         print(f"\n{status} Code retour: {resultat['returncode']}")
+        if resultat.get('tue_par'):
+            print(f"⛔ Processus arrêté ({resultat['tue_par']}) après {resultat['duree']}s")
         
         # ✅ SUCCESS : Sortie de la boucle
         if not resultat['stderr']:
@@ -66,13 +183,22 @@ def main(script_path: str, auto_apply: bool = True):
             print(f"📊 Statistiques:")
             print(f"   • Itérations totales: {iteration}")
             print(f"   • Corrections appliquées: {total_corrections}")
+            if debugger is not None and debugger.latences:
+                print(f"   • Tokens consommés: {debugger.tokens_entree} envoyés, {debugger.tokens_sortie} reçus")
+            if debugger is not None and debugger.corrections_locales:
+                print(f"   • Corrections locales (sans appel au modèle): {debugger.corrections_locales}")
+            if debugger is not None and debugger.corrections_reutilisees:
+                print(f"   • Corrections réutilisées (base de connaissances): {debugger.corrections_reutilisees}")
+            if debugger is not None and debugger.tokens_economises:
+                print(f"   • Tokens économisés (contexte réduit): {debugger.tokens_economises}")
             print("=" * 70)
-            if resultat['stdout']:
-                print(f"\n📤 Sortie du script:\n{resultat['stdout']}")
             return True
     
         # ❌ ERREUR : Continue le cycle de correction
-        print(f"\n❌ Erreur détectée:")
+        if len(resultat.get('erreurs', [])) > 1:
+            print(f"\n❌ {len(resultat['erreurs'])} erreurs détectées:")
+        else:
+            print(f"\n❌ Erreur détectée:")
         error_preview = resultat['stderr'][:300] if len(resultat['stderr']) > 300 else resultat['stderr']
         print(error_preview)
         
@@ -84,6 +210,26 @@ def main(script_path: str, auto_apply: bool = True):
         
         code_source = lire_fichier(script_path)
         print(f"✓ {len(code_source)} caractères lus")
+
+        # Empreinte de l'itération : détection des cycles et de la stagnation
+        revision = patcher.store.snapshot(script_path)['revision']
+        probleme = suivi.observer(iteration, code_source, resultat, revision)
+        if probleme:
+            print(f"\n⚠️  Aucun progrès ({probleme})")
+            mesures.setdefault('escalades', []).append(probleme)
+            if suivi.niveau == 1:
+                print("🔎 Escalade : contexte complet, modèle à la place des correcteurs locaux")
+                if debugger is not None:
+                    debugger.slice_context = False
+                    debugger.correcteurs_locaux = False
+                session = None
+            elif suivi.niveau == 2 and speculatif <= 1:
+                print("🎲 Escalade : 3 candidats validés en parallèle")
+                speculatif = 3
+            else:
+                print("🛑 Escalades épuisées - arrêt du processus")
+                revenir_au_meilleur(patcher, script_path, suivi)
+                return False
     
         # ═══════════════════════════════════════════════════════════
         # ÉTAPE 3 : Analyse par IA
@@ -91,17 +237,53 @@ def main(script_path: str, auto_apply: bool = True):
         print("\n📍 ÉTAPE 3/5 : Analyse IA des erreurs")
         print("-" * 70)
         
+        debut = time.perf_counter()
         try:
-            debugger = AIDebugger()
-            corrections = debugger.analyze_error(
-                code=code_source,
-                error=resultat['stderr'],
-                filename=os.path.basename(script_path)
-            )
+            # Agent créé à la première erreur puis réutilisé (client HTTP et prompts)
+            if debugger is None:
+                debugger = AIDebugger()
+            if speculatif > 1:
+                candidats = debugger.propose_candidates(
+                    code=code_source,
+                    error=resultat['stderr'],
+                    filename=os.path.basename(script_path),
+                    n=speculatif
+                )
+                meilleur = evaluer_candidats(script_path, candidats, resultat['stderr'], venv_python,
+                                             timeout=timeout, limites=limites)
+                if meilleur:
+                    print(f"✓ Candidat {meilleur['index'] + 1} retenu ({meilleur['statut']})")
+                    corrections = meilleur['corrections']
+                else:
+                    print("⚠️  Aucun candidat ne corrige l'erreur - premier candidat conservé")
+                    corrections = candidats[0] if candidats else {'corrections': []}
+            elif conversation:
+                if session is None:
+                    session = debugger.ouvrir_conversation(os.path.basename(script_path))
+                if resultat.get('erreurs'):
+                    corrections = session.analyze_errors(code_source, resultat['erreurs'])
+                else:
+                    corrections = session.analyze_error(code_source, resultat['stderr'])
+            elif resultat.get('erreurs'):
+                corrections = debugger.analyze_errors(
+                    code=code_source,
+                    erreurs=resultat['erreurs'],
+                    filename=os.path.basename(script_path)
+                )
+            else:
+                corrections = debugger.analyze_error(
+                    code=code_source,
+                    error=resultat['stderr'],
+                    filename=os.path.basename(script_path)
+                )
         except Exception as e:
             print(f"❌ Impossible d'utiliser l'API Groq: {e}")
             print("💡 Utilisez demo_prompt_engineering.py pour mode démo")
             return False
+        mesures['etapes']['analyse'].append(time.perf_counter() - debut)
+        if annulation is not None and annulation.is_set():
+            print("\n⏹️  Session annulée (analyse obsolète ignorée)")
+            return False
     
         # Affichage des corrections
         if 'corrections' in corrections and corrections['corrections']:
@@ -130,6 +312,8 @@ def main(script_path: str, auto_apply: bool = True):
             
             print("\n" + "=" * 70)
         else:
+            if corrections.get('error'):
+                print(f"❌ Analyse impossible: {corrections['error']}")
             print("⚠️  Aucune correction proposée - impossible de continuer")
             return False
     
@@ -140,20 +324,7 @@ def main(script_path: str, auto_apply: bool = True):
         print("-" * 70)
         
         # Conversion corrections → opérations
-        operations = []
-        for corr in corrections['corrections']:
-            ligne = corr.get('ligne')
-            code_corrige = corr.get('code_corrige')
-            
-            if ligne and code_corrige:
-                # Nettoyer le code corrigé (enlever indentation excessive)
-                code_corrige = code_corrige.strip()
-                
-                operations.append({
-                    'action': 'replace',
-                    'line': ligne,
-                    'content': code_corrige
-                })
+        operations = corrections_vers_operations(corrections)
         
         if not operations:
             print("⚠️  Aucune opération valide - impossible de continuer")
@@ -162,29 +333,45 @@ def main(script_path: str, auto_apply: bool = True):
         # Résumé des opérations
         print(f"\n📋 {len(operations)} modification(s) à appliquer:")
         for i, op in enumerate(operations, 1):
-            print(f"   [{i}] Ligne {op['line']}: Remplacement")
+            print(f"   [{i}] {decrire_operation(op)}")
         
         # Demander confirmation
         print(f"\n⚠️  Ces modifications vont être appliquées au fichier:")
         print(f"    📁 {script_path}")
         print(f"    💾 Un backup sera créé automatiquement")
         
-        reponse = input("\n❓ Appliquer ces corrections ? (oui/non) : ").strip().lower()
+        if not auto_apply:
+            if not confirmer(operations):
+                print("❌ Corrections annulées par l'utilisateur - arrêt du processus")
+                return False
         
-        if reponse not in ['oui', 'o', 'yes', 'y']:
-            print("❌ Corrections annulées par l'utilisateur - arrêt du processus")
+        # Le fichier a pu être modifié pendant l'analyse : corrections obsolètes
+        if annulation is not None and annulation.is_set():
+            print("⏹️  Session annulée - corrections non appliquées")
+            return False
+        if lire_fichier(script_path) != code_source:
+            print("⚠️  Fichier modifié pendant l'analyse - corrections abandonnées")
             return False
         
         # Application
-        patcher = FilePatcher()
+        debut = time.perf_counter()
         success = patcher.apply_patch(script_path, operations)
+        mesures['etapes']['patch'].append(time.perf_counter() - debut)
         
         if not success:
             print("❌ Échec du patch - arrêt du processus")
             return False
         
         print("✅ Patch appliqué avec succès")
+        a_valider = {
+            'signature': signature_erreur(resultat['stderr']),
+            'erreurs': nombre_erreurs(resultat),
+            'erreur': texte_erreurs(resultat['erreurs']) if resultat.get('erreurs') else resultat['stderr'],
+            'code': code_source,
+            'corrections': corrections
+        }
         total_corrections += 1
+        mesures['corrections'] = total_corrections
         
         # ═══════════════════════════════════════════════════════════
         # FIN DE L'ITÉRATION : La boucle va re-tester automatiquement
@@ -194,18 +381,114 @@ def main(script_path: str, auto_apply: bool = True):
 
 
 if __name__ == "__main__":
-    # Script à déboguer
-    script = "scripts/script_1.py"
+    parser = argparse.ArgumentParser(description="Agent de débogage Python")
+    parser.add_argument("script", nargs="?", default="scripts/script_1.py",
+                        help="Script à déboguer (défaut: scripts/script_1.py)")
+    parser.add_argument("--fork-server", action="store_true",
+                        help="Exécute le script via un interpréteur pré-chauffé (Linux/macOS)")
+    parser.add_argument("--multi", action="store_true",
+                        help="Collecte toutes les erreurs d'une exécution et les corrige en une requête")
+    parser.add_argument("--speculatif", type=int, default=0, metavar="N",
+                        help="Demande N corrections candidates et les valide en parallèle")
+    parser.add_argument("--timeout", type=float, default=None, metavar="S",
+                        help="Timeout d'exécution (défaut: adaptatif selon l'historique du script)")
+    parser.add_argument("--cpu", type=int, default=None, metavar="S",
+                        help="Limite de temps CPU du script (Linux/macOS)")
+    parser.add_argument("--memoire", type=int, default=None, metavar="MO",
+                        help="Limite mémoire du script en Mo (Linux/macOS)")
+    parser.add_argument("--conversation", action="store_true",
+                        help="Garde l'historique avec le modèle et n'envoie que les diffs entre itérations")
+    parser.add_argument("--auto", action="store_true",
+                        help="Applique les corrections sans demander de confirmation")
+    parser.add_argument("--max-iterations", type=int, default=None, metavar="N",
+                        help="Nombre maximal d'itérations")
+    parser.add_argument("--max-duree", type=float, default=None, metavar="S",
+                        help="Durée maximale de la session en secondes")
+    parser.add_argument("--budget-tokens", type=int, default=None, metavar="N",
+                        help="Tokens maximaux consommés auprès du modèle")
+    parser.add_argument("--traces", default=None, metavar="FICHIER",
+                        help="Ajoute les mesures de chaque étape au fichier (JSON lines)")
+    parser.add_argument("--metriques", default=None, metavar="FICHIER",
+                        help="Écrit les métriques au format texte Prometheus")
+    parser.add_argument("--demon", action="store_true",
+                        help="Lance le démon de débogage (session résidente, socket locale)")
+    parser.add_argument("--local", action="store_true",
+                        help="Débogue dans ce processus même si un démon est à l'écoute")
+    parser.add_argument("--surveiller", action="store_true",
+                        help="Relance le débogage à chaque enregistrement du script ou de ses imports locaux")
+    parser.add_argument("--scrutation", action="store_true",
+                        help="Surveillance par scrutation des fichiers (au lieu d'inotify)")
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1:
-        script = sys.argv[1]
+    if args.demon:
+        DemonDebogage(main, fork_server=args.fork_server).servir()
+        sys.exit(0)
     
+    script = args.script
     print(f"🎯 Script cible: {script}\n")
     
-    # Lancer le workflow avec boucle automatique (sans limite)
-    success = main(script, auto_apply=True)
+    if args.surveiller:
+        # Agent et patcher partagés par les sessions successives (cache, prompts, écritures)
+        try:
+            debugger = AIDebugger()
+        except Exception as e:
+            print(f"❌ Impossible d'utiliser l'API Groq: {e}")
+            sys.exit(1)
+        patcher = FilePatcher()
+        if not args.auto:
+            # Une confirmation bloquerait le thread de session (input non annulable)
+            print("ℹ️  Mode surveillance : corrections appliquées sans confirmation (--auto implicite)")
+        
+        def lancer(annulation):
+            return main(script, auto_apply=True, fork_server=args.fork_server, multi_fault=args.multi,
+                        speculatif=args.speculatif, timeout=args.timeout,
+                        limites=LimitesExecution(cpu_secondes=args.cpu, memoire_mo=args.memoire),
+                        debugger=debugger, conversation=args.conversation,
+                        max_iterations=args.max_iterations, max_secondes=args.max_duree,
+                        budget_tokens=args.budget_tokens, patcher=patcher, annulation=annulation)
+        
+        Surveillance(script, lancer, patcher=patcher, scrutation=args.scrutation).executer()
+        sys.exit(0)
+    
+    # Un démon à l'écoute reçoit le script (traces et métriques : exécution locale)
+    resultat = None
+    if not (args.local or args.traces or args.metriques):
+        options = {
+            'auto_apply': args.auto, 'multi_fault': args.multi, 'speculatif': args.speculatif,
+            'timeout': args.timeout, 'conversation': args.conversation, 'cpu': args.cpu,
+            'memoire': args.memoire, 'max_iterations': args.max_iterations,
+            'max_secondes': args.max_duree, 'budget_tokens': args.budget_tokens
+        }
+        if args.fork_server:
+            options['fork_server'] = True
+        resultat = soumettre(script, options, confirmer=demander_confirmation)
+    
+    if resultat is not None:
+        print(f"🛰️  Session traitée par le démon ({adresse_demon()})")
+        if resultat['type'] == 'refus':
+            print(f"⚠️  {resultat['raison']}")
+        success = resultat.get('succes', False)
+    else:
+        # Lancer le workflow avec boucle automatique
+        success = main(script, auto_apply=args.auto, fork_server=args.fork_server, multi_fault=args.multi,
+                       speculatif=args.speculatif, timeout=args.timeout,
+                       limites=LimitesExecution(cpu_secondes=args.cpu, memoire_mo=args.memoire),
+                       conversation=args.conversation, max_iterations=args.max_iterations,
+                       max_secondes=args.max_duree, budget_tokens=args.budget_tokens)
     
     if success:
         print("\n🎉 Script corrigé avec succès !")
     else:
         print("\n⚠️  La correction a échoué ou est incomplète")
+    
+    # Résumé des mesures par étape
+    tracer = tracer_actif()
+    print("\n⏱️  Temps par étape")
+    print(tableau_resume(resultat.get('etapes')) if resultat is not None else tracer.tableau())
+    if args.traces:
+        tracer.exporter_jsonl(args.traces)
+        print(f"💾 Traces: {args.traces}")
+    if args.metriques:
+        with open(args.metriques, 'w', encoding='utf-8') as f:
+            f.write(tracer.prometheus())
+        print(f"💾 Métriques: {args.metriques}")
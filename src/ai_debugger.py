@@ -2,21 +2,143 @@
 import json
 import re
 import os
-from groq import Groq
-import config
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.analysis_cache import AnalysisCache, cle_analyse, normaliser_traceback
+from src.base_connaissances import BaseConnaissances
+from src.context_slicer import decouper_contexte
+from src.correcteurs import SEUIL_CONFIANCE, corriger_localement
+from src.llm_backends import LLMBackend, creer_backend
+from src.token_budget import TokenBudget
+from src.tracing import span, tracer_actif, utiliser_tracer
+
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prompts')
+
+
+class PromptTemplate:
+    """Template de prompt chargé une fois, rechargé si le fichier change."""
+    
+    def __init__(self, path: str):
+        """Initialise le template (lecture différée)."""
+        self.path = path
+        self._mtime = None
+        self._text = ""
+        self._segments = []
+        self._lock = threading.Lock()
+    
+    @property
+    def text(self) -> str:
+        """Contenu du template."""
+        self._rafraichir()
+        return self._text
+    
+    def _rafraichir(self):
+        """Relit le fichier uniquement si sa date de modification a changé."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Fichier de prompt introuvable: {self.path}")
+        
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime == self._mtime:
+                    return
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._text = f.read().strip()
+                # Pré-compilation : découpage unique en (texte littéral, variable)
+                self._segments = [
+                    (litteral, champ)
+                    for litteral, champ, _, _ in string.Formatter().parse(self._text)
+                ]
+                self._mtime = mtime
+    
+    def render(self, **valeurs) -> str:
+        """Remplace les variables {nom} du template."""
+        self._rafraichir()
+        return "".join(
+            litteral + (str(valeurs[champ]) if champ is not None else "")
+            for litteral, champ in self._segments
+        )
+
+
+# Templates partagés par tous les agents du processus (démon, lot, Streamlit)
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def template_prompt(prompt_file: str) -> PromptTemplate:
+    """Retourne le template partagé associé à un fichier de prompt."""
+    with _templates_lock:
+        if prompt_file not in _templates:
+            _templates[prompt_file] = PromptTemplate(os.path.join(PROMPTS_DIR, prompt_file))
+        return _templates[prompt_file]
+
+
+def texte_erreurs(erreurs: list) -> str:
+    """Texte d'erreur unique pour plusieurs erreurs d'une même exécution."""
+    if len(erreurs) == 1:
+        return erreurs[0]['traceback']
+    
+    blocs = [
+        f"Plusieurs erreurs indépendantes ({len(erreurs)}) ont été détectées. "
+        f"Corrige-les TOUTES dans la liste 'corrections'."
+    ]
+    for i, erreur in enumerate(erreurs, 1):
+        blocs.append(f"--- Erreur {i}/{len(erreurs)} (ligne {erreur.get('ligne')}) ---\n"
+                     f"{erreur['traceback'].rstrip()}")
+    return "\n\n".join(blocs)
 
 
 class AIDebugger:
     """Agent IA pour analyser erreurs Python et proposer corrections."""
     
-    def __init__(self):
-        """Initialise l'agent avec Groq AI."""
+    def __init__(self, cache: AnalysisCache = None, use_cache: bool = True,
+                 slice_context: bool = True, backend: LLMBackend = None,
+                 budget: TokenBudget = None, correcteurs_locaux: bool = True,
+                 seuil_confiance: float = SEUIL_CONFIANCE, connaissances: BaseConnaissances = None,
+                 use_connaissances: bool = True, exemples: int = 3):
+        """Initialise l'agent avec Groq AI.
+        
+        Args:
+            cache: Cache des analyses (par défaut: cache SQLite dans .agent_cache/)
+            use_cache: Si False, interroge toujours l'API
+            slice_context: Si True, n'envoie que le code concerné par la traceback
+            backend: Backend LLM (par défaut: selon AGENT_LLM, Groq si absent)
+            budget: Budget de tokens des requêtes (taille du prompt, max_tokens)
+            correcteurs_locaux: Si True, les erreurs mécaniques sont corrigées
+                sans appel au modèle (src/correcteurs.py)
+            seuil_confiance: Confiance minimale d'une correction locale
+            connaissances: Base des corrections validées (par défaut: SQLite dans .agent_cache/)
+            use_connaissances: Si False, ni réutilisation ni exemples
+            exemples: Nombre maximal de corrections similaires ajoutées au prompt
+        """
+        self.cache = (cache or AnalysisCache()) if use_cache else None
+        self.slice_context = slice_context
+        self.correcteurs_locaux = correcteurs_locaux
+        self.seuil_confiance = seuil_confiance
+        self.corrections_locales = 0
+        self.connaissances = (connaissances or BaseConnaissances()) if use_connaissances else None
+        self.exemples = exemples
+        self.corrections_reutilisees = 0
+        self.budget = budget or TokenBudget()
+        self.dernier_contexte = None
+        self.tokens_economises = 0
+        # Consommation réelle : tokens envoyés/reçus et latence de chaque requête
+        self.tokens_entree = 0
+        self.tokens_sortie = 0
+        self.latences = []
+        self._lock = threading.Lock()
         try:
-            self.client = Groq(api_key=config.GROQ_API_KEY)
-            self.model = "llama-3.3-70b-versatile"
-            print("✓ Agent de débogage IA activé (Groq)")
+            # Un seul backend (et donc un seul pool de connexions HTTP keep-alive)
+            # pour toute la durée de vie de l'agent
+            self.backend = backend or creer_backend()
+            self.model = self.backend.model
+            print(f"✓ Agent de débogage IA activé ({self.model})")
         except Exception as e:
-            raise Exception(f"Erreur d'initialisation Groq: {e}")
+            raise Exception(f"Erreur d'initialisation du backend LLM: {e}")
     
     def analyze_error(self, code: str, error: str, filename: str = "script.py") -> dict:
         """Analyse une erreur et propose corrections.
@@ -29,63 +151,266 @@ class AIDebugger:
         Returns:
             dict: Corrections au format JSON
         """
+        locale = self.correction_locale(code, error, filename)
+        if locale is not None:
+            return locale
+        
         print(f"\n🔍 Analyse de l'erreur dans '{filename}'...")
         
-        try:
-            messages = self._build_prompt(code, error, filename)
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=1500,
-                top_p=0.95
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            corrections = self._parse_response(result_text)
-            
-            print("✓ Analyse terminée\n")
+        with span('analyse', fichier=filename) as etape:
+            try:
+                cle = None
+                if self.cache is not None:
+                    cle = cle_analyse(
+                        model=self.model,
+                        system=self._load_prompt('system_prompt.txt'),
+                        template=self._load_prompt('user_prompt.txt'),
+                        filename=filename,
+                        code=code,
+                        error=normaliser_traceback(error),
+                        # Contexte complet (escalade) : pas de réutilisation de l'analyse découpée
+                        slice_context=self.slice_context
+                    )
+                    corrections = self.cache.get(cle)
+                    if corrections is not None:
+                        etape.attributs.update(cache='hit', corrections=len(corrections['corrections']))
+                        print("✓ Analyse trouvée dans le cache\n")
+                        return corrections
+                etape.attributs['cache'] = 'miss' if cle is not None else 'desactive'
+                
+                with span('prompt'):
+                    messages = self._build_prompt(code, error, filename)
+                texte = self._completion(messages, max_tokens=self.budget.max_tokens_reponse(error))
+                with span('parse') as parse:
+                    corrections = self._parse_response(texte)
+                    parse.attributs['json_valide'] = 'error' not in corrections
+                
+                # Seules les analyses exploitables sont mises en cache
+                if cle is not None and corrections.get('corrections') and 'error' not in corrections:
+                    self.cache.set(cle, corrections)
+                
+                etape.attributs['corrections'] = len(corrections.get('corrections', []))
+                print("✓ Analyse terminée\n")
+                return corrections
+                
+            except Exception as e:
+                etape.statut = 'erreur'
+                etape.attributs['erreur'] = str(e)
+                print(f"❌ Erreur lors de l'analyse: {e}")
+                return {
+                    "error": str(e),
+                    "corrections": [],
+                    "explication": "Impossible d'analyser l'erreur"
+                }
+    
+    def correction_locale(self, code: str, error: str, filename: str = "script.py"):
+        """Correction sans appel au modèle si un correcteur local est assez sûr.
+        
+        Returns:
+            dict | None: Corrections au format JSON, None s'il faut le modèle
+        """
+        if not self.correcteurs_locaux:
+            return None
+        with span('correcteur_local', fichier=filename) as etape:
+            corrections = corriger_localement(code, error, filename, self.seuil_confiance)
+            if corrections is None and self.connaissances is not None:
+                corrections = self.connaissances.reutiliser(code, error, filename)
+            etape.attributs['resultat'] = corrections['source'] if corrections else 'modele'
+        if corrections is None:
+            return None
+        if corrections['source'] == 'connaissances':
+            with self._lock:
+                self.corrections_reutilisees += 1
+            print(f"\n📚 {corrections['conseil']} - aucun appel au modèle\n")
             return corrections
-            
-        except Exception as e:
-            print(f"❌ Erreur lors de l'analyse: {e}")
-            return {
-                "error": str(e),
-                "corrections": [],
-                "explication": "Impossible d'analyser l'erreur"
-            }
+        with self._lock:
+            self.corrections_locales += 1
+        print(f"\n⚡ Correction locale ({corrections['type_erreur']}, confiance "
+              f"{corrections['confiance']:.2f}) - aucun appel au modèle\n")
+        return corrections
     
-    def _load_prompt(self, prompt_file: str) -> str:
-        """Charge un prompt depuis un fichier texte."""
-        prompts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prompts')
-        prompt_path = os.path.join(prompts_dir, prompt_file)
+    def memoriser(self, error: str, code: str, corrections: dict, filename: str = "script.py") -> int:
+        """Enregistre dans la base les corrections validées par l'exécution suivante.
         
-        try:
-            with open(prompt_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Fichier de prompt introuvable: {prompt_path}")
+        Une correction est validée si le script s'exécute ensuite sans erreur
+        ou avec moins d'erreurs ; l'appelant en décide.
+        
+        Les corrections des correcteurs locaux ne sont pas mémorisées (elles
+        sont retrouvées sans la base).
+        
+        Returns:
+            int: Nombre de corrections enregistrées
+        """
+        if self.connaissances is None or corrections.get('source') == 'correcteur_local':
+            return 0
+        return sum(
+            self.connaissances.enregistrer(error, code, correction, filename)
+            for correction in corrections.get('corrections', [])
+        )
+    
+    def oublier(self, corrections: dict) -> bool:
+        """Retire de la base une correction réutilisée qui n'a pas corrigé l'erreur.
+        
+        Returns:
+            bool: True si une entrée a été supprimée
+        """
+        if self.connaissances is None or corrections.get('source') != 'connaissances':
+            return False
+        return self.connaissances.oublier(corrections['connaissance'])
     
-    def _build_prompt(self, code: str, error: str, filename: str) -> list:
-        """Construit les messages pour l'API Groq."""
+    def propose_candidates(self, code: str, error: str, filename: str = "script.py",
+                           n: int = 3, temperatures: list = None) -> list:
+        """Demande plusieurs jeux de corrections candidats (mode spéculatif).
         
-        # Charger les prompts depuis les fichiers
+        Les requêtes partent en parallèle avec des températures croissantes
+        pour diversifier les propositions. Les doublons sont éliminés.
+        
+        Args:
+            code: Code source avec erreur
+            error: Message d'erreur complet
+            filename: Nom du fichier
+            n: Nombre de candidats demandés
+            temperatures: Températures à utiliser (par défaut de 0.1 à 0.9)
+        
+        Returns:
+            list: Jeux de corrections valides (format de analyze_error)
+        """
+        if temperatures is None:
+            temperatures = [round(0.1 + 0.8 * i / max(n - 1, 1), 2) for i in range(n)]
+        print(f"\n🔍 Analyse spéculative de '{filename}' ({len(temperatures)} candidats)...")
+        
+        messages = self._build_prompt(code, error, filename)
+        max_tokens = self.budget.max_tokens_reponse(error)
+        tracer = tracer_actif()
+        
+        def candidat(temperature):
+            try:
+                # Les spans des requêtes parallèles restent dans le tracer de l'appelant
+                with utiliser_tracer(tracer):
+                    return self._parse_response(self._completion(messages, temperature, max_tokens))
+            except Exception as e:
+                print(f"⚠️  Candidat (température {temperature}) en échec: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=len(temperatures)) as pool:
+            reponses = list(pool.map(candidat, temperatures))
+        
+        candidats = []
+        vus = set()
+        for reponse in reponses:
+            if not reponse or not reponse.get('corrections') or 'error' in reponse:
+                continue
+            empreinte = json.dumps(
+                [(c.get('ligne'), c.get('code_corrige')) for c in reponse['corrections']]
+            )
+            if empreinte not in vus:
+                vus.add(empreinte)
+                candidats.append(reponse)
+        
+        print(f"✓ {len(candidats)} candidat(s) distinct(s)\n")
+        return candidats
+    
+    def analyze_errors(self, code: str, erreurs: list, filename: str = "script.py") -> dict:
+        """Analyse plusieurs erreurs d'une même exécution en une seule requête.
+        
+        Args:
+            code: Code source avec erreurs
+            erreurs: Erreurs collectées par executer_script_multi
+            filename: Nom du fichier
+        
+        Returns:
+            dict: Corrections au format JSON (toutes erreurs confondues)
+        """
+        return self.analyze_error(code, texte_erreurs(erreurs), filename)
+    
+    def ouvrir_conversation(self, filename: str = "script.py", budget_tokens: int = 6000):
+        """Démarre une session conversationnelle (diffs entre itérations).
+        
+        Returns:
+            Conversation: Session dont analyze_error envoie, après le premier
+            tour, uniquement le diff depuis le tour précédent et la nouvelle erreur
+        """
+        from src.conversation import Conversation
+        return Conversation(self, filename, budget_tokens)
+    
+    def _completion(self, messages: list, temperature: float = 0.1, max_tokens: int = 1500) -> str:
+        """Envoie les messages au modèle et retourne le texte de la réponse."""
+        debut = time.perf_counter()
+        with span('llm', modele=self.model, temperature=temperature, max_tokens=max_tokens) as appel:
+            reponse = self.backend.complete(messages, temperature=temperature, max_tokens=max_tokens,
+                                            top_p=0.95)
+            appel.attributs.update(tokens_entree=reponse['tokens_entree'],
+                                   tokens_sortie=reponse['tokens_sortie'],
+                                   modele=reponse.get('modele', self.model))
+        with self._lock:
+            self.latences.append(time.perf_counter() - debut)
+            self.tokens_entree += reponse['tokens_entree']
+            self.tokens_sortie += reponse['tokens_sortie']
+        return reponse['texte']
+    
+    def _template(self, prompt_file: str) -> PromptTemplate:
+        """Retourne le template associé à un fichier de prompt."""
+        return template_prompt(prompt_file)
+    
+    def _load_prompt(self, prompt_file: str) -> str:
+        """Charge un prompt depuis un fichier texte (mis en cache)."""
+        return self._template(prompt_file).text
+    
+    def _build_prompt(self, code: str, error: str, filename: str, decouper: bool = None) -> list:
+        """Construit les messages pour l'API Groq.
+        
+        Args:
+            decouper: Découpe le code autour de la traceback (défaut: slice_context)
+        """
+        
+        # Prompts chargés une fois (rechargés si les fichiers changent)
         system_content = self._load_prompt('system_prompt.txt')
-        user_template = self._load_prompt('user_prompt.txt')
         
         system_message = {
             "role": "system",
             "content": system_content
         }
         
+        # Découpage du code autour des frames de la traceback
+        contexte = None
+        if self.slice_context if decouper is None else decouper:
+            contexte = decouper_contexte(code, error, filename)
+            self.dernier_contexte = contexte
+            if contexte['decoupe']:
+                self.tokens_economises += contexte['tokens_economises']
+                print(f"✂️  Contexte réduit: {contexte['tokens_complets']} → "
+                      f"{contexte['tokens_envoyes']} tokens "
+                      f"(-{contexte['tokens_economises']})")
+        
+        # Corrections similaires déjà validées, ajoutées en exemples
+        exemples = ""
+        if self.connaissances is not None and self.exemples:
+            proches = self.connaissances.rechercher(error, code, filename, k=self.exemples)
+            if proches:
+                exemples = self._template('exemples_prompt.txt').render(exemples="\n".join(
+                    f"- {e['signature']}\n  Avant: {e['source']}\n  Après: {e['code_corrige']}"
+                    for _, e in proches
+                ))
+                print(f"📚 {len(proches)} correction(s) similaire(s) en exemple")
+        
+        # Respect du budget : traceback compressée, code tronqué si nécessaire
+        template = self._template('user_prompt.txt')
+        repartition = self.budget.repartir(system_content + template.text + exemples, code, error,
+                                           filename, contexte)
+        if repartition['erreur_compressee'] or repartition['code_tronque']:
+            print(f"🗜️  Prompt ajusté au budget: code {repartition['tokens']['code']} tokens, "
+                  f"erreur {repartition['tokens']['erreur']} tokens")
+        
         # Remplacer les variables dans le template utilisateur
-        user_content = user_template.format(
+        user_content = template.render(
             filename=filename,
-            code=code,
-            error=error
+            code=repartition['code'],
+            error=repartition['error']
         )
         
+        if exemples:
+            user_content += "\n\n" + exemples
+        
         user_message = {
             "role": "user",
             "content": user_content
@@ -0,0 +1,150 @@
+"""Cache des analyses IA (mémoire LRU + disque SQLite)"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Éléments volatils d'une traceback qui changent d'une exécution à l'autre
+_ADRESSE = re.compile(r'0x[0-9a-fA-F]+')
+_FICHIER = re.compile(r'File "(?:[^"]*[\\/])?([^"\\/]+)"')
+_TEMP = re.compile(
+    r'(?:/tmp|/var/folders|[A-Za-z]:\\Users\\[^\\\s]+\\AppData\\Local\\Temp)[^\s"\']*',
+    re.IGNORECASE
+)
+
+
+def normaliser_traceback(error: str) -> str:
+    """Retire d'une traceback les éléments qui varient entre exécutions.
+
+    Les chemins de fichiers sont réduits à leur nom, les chemins temporaires
+    et les adresses mémoire sont remplacés par des marqueurs fixes.
+    """
+    texte = _FICHIER.sub(r'File "\1"', error)
+    texte = _TEMP.sub('<tmp>', texte)
+    texte = _ADRESSE.sub('0x?', texte)
+    return "\n".join(ligne.rstrip() for ligne in texte.strip().splitlines())
+
+
+def signature_erreur(error: str) -> str:
+    """Signature courte d'une erreur : dernière frame et ligne d'exception.
+
+    Deux exécutions qui échouent au même endroit pour la même raison ont la
+    même signature, indépendamment des chemins et adresses.
+    """
+    texte = normaliser_traceback(error)
+    positions = re.findall(r'File "[^"]+", line \d+', texte)
+    lignes = [l for l in texte.splitlines() if l.strip() and not l.startswith(' ')]
+    return f"{positions[-1] if positions else ''} | {lignes[-1] if lignes else ''}"
+
+
+def cle_analyse(**elements) -> str:
+    """Calcule la clé (SHA-256) d'un ensemble d'éléments JSON-sérialisables."""
+    contenu = json.dumps(elements, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """Cache à deux niveaux des réponses de l'IA, indexé par contenu."""
+
+    def __init__(self, db_path: str = os.path.join(".agent_cache", "analyses.db"),
+                 max_memoire: int = 128, max_disque: int = 5000,
+                 ttl: float = 7 * 24 * 3600):
+        """Initialise le cache.
+
+        Args:
+            db_path: Fichier SQLite (None pour un cache uniquement en mémoire)
+            max_memoire: Nombre maximal d'entrées en mémoire (LRU)
+            max_disque: Nombre maximal d'entrées sur disque
+            ttl: Durée de vie d'une entrée en secondes
+        """
+        self.max_memoire = max_memoire
+        self.max_disque = max_disque
+        self.ttl = ttl
+        self.stats = {'hits_memoire': 0, 'hits_disque': 0, 'misses': 0}
+        self._memoire = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            dossier = os.path.dirname(db_path)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "cle TEXT PRIMARY KEY, valeur TEXT NOT NULL, "
+                "cree REAL NOT NULL, acces REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, cle: str):
+        """Retourne l'analyse en cache, ou None."""
+        maintenant = time.time()
+        with self._lock:
+            entree = self._memoire.get(cle)
+            if entree is not None:
+                cree, valeur = entree
+                if maintenant - cree <= self.ttl:
+                    self._memoire.move_to_end(cle)
+                    self.stats['hits_memoire'] += 1
+                    return json.loads(valeur)
+                del self._memoire[cle]
+
+            if self._db is not None:
+                ligne = self._db.execute(
+                    "SELECT valeur, cree FROM analyses WHERE cle = ?", (cle,)
+                ).fetchone()
+                if ligne is not None:
+                    valeur, cree = ligne
+                    if maintenant - cree <= self.ttl:
+                        self._db.execute("UPDATE analyses SET acces = ? WHERE cle = ?", (maintenant, cle))
+                        self._db.commit()
+                        self._stocker_memoire(cle, cree, valeur)
+                        self.stats['hits_disque'] += 1
+                        return json.loads(valeur)
+                    self._db.execute("DELETE FROM analyses WHERE cle = ?", (cle,))
+                    self._db.commit()
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, cle: str, analyse: dict):
+        """Enregistre une analyse dans les deux niveaux."""
+        maintenant = time.time()
+        valeur = json.dumps(analyse, ensure_ascii=False)
+        with self._lock:
+            self._stocker_memoire(cle, maintenant, valeur)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses (cle, valeur, cree, acces) VALUES (?, ?, ?, ?)",
+                (cle, valeur, maintenant, maintenant)
+            )
+            # Éviction : entrées expirées puis les moins récemment utilisées
+            self._db.execute("DELETE FROM analyses WHERE cree < ?", (maintenant - self.ttl,))
+            self._db.execute(
+                "DELETE FROM analyses WHERE cle NOT IN "
+                "(SELECT cle FROM analyses ORDER BY acces DESC LIMIT ?)",
+                (self.max_disque,)
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Vide le cache (mémoire et disque)."""
+        with self._lock:
+            self._memoire.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analyses")
+                self._db.commit()
+
+    def _stocker_memoire(self, cle: str, cree: float, valeur: str):
+        """Ajoute une entrée au niveau mémoire en respectant la taille LRU."""
+        self._memoire[cle] = (cree, valeur)
+        self._memoire.move_to_end(cle)
+        while len(self._memoire) > self.max_memoire:
+            self._memoire.popitem(last=False)
@@ -0,0 +1,235 @@
+"""Stockage des backups par contenu (dédupliqué) avec journal de révisions
+
+Organisation du dossier :
+
+    backups/
+    ├── objects/ab/cdef...     # contenus compressés, nommés par leur SHA-256
+    └── revisions/<id>.jsonl   # journal des révisions d'un fichier (une ligne JSON)
+
+Un contenu identique n'est stocké qu'une fois, quel que soit le nombre de
+backups. Chaque révision garde le diff avec la précédente et la politique de
+rétention supprime les anciennes révisions puis les objets orphelins.
+
+Plusieurs instances (une par FilePatcher, une par session du démon) et
+plusieurs processus peuvent partager le même dossier : écriture d'un objet,
+ajout au journal, nettoyage et restauration se font sous un verrou commun
+(verrou par dossier dans le processus, plus `fcntl.flock` sur
+`backups/.verrou` sous POSIX).
+"""
+import contextlib
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+
+# Verrous partagés par les instances d'un même dossier
+_verrous = {}
+_verrous_lock = threading.Lock()
+
+
+def _verrou_dossier(root: str) -> threading.Lock:
+    """Verrou (processus) associé à un dossier de backups."""
+    with _verrous_lock:
+        return _verrous.setdefault(os.path.abspath(root), threading.Lock())
+
+
+class BackupStore:
+    """Backups dédupliqués avec historique et restauration."""
+
+    def __init__(self, root: str = "backups", max_revisions: int = 50, max_age_days: float = 30):
+        """Initialise le stockage.
+
+        Args:
+            root: Dossier racine des backups
+            max_revisions: Nombre maximal de révisions conservées par fichier
+            max_age_days: Âge maximal d'une révision (la plus récente est toujours gardée)
+        """
+        self.root = root
+        self.max_revisions = max_revisions
+        self.max_age_days = max_age_days
+        self._objects = os.path.join(root, "objects")
+        self._revisions = os.path.join(root, "revisions")
+        self._lock = _verrou_dossier(root)
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._revisions, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _verrou(self):
+        """Accès exclusif au dossier (threads du processus, puis autres processus)."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, ".verrou"), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def snapshot(self, file_path: str) -> dict:
+        """Enregistre l'état actuel du fichier.
+
+        Si le contenu est identique à la dernière révision, aucune révision
+        n'est ajoutée.
+
+        Returns:
+            dict: Révision {'revision', 'hash', 'date', 'taille', 'diff'}
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Fichier non trouvé: {file_path}")
+
+        with open(file_path, 'rb') as f:
+            contenu = f.read()
+        empreinte = hashlib.sha256(contenu).hexdigest()
+
+        with self._verrou():
+            revisions = self.revisions(file_path)
+            if revisions and revisions[-1]['hash'] == empreinte:
+                return revisions[-1]
+
+            self._ecrire_objet(empreinte, contenu)
+            precedent = self.read(revisions[-1]['hash']) if revisions else b''
+            revision = {
+                'revision': revisions[-1]['revision'] + 1 if revisions else 1,
+                'hash': empreinte,
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'timestamp': time.time(),
+                'taille': len(contenu),
+                'diff': self._diff(precedent, contenu, os.path.basename(file_path))
+            }
+            revisions.append(revision)
+            if self._appliquer_retention(revisions):
+                self._ecrire_journal(file_path, revisions)
+                self._nettoyer_objets()
+            else:
+                with open(self._journal(file_path), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(revision, ensure_ascii=False) + "\n")
+            return revision
+
+    def revisions(self, file_path: str) -> list:
+        """Liste les révisions d'un fichier (de la plus ancienne à la plus récente)."""
+        journal = self._journal(file_path)
+        if not os.path.exists(journal):
+            return []
+        with open(journal, 'r', encoding='utf-8') as f:
+            return [json.loads(ligne) for ligne in f if ligne.strip()]
+
+    def read(self, empreinte: str) -> bytes:
+        """Retourne le contenu stocké sous une empreinte."""
+        with open(self.object_path(empreinte), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def restore(self, file_path: str, revision: int = None) -> dict:
+        """Restaure le fichier à une révision (par défaut la plus récente).
+
+        Returns:
+            dict: Révision restaurée
+        """
+        # Sous verrou : un nettoyage concurrent ne peut pas retirer l'objet visé
+        with self._verrou():
+            revisions = self.revisions(file_path)
+            if not revisions:
+                raise FileNotFoundError(f"Aucun backup pour: {file_path}")
+
+            if revision is None:
+                cible = revisions[-1]
+            else:
+                trouvees = [r for r in revisions if r['revision'] == revision]
+                if not trouvees:
+                    raise ValueError(f"Révision {revision} introuvable pour {file_path}")
+                cible = trouvees[0]
+
+            contenu = self.read(cible['hash'])
+        dossier = os.path.dirname(os.path.abspath(file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=dossier, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(contenu)
+            if os.path.exists(file_path):
+                # mkstemp crée le fichier en 0600 : on conserve les droits d'origine
+                shutil.copymode(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return cible
+
+    def object_path(self, empreinte: str) -> str:
+        """Chemin de l'objet associé à une empreinte."""
+        return os.path.join(self._objects, empreinte[:2], empreinte[2:])
+
+    def _journal(self, file_path: str) -> str:
+        """Journal des révisions d'un fichier (identifié par son chemin absolu)."""
+        chemin = os.path.abspath(file_path)
+        suffixe = hashlib.sha1(chemin.encode('utf-8')).hexdigest()[:10]
+        return os.path.join(self._revisions, f"{os.path.basename(chemin)}-{suffixe}.jsonl")
+
+    def _ecrire_objet(self, empreinte: str, contenu: bytes):
+        """Stocke un contenu compressé s'il n'existe pas déjà."""
+        chemin = self.object_path(empreinte)
+        if os.path.exists(chemin):
+            return
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(chemin), prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(zlib.compress(contenu))
+        os.replace(tmp_path, chemin)
+
+    def _ecrire_journal(self, file_path: str, revisions: list):
+        """Réécrit entièrement le journal d'un fichier."""
+        with open(self._journal(file_path), 'w', encoding='utf-8') as f:
+            for revision in revisions:
+                f.write(json.dumps(revision, ensure_ascii=False) + "\n")
+
+    def _appliquer_retention(self, revisions: list) -> bool:
+        """Supprime (sur place) les révisions trop anciennes ou en surnombre.
+
+        Returns:
+            bool: True si des révisions ont été supprimées
+        """
+        limite = time.time() - self.max_age_days * 24 * 3600
+        gardees = [r for r in revisions[:-1] if r.get('timestamp', 0) >= limite] + revisions[-1:]
+        gardees = gardees[-self.max_revisions:]
+        if len(gardees) == len(revisions):
+            return False
+        revisions[:] = gardees
+        return True
+
+    def _nettoyer_objets(self):
+        """Supprime les objets qui ne sont plus référencés par aucun journal."""
+        references = set()
+        for nom in os.listdir(self._revisions):
+            with open(os.path.join(self._revisions, nom), 'r', encoding='utf-8') as f:
+                references.update(json.loads(ligne)['hash'] for ligne in f if ligne.strip())
+
+        for prefixe in os.listdir(self._objects):
+            dossier = os.path.join(self._objects, prefixe)
+            for nom in os.listdir(dossier):
+                # Les fichiers '.xxx' sont des écritures en cours
+                if not nom.startswith('.') and prefixe + nom not in references:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(dossier, nom))
+
+    @staticmethod
+    def _diff(avant: bytes, apres: bytes, nom: str) -> str:
+        """Diff unifié entre deux versions (texte)."""
+        return "".join(difflib.unified_diff(
+            avant.decode('utf-8', errors='replace').splitlines(keepends=True),
+            apres.decode('utf-8', errors='replace').splitlines(keepends=True),
+            fromfile=f"a/{nom}",
+            tofile=f"b/{nom}"
+        ))
@@ -0,0 +1,294 @@
+"""Base de connaissances des corrections validées (SQLite + index TF-IDF)
+
+Chaque correction qui a fait progresser la boucle (l'erreur corrigée ne se
+reproduit pas à l'exécution suivante) est enregistrée avec la signature
+générique de l'erreur, la ligne fautive et son contexte AST. Pour une
+nouvelle erreur :
+
+- une correction identique (même signature, même ligne de code) est
+  réutilisée directement, sans appel au modèle
+- sinon les corrections les plus proches (similarité cosinus TF-IDF sur la
+  traceback normalisée et le contexte) servent d'exemples dans le prompt
+"""
+import ast
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from src.analysis_cache import normaliser_traceback
+from src.context_slicer import lignes_traceback
+
+
+_EXCEPTION = re.compile(r'^(?:\w+\.)*(\w+(?:Error|Exception|Warning))(?::\s*(.*))?$', re.MULTILINE)
+_BLOC_ERREUR = re.compile(r'^--- Erreur \d+/\d+.*---$', re.MULTILINE)
+_JETON = re.compile(r"[A-Za-z_]\w*|\d+|[^\s\w]")
+
+
+def signature_generique(error: str) -> str:
+    """Classe d'erreur indépendante du fichier : type + message sans valeurs.
+
+    "NameError: name 'totl' is not defined" → "NameError: name '<>' is not defined"
+    """
+    exceptions = _EXCEPTION.findall(normaliser_traceback(error))
+    if not exceptions:
+        return ''
+    type_erreur, message = exceptions[-1]
+    message = re.sub(r"'[^']*'|\"[^\"]*\"", "'<>'", message)
+    message = re.sub(r'\b\d+(?:\.\d+)?\b', '<n>', message)
+    return f"{type_erreur}: {message}".strip()
+
+
+def _contexte_ast(code: str, ligne: int) -> list:
+    """Types des noeuds AST de l'instruction contenant la ligne."""
+    try:
+        arbre = ast.parse(code)
+    except SyntaxError:
+        return []
+    instructions = [
+        n for n in ast.walk(arbre)
+        if isinstance(n, ast.stmt) and n.lineno <= ligne <= (n.end_lineno or n.lineno)
+        and not isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+    if not instructions:
+        return []
+    instruction = max(instructions, key=lambda n: n.lineno)
+    types = [type(n).__name__ for n in ast.walk(instruction)]
+    types += [f"{type(n).__name__}:{type(n.op).__name__}" for n in ast.walk(instruction) if hasattr(n, 'op')]
+    return types
+
+
+def jetons(signature: str, source: str, contexte: list) -> list:
+    """Termes indexés : signature (pondérée), ligne fautive, contexte AST."""
+    type_erreur = signature.split(':')[0]
+    termes = [f"exc:{type_erreur}"] * 3
+    termes += [f"msg:{m.lower()}" for m in _JETON.findall(signature.partition(':')[2])]
+    termes += [f"code:{t}" for t in _JETON.findall(source)]
+    termes += [f"ast:{t}" for t in contexte]
+    return termes
+
+
+def bloc_pour_ligne(error: str, ligne: int, filename: str) -> str:
+    """Bloc d'erreur (mode multi-erreurs) dont la traceback passe par la ligne."""
+    blocs = _BLOC_ERREUR.split(error)
+    if len(blocs) <= 1:
+        return error
+    for bloc in blocs[1:]:
+        if ligne in lignes_traceback(bloc, filename):
+            return bloc
+    return None
+
+
+class BaseConnaissances:
+    """Corrections validées, indexées pour la recherche par similarité."""
+
+    def __init__(self, db_path: str = os.path.join(".agent_cache", "connaissances.db"),
+                 max_entrees: int = 5000):
+        """Initialise la base et reconstruit l'index en mémoire.
+
+        Args:
+            db_path: Fichier SQLite (None pour une base uniquement en mémoire)
+            max_entrees: Nombre maximal de corrections conservées
+        """
+        self.max_entrees = max_entrees
+        self._lock = threading.Lock()
+        self._entrees = {}
+        self._documents = Counter()
+        self._inverse = {}
+        if db_path:
+            dossier = os.path.dirname(db_path)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS corrections ("
+            "id INTEGER PRIMARY KEY, signature TEXT NOT NULL, source TEXT NOT NULL, "
+            "code_corrige TEXT NOT NULL, explication TEXT, jetons TEXT NOT NULL, "
+            "succes INTEGER NOT NULL DEFAULT 1, acces REAL NOT NULL, "
+            "UNIQUE (signature, source, code_corrige))"
+        )
+        self._db.commit()
+        for ligne in self._db.execute(
+            "SELECT id, signature, source, code_corrige, explication, jetons, succes FROM corrections"
+        ):
+            self._indexer(*ligne[:5], json.loads(ligne[5]), ligne[6])
+
+    def __len__(self) -> int:
+        return len(self._entrees)
+
+    def enregistrer(self, error: str, code: str, correction: dict, filename: str) -> bool:
+        """Enregistre une correction validée (ou incrémente ses succès).
+
+        Args:
+            error: Traceback corrigée (texte multi-erreurs accepté)
+            code: Code source avant la correction
+            correction: Correction appliquée (ligne, code_corrige, explication)
+            filename: Nom du fichier
+
+        Returns:
+            bool: True si la correction a été enregistrée
+        """
+        ligne = correction.get('ligne')
+        lignes_code = code.splitlines()
+        # Seuls les remplacements d'une ligne sont rejouables tels quels
+        if correction.get('action') in ('insert', 'delete') or correction.get('ligne_fin') or correction.get('noeud'):
+            return False
+        if not ligne or not 1 <= ligne <= len(lignes_code):
+            return False
+        bloc = bloc_pour_ligne(error, ligne, filename)
+        signature = signature_generique(bloc) if bloc else ''
+        source = lignes_code[ligne - 1].strip()
+        code_corrige = str(correction.get('code_corrige', '')).strip()
+        if not signature or not code_corrige or code_corrige == source:
+            return False
+
+        termes = jetons(signature, source, _contexte_ast(code, ligne))
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO corrections (signature, source, code_corrige, explication, jetons, acces) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (signature, source, code_corrige) "
+                "DO UPDATE SET succes = succes + 1, acces = excluded.acces",
+                (signature, source, code_corrige, correction.get('explication', ''),
+                 json.dumps(termes), time.time())
+            )
+            identifiant, succes = self._db.execute(
+                "SELECT id, succes FROM corrections WHERE signature = ? AND source = ? AND code_corrige = ?",
+                (signature, source, code_corrige)
+            ).fetchone()
+            if identifiant in self._entrees:
+                self._entrees[identifiant]['succes'] = succes
+            else:
+                self._indexer(identifiant, signature, source, code_corrige,
+                              correction.get('explication', ''), termes, succes)
+            self._evincer()
+            self._db.commit()
+        return True
+
+    def rechercher(self, error: str, code: str, filename: str, k: int = 3, score_min: float = 0.3) -> list:
+        """Corrections les plus proches de l'erreur (similarité cosinus TF-IDF).
+
+        Returns:
+            list: [(score, entree)] triés par score décroissant ; entree =
+            {'signature', 'source', 'code_corrige', 'explication', 'succes'}
+        """
+        requete = self._requete(error, code, filename)
+        if requete is None:
+            return []
+        with self._lock:
+            termes = Counter(requete['jetons'])
+            candidats = set().union(*(self._inverse.get(t, ()) for t in termes))
+            if not candidats:
+                return []
+            total = len(self._entrees)
+            idf = {t: math.log((total + 1) / (self._documents[t] + 1)) + 1 for t in termes}
+            vecteur = {t: n * idf[t] for t, n in termes.items()}
+            norme = math.sqrt(sum(v * v for v in vecteur.values()))
+
+            resultats = []
+            for identifiant in candidats:
+                entree = self._entrees[identifiant]
+                poids = {t: n * (math.log((total + 1) / (self._documents[t] + 1)) + 1)
+                         for t, n in entree['jetons'].items()}
+                produit = sum(vecteur[t] * poids[t] for t in vecteur if t in poids)
+                norme_entree = math.sqrt(sum(p * p for p in poids.values()))
+                score = produit / (norme * norme_entree) if norme and norme_entree else 0.0
+                if score >= score_min:
+                    resultats.append((round(score, 3), entree))
+        resultats.sort(key=lambda r: (r[0], r[1]['succes']), reverse=True)
+        return [(score, {c: v for c, v in entree.items() if c != 'jetons'}) for score, entree in resultats[:k]]
+
+    def reutiliser(self, code: str, error: str, filename: str):
+        """Correction déjà validée pour la même erreur sur la même ligne de code.
+
+        Returns:
+            dict | None: Corrections au format de AIDebugger.analyze_error
+        """
+        requete = self._requete(error, code, filename)
+        if requete is None:
+            return None
+        with self._lock:
+            exactes = [
+                e for e in self._entrees.values()
+                if e['signature'] == requete['signature'] and e['source'] == requete['source']
+            ]
+        if not exactes:
+            return None
+        entree = max(exactes, key=lambda e: e['succes'])
+        return {
+            'type_erreur': requete['signature'].split(':')[0],
+            'ligne_erreur': requete['ligne'],
+            'cause': requete['signature'],
+            'corrections': [{
+                'ligne': requete['ligne'],
+                'code_original': entree['source'],
+                'code_corrige': entree['code_corrige'],
+                'explication': entree['explication'] or "Correction déjà validée"
+            }],
+            'conseil': f"Correction réutilisée ({entree['succes']} succès précédent(s))",
+            'source': 'connaissances',
+            'connaissance': entree['id']
+        }
+
+    def oublier(self, identifiant: int) -> bool:
+        """Supprime une correction dont la réutilisation a échoué.
+
+        Returns:
+            bool: True si l'entrée existait
+        """
+        with self._lock:
+            if identifiant not in self._entrees:
+                return False
+            self._retirer(identifiant)
+            self._db.commit()
+        return True
+
+    def _requete(self, error: str, code: str, filename: str):
+        """Signature, ligne fautive et termes d'une erreur à une seule traceback."""
+        if len(_BLOC_ERREUR.split(error)) > 1:
+            return None
+        lignes_code = code.splitlines()
+        lignes = [n for n in lignes_traceback(error, filename) if 1 <= n <= len(lignes_code)]
+        signature = signature_generique(error)
+        if not lignes or not signature:
+            return None
+        ligne = lignes[-1]
+        source = lignes_code[ligne - 1].strip()
+        return {
+            'signature': signature,
+            'ligne': ligne,
+            'source': source,
+            'jetons': jetons(signature, source, _contexte_ast(code, ligne))
+        }
+
+    def _indexer(self, identifiant, signature, source, code_corrige, explication, termes, succes):
+        """Ajoute une entrée à l'index en mémoire (appelé sous verrou)."""
+        compte = Counter(termes)
+        self._entrees[identifiant] = {
+            'id': identifiant, 'signature': signature, 'source': source, 'code_corrige': code_corrige,
+            'explication': explication, 'succes': succes, 'jetons': compte
+        }
+        for terme in compte:
+            self._documents[terme] += 1
+            self._inverse.setdefault(terme, set()).add(identifiant)
+
+    def _evincer(self):
+        """Supprime les entrées les moins récemment validées au-delà de max_entrees."""
+        if len(self._entrees) <= self.max_entrees:
+            return
+        excedent = [identifiant for (identifiant,) in self._db.execute(
+            "SELECT id FROM corrections ORDER BY acces ASC LIMIT ?", (len(self._entrees) - self.max_entrees,)
+        )]
+        for identifiant in excedent:
+            self._retirer(identifiant)
+
+    def _retirer(self, identifiant: int):
+        """Retire une entrée de l'index et de la base (appelé sous verrou)."""
+        entree = self._entrees.pop(identifiant)
+        for terme in entree['jetons']:
+            self._documents[terme] -= 1
+            self._inverse[terme].discard(identifiant)
+        self._db.execute("DELETE FROM corrections WHERE id = ?", (identifiant,))
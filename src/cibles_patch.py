@@ -0,0 +1,156 @@
+"""Cibles des opérations de patch : plages de lignes et noeuds AST
+
+Une opération peut viser une ligne, une plage de lignes (`end_line`) ou un
+noeud AST désigné par une de ses lignes (`node`) :
+
+    instruction  l'instruction complète (multi-lignes), ou l'en-tête d'un bloc
+    bloc         l'instruction composée la plus interne (if, for, with, try, def...)
+    fonction     la fonction la plus interne, décorateurs compris
+    corps        le corps de cette fonction
+    imports      le bloc d'imports de niveau module contenant la ligne (ou le premier)
+
+Le contenu de remplacement est ré-indenté sous la cible en conservant son
+indentation relative.
+"""
+import ast
+import textwrap
+
+
+NOEUDS = ('instruction', 'bloc', 'fonction', 'corps', 'imports')
+
+
+def _indentation(ligne: str) -> int:
+    return len(ligne.expandtabs(4)) - len(ligne.expandtabs(4).lstrip())
+
+
+def _debut(noeud) -> int:
+    """Première ligne d'un noeud, décorateurs compris."""
+    decorateurs = getattr(noeud, 'decorator_list', [])
+    return min([noeud.lineno] + [d.lineno for d in decorateurs])
+
+
+def _contenant(arbre, ligne: int, types) -> list:
+    """Noeuds d'un type contenant la ligne, du plus interne au plus externe."""
+    noeuds = [n for n in ast.walk(arbre)
+              if isinstance(n, types) and _debut(n) <= ligne <= n.end_lineno]
+    return sorted(noeuds, key=lambda n: (n.end_lineno - _debut(n), -_debut(n)))
+
+
+def _bloc_par_indentation(lignes: list, debut: int) -> int:
+    """Dernière ligne du bloc commençant à `debut` (source non analysable)."""
+    niveau = _indentation(lignes[debut - 1])
+    fin = debut
+    for numero in range(debut + 1, len(lignes) + 1):
+        ligne = lignes[numero - 1]
+        if not ligne.strip():
+            continue
+        if _indentation(ligne) <= niveau:
+            break
+        fin = numero
+    return fin
+
+
+def resoudre_cible(lignes: list, ligne: int, noeud: str) -> tuple:
+    """Plage (début, fin) des lignes visées par un noeud AST.
+
+    Args:
+        lignes: Lignes du fichier d'origine
+        ligne: Ligne désignant le noeud
+        noeud: Type de cible (voir NOEUDS)
+
+    Returns:
+        tuple: (première ligne, dernière ligne), bornes incluses
+
+    Raises:
+        ValueError: Type de cible inconnu ou cible introuvable
+    """
+    if noeud not in NOEUDS:
+        raise ValueError(f"Cible inconnue: {noeud} (attendu: {', '.join(NOEUDS)})")
+    try:
+        arbre = ast.parse(''.join(lignes))
+    except SyntaxError:
+        # Fichier non analysable (c'est souvent l'erreur à corriger) : repli sur l'indentation
+        if noeud == 'instruction':
+            return ligne, ligne
+        if noeud == 'bloc':
+            return ligne, _bloc_par_indentation(lignes, ligne)
+        raise ValueError(f"Cible '{noeud}' introuvable : le fichier n'est pas analysable")
+
+    if noeud == 'instruction':
+        instructions = _contenant(arbre, ligne, ast.stmt)
+        if not instructions:
+            return ligne, ligne
+        instruction = instructions[0]
+        corps = getattr(instruction, 'body', None)
+        if corps and ligne < corps[0].lineno:
+            # Ligne dans l'en-tête d'un bloc : seul l'en-tête est visé
+            return instruction.lineno, corps[0].lineno - 1
+        return instruction.lineno, instruction.end_lineno
+
+    if noeud == 'bloc':
+        blocs = [n for n in _contenant(arbre, ligne, ast.stmt) if getattr(n, 'body', None)]
+        if not blocs:
+            raise ValueError(f"Aucun bloc ne contient la ligne {ligne}")
+        return _debut(blocs[0]), blocs[0].end_lineno
+
+    if noeud in ('fonction', 'corps'):
+        fonctions = _contenant(arbre, ligne, (ast.FunctionDef, ast.AsyncFunctionDef))
+        if not fonctions:
+            raise ValueError(f"Aucune fonction ne contient la ligne {ligne}")
+        fonction = fonctions[0]
+        if noeud == 'fonction':
+            return _debut(fonction), fonction.end_lineno
+        return fonction.body[0].lineno, fonction.end_lineno
+
+    # Imports : suite d'imports consécutifs au niveau module
+    groupes, groupe = [], []
+    for instruction in arbre.body:
+        if isinstance(instruction, (ast.Import, ast.ImportFrom)):
+            groupe.append(instruction)
+        elif groupe:
+            groupes.append(groupe)
+            groupe = []
+    if groupe:
+        groupes.append(groupe)
+    if not groupes:
+        raise ValueError("Aucun bloc d'imports dans le fichier")
+    for groupe in groupes:
+        if groupe[0].lineno <= ligne <= groupe[-1].end_lineno:
+            return groupe[0].lineno, groupe[-1].end_lineno
+    return groupes[0][0].lineno, groupes[0][-1].end_lineno
+
+
+def _analysable(bloc: str) -> bool:
+    try:
+        ast.parse(bloc)
+        return True
+    except SyntaxError:
+        return False
+
+
+def reindenter(contenu: str, prefixe: str, origine: int = 0) -> list:
+    """Lignes du contenu placées sous `prefixe`, indentation relative conservée.
+
+    Si la première ligne a perdu son indentation absolue (contenu recopié du
+    fichier puis `strip()`), les suivantes sont plus indentées qu'elle d'au
+    moins `origine` : cette interprétation est retenue si elle donne un bloc
+    syntaxiquement valide.
+
+    Args:
+        contenu: Code de remplacement (une ou plusieurs lignes)
+        prefixe: Indentation de la cible (espaces ou tabulations)
+        origine: Indentation, en colonnes, de la première ligne visée
+
+    Returns:
+        list: Lignes terminées par un saut de ligne
+    """
+    lignes = contenu.expandtabs(4).rstrip('\n').split('\n')
+    candidats = [lignes]
+    if origine and len(lignes) > 1 and lignes[0].strip() and not lignes[0][:1].isspace():
+        suite = [_indentation(l) for l in lignes[1:] if l.strip()]
+        if suite and min(suite) >= origine:
+            candidats.insert(0, [' ' * origine + lignes[0]] + lignes[1:])
+
+    blocs = [textwrap.dedent('\n'.join(c)) for c in candidats]
+    bloc = next((b for b in blocs if _analysable(b)), blocs[0])
+    return [(prefixe + l if l.strip() else '') + '\n' for l in bloc.split('\n')]
@@ -0,0 +1,175 @@
+"""Découpage du code source autour des frames de la traceback
+
+Au lieu d'envoyer tout le fichier à l'IA, on n'envoie que les fonctions et
+classes impliquées dans l'erreur, les imports et les définitions de haut
+niveau qu'elles référencent. Les numéros de ligne d'origine sont conservés
+pour que `corrections[].ligne` pointe toujours vers le vrai fichier.
+"""
+import ast
+import math
+import re
+
+
+_FRAME = re.compile(r'File "([^"]+)", line (\d+)')
+
+# Taille maximale d'une définition référencée incluse en entier
+MAX_LIGNES_DEFINITION = 30
+# Lignes de contexte autour d'une instruction de niveau module
+MARGE_MODULE = 3
+
+
+def estimer_tokens(texte: str) -> int:
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token)."""
+    return math.ceil(len(texte) / 4)
+
+
+def lignes_traceback(error: str, filename: str) -> list:
+    """Numéros de ligne des frames de la traceback appartenant au fichier."""
+    lignes = []
+    for chemin, ligne in _FRAME.findall(error):
+        if re.split(r'[\\/]', chemin)[-1] == filename:
+            lignes.append(int(ligne))
+    return lignes
+
+
+def _debut(noeud) -> int:
+    """Première ligne d'un noeud, décorateurs compris."""
+    decorateurs = getattr(noeud, 'decorator_list', [])
+    return min([noeud.lineno] + [d.lineno for d in decorateurs])
+
+
+def _plages_englobantes(arbre, ligne: int) -> list:
+    """Plages (début, fin) à garder pour une ligne de la traceback.
+
+    Retourne la fonction/classe la plus interne contenant la ligne, plus
+    l'en-tête des conteneurs parents ; à défaut, l'instruction de niveau
+    module avec quelques lignes de contexte.
+    """
+    plages = []
+    conteneurs = []
+    for noeud in ast.walk(arbre):
+        if isinstance(noeud, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if _debut(noeud) <= ligne <= noeud.end_lineno:
+                conteneurs.append(noeud)
+
+    if conteneurs:
+        conteneurs.sort(key=lambda n: n.end_lineno - _debut(n))
+        interne = conteneurs[0]
+        plages.append((_debut(interne), interne.end_lineno))
+        for parent in conteneurs[1:]:
+            plages.append((_debut(parent), max(parent.lineno, parent.body[0].lineno - 1)))
+        return plages
+
+    for noeud in arbre.body:
+        if noeud.lineno <= ligne <= noeud.end_lineno:
+            return [(max(1, noeud.lineno - MARGE_MODULE), noeud.end_lineno + MARGE_MODULE)]
+    return [(max(1, ligne - MARGE_MODULE), ligne + MARGE_MODULE)]
+
+
+def _noms_definis(noeud) -> set:
+    """Noms définis par une instruction de niveau module."""
+    if isinstance(noeud, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {noeud.name}
+    cibles = []
+    if isinstance(noeud, ast.Assign):
+        cibles = noeud.targets
+    elif isinstance(noeud, (ast.AnnAssign, ast.AugAssign)):
+        cibles = [noeud.target]
+    return {n.id for cible in cibles for n in ast.walk(cible) if isinstance(n, ast.Name)}
+
+
+def formater_extrait(lignes_source: list, gardees: list, filename: str) -> str:
+    """Extrait numéroté des lignes gardées, avec les plages omises signalées."""
+    largeur = len(str(len(lignes_source)))
+    extrait = [
+        f"# Extrait de {filename} : numéro de ligne réel à gauche de '|' "
+        f"(ne pas le recopier dans code_original/code_corrige)"
+    ]
+    precedente = 0
+    for n in gardees:
+        if n > precedente + 1:
+            extrait.append(f"{'':>{largeur}} | # ... lignes {precedente + 1}-{n - 1} omises ...")
+        extrait.append(f"{n:>{largeur}} | {lignes_source[n - 1]}")
+        precedente = n
+    if precedente < len(lignes_source):
+        extrait.append(f"{'':>{largeur}} | # ... lignes {precedente + 1}-{len(lignes_source)} omises ...")
+    return "\n".join(extrait)
+
+
+def decouper_contexte(code: str, error: str, filename: str, seuil_lignes: int = 200) -> dict:
+    """Construit l'extrait de code à envoyer à l'IA.
+
+    Args:
+        code: Code source complet
+        error: Traceback (stderr)
+        filename: Nom du fichier analysé
+        seuil_lignes: En dessous de ce nombre de lignes, le code est envoyé entier
+
+    Returns:
+        dict: {'code': str, 'decoupe': bool, 'lignes': list | None (lignes gardées),
+               'tokens_complets': int, 'tokens_envoyes': int, 'tokens_economises': int}
+    """
+    resultat = {
+        'code': code,
+        'decoupe': False,
+        'lignes': None,
+        'tokens_complets': estimer_tokens(code),
+        'tokens_envoyes': estimer_tokens(code),
+        'tokens_economises': 0
+    }
+
+    lignes_source = code.splitlines()
+    frames = lignes_traceback(error, filename)
+    if len(lignes_source) < seuil_lignes or not frames:
+        return resultat
+
+    try:
+        arbre = ast.parse(code)
+    except SyntaxError:
+        # Code non analysable : on garde une fenêtre autour des lignes signalées
+        arbre = None
+
+    plages = []
+    for ligne in frames:
+        if arbre is None:
+            plages.append((max(1, ligne - 20), ligne + 20))
+        else:
+            plages.extend(_plages_englobantes(arbre, ligne))
+
+    if arbre is not None:
+        gardees = {n for debut, fin in plages for n in range(debut, fin + 1)}
+
+        # Noms utilisés dans les portions gardées
+        utilises = {
+            n.id for n in ast.walk(arbre)
+            if isinstance(n, ast.Name) and n.lineno in gardees
+        }
+
+        for noeud in arbre.body:
+            if isinstance(noeud, (ast.Import, ast.ImportFrom)):
+                plages.append((noeud.lineno, noeud.end_lineno))
+            elif _noms_definis(noeud) & utilises:
+                debut, fin = _debut(noeud), noeud.end_lineno
+                if fin - debut + 1 > MAX_LIGNES_DEFINITION and hasattr(noeud, 'body'):
+                    # Grande définition : seulement la signature
+                    fin = max(noeud.lineno, noeud.body[0].lineno - 1)
+                plages.append((debut, fin))
+
+    gardees = sorted({
+        n for debut, fin in plages
+        for n in range(debut, min(fin, len(lignes_source)) + 1)
+    })
+
+    texte = formater_extrait(lignes_source, gardees, filename)
+    tokens = estimer_tokens(texte)
+    if tokens >= resultat['tokens_complets']:
+        return resultat
+
+    resultat.update({
+        'code': texte,
+        'decoupe': True,
+        'lignes': gardees,
+        'tokens_envoyes': tokens,
+        'tokens_economises': resultat['tokens_complets'] - tokens
+    })
+    return resultat
@@ -0,0 +1,133 @@
+"""Mode conversationnel : une session de débogage par fichier
+
+Le premier tour envoie le prompt complet (code entier, sans découpage autour
+de la traceback, + erreur). Les tours suivants
+n'envoient que le diff unifié depuis le tour précédent et la nouvelle
+erreur : le modèle garde le reste du fichier dans l'historique.
+
+Quand l'historique dépasse le budget de tokens, il est compacté : la
+conversation repart d'un prompt complet sur le code actuel, accompagné du
+résumé des corrections déjà proposées (pour qu'elles ne soient pas reproposées).
+"""
+import difflib
+
+from src.ai_debugger import texte_erreurs
+from src.context_slicer import estimer_tokens
+from src.token_budget import compresser_traceback
+from src.tracing import span
+
+
+class Conversation:
+    """Historique des échanges avec le modèle pour un fichier."""
+
+    def __init__(self, debugger, filename: str = "script.py", budget_tokens: int = 6000):
+        """Initialise la session.
+
+        Args:
+            debugger: AIDebugger utilisé pour les prompts et les requêtes
+            filename: Nom du fichier débogué
+            budget_tokens: Taille maximale de l'historique avant compaction
+        """
+        self.debugger = debugger
+        self.filename = filename
+        self.budget_tokens = budget_tokens
+        self.messages = []
+        self.dernier_code = None
+        self.historique_corrections = []
+        self.tours = 0
+        self.compactions = 0
+
+    def analyze_error(self, code: str, error: str) -> dict:
+        """Analyse une erreur dans le contexte de la conversation.
+
+        Returns:
+            dict: Corrections au format JSON (comme AIDebugger.analyze_error)
+        """
+        # Le diff du tour suivant montrera au modèle la correction locale
+        locale = self.debugger.correction_locale(code, error, self.filename)
+        if locale is not None:
+            return locale
+
+        print(f"\n🔍 Analyse de l'erreur dans '{self.filename}' (conversation, tour {self.tours + 1})...")
+
+        with span('analyse', fichier=self.filename, mode='conversation', tour=self.tours + 1) as etape:
+            try:
+                # L'historique n'est modifié qu'après une réponse valide : un échec
+                # laisse la conversation dans l'état du tour précédent
+                with span('prompt'):
+                    if not self.messages:
+                        messages = self._prompt_complet(code, error)
+                    else:
+                        messages = self.messages + [{'role': 'user', 'content': self._message_suivi(code, error)}]
+                        if self.tokens_historique(messages) > self.budget_tokens:
+                            messages = self._compacter(code, error)
+                            etape.attributs['compaction'] = True
+
+                etape.attributs['tokens_historique'] = self.tokens_historique(messages)
+                texte = self.debugger._completion(
+                    messages, max_tokens=self.debugger.budget.max_tokens_reponse(error)
+                )
+                with span('parse'):
+                    corrections = self.debugger._parse_response(texte)
+
+                self.messages = messages + [{'role': 'assistant', 'content': texte}]
+                self.dernier_code = code
+                self.tours += 1
+                for corr in corrections.get('corrections', []):
+                    self.historique_corrections.append(
+                        f"ligne {corr.get('ligne')}: {str(corr.get('code_corrige', '')).strip()}"
+                    )
+
+                etape.attributs['corrections'] = len(corrections.get('corrections', []))
+                print(f"✓ Analyse terminée ({etape.attributs['tokens_historique']} tokens d'historique)\n")
+                return corrections
+
+            except Exception as e:
+                etape.statut = 'erreur'
+                etape.attributs['erreur'] = str(e)
+                print(f"❌ Erreur lors de l'analyse: {e}")
+                return {
+                    "error": str(e),
+                    "corrections": [],
+                    "explication": "Impossible d'analyser l'erreur"
+                }
+
+    def analyze_errors(self, code: str, erreurs: list) -> dict:
+        """Analyse plusieurs erreurs d'une même exécution (mode multi-erreurs)."""
+        return self.analyze_error(code, texte_erreurs(erreurs))
+
+    def tokens_historique(self, messages: list = None) -> int:
+        """Estimation des tokens de l'historique complet (ou des messages donnés)."""
+        return sum(estimer_tokens(m['content']) for m in (self.messages if messages is None else messages))
+
+    def _prompt_complet(self, code: str, error: str) -> list:
+        """Prompt sur le fichier entier : les diffs suivants peuvent viser n'importe quelle ligne."""
+        return self.debugger._build_prompt(code, error, self.filename, decouper=False)
+
+    def _message_suivi(self, code: str, error: str) -> str:
+        """Message d'un tour suivant : diff depuis le tour précédent + erreur."""
+        diff = "".join(difflib.unified_diff(
+            self.dernier_code.splitlines(keepends=True),
+            code.splitlines(keepends=True),
+            fromfile=f"a/{self.filename}",
+            tofile=f"b/{self.filename}"
+        )) or "(aucune modification)"
+        print(f"📎 Diff envoyé: {estimer_tokens(diff)} tokens au lieu de {estimer_tokens(code)} pour le fichier")
+        return self.debugger._template('suivi_prompt.txt').render(
+            filename=self.filename,
+            diff=diff.rstrip(),
+            error=compresser_traceback(error, self.filename)
+        )
+
+    def _compacter(self, code: str, error: str) -> list:
+        """Repart d'un prompt complet sur le code actuel + résumé des tours passés."""
+        avant = self.tokens_historique()
+        messages = self._prompt_complet(code, error)
+        if self.historique_corrections:
+            resume = "\n".join(f"- {c}" for c in self.historique_corrections[-20:])
+            messages[-1]['content'] += (
+                "\n\n**CORRECTIONS DÉJÀ PROPOSÉES (ne pas les reproposer):**\n" + resume
+            )
+        self.compactions += 1
+        print(f"🗜️  Historique compacté: {avant} → {self.tokens_historique(messages)} tokens")
+        return messages
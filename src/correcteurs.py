@@ -0,0 +1,352 @@
+"""Correcteurs locaux : corrections mécaniques sans appel au modèle
+
+Un registre associe des types d'exception à des correcteurs. Chaque
+correcteur reçoit l'erreur (type, message, ligne, code, arbre AST) et
+retourne une correction au format attendu par main() — ligne, code_original,
+code_corrige, explication — avec un score de confiance, ou None.
+
+`corriger_localement` n'utilise une correction que si sa confiance atteint
+le seuil ; sinon l'erreur est confiée au modèle.
+"""
+import ast
+import builtins
+import difflib
+import re
+import sys
+
+from src.context_slicer import lignes_traceback
+
+
+# Ligne finale d'exception : "NomErreur: message"
+_EXCEPTION = re.compile(r'^((?:\w+\.)*\w+(?:Error|Exception|Warning))(?::\s*(.*))?$', re.MULTILINE)
+_BLOC_ERREUR = re.compile(r'^--- Erreur \d+/\d+.*---$', re.MULTILINE)
+# Suggestion de l'interpréteur (Python 3.10+)
+_SUGGESTION = re.compile(r"Did you mean:? '?([\w.]+)'?\?")
+
+SEUIL_CONFIANCE = 0.8
+
+_CORRECTEURS = {}
+
+
+def correcteur(*types_erreur):
+    """Décorateur : enregistre un correcteur pour des types d'exception."""
+    def enregistrer(fonction):
+        for type_erreur in types_erreur:
+            _CORRECTEURS.setdefault(type_erreur, []).append(fonction)
+        return fonction
+    return enregistrer
+
+
+def correcteurs_enregistres() -> dict:
+    """Types d'exception couverts et noms de leurs correcteurs."""
+    return {t: [f.__name__ for f in fonctions] for t, fonctions in _CORRECTEURS.items()}
+
+
+def lire_erreur(error: str, code: str, filename: str):
+    """Décrit l'erreur d'une traceback pour les correcteurs (None si illisible)."""
+    exceptions = _EXCEPTION.findall(error)
+    lignes_code = code.splitlines()
+    lignes = [n for n in lignes_traceback(error, filename) if 1 <= n <= len(lignes_code)]
+    if not exceptions or not lignes:
+        return None
+    type_erreur, message = exceptions[-1]
+    try:
+        arbre = ast.parse(code)
+    except SyntaxError:
+        arbre = None
+    return {
+        'type': type_erreur.split('.')[-1],
+        'message': message,
+        'ligne': lignes[-1],
+        'source': lignes_code[lignes[-1] - 1],
+        'lignes': lignes_code,
+        'code': code,
+        'arbre': arbre
+    }
+
+
+def corriger_localement(code: str, error: str, filename: str, seuil: float = SEUIL_CONFIANCE):
+    """Corrige les erreurs d'une traceback sans le modèle, si possible.
+
+    En mode multi-erreurs (blocs '--- Erreur i/n'), toutes les erreurs
+    doivent être corrigées localement.
+
+    Returns:
+        dict | None: Réponse au format de AIDebugger.analyze_error, avec
+        'source': 'correcteur_local' et 'confiance' ; None s'il faut le modèle
+    """
+    blocs = _BLOC_ERREUR.split(error)
+    blocs = [b for b in blocs[1:] if b.strip()] if len(blocs) > 1 else blocs
+
+    corrections = []
+    premiere = None
+    for bloc in blocs:
+        erreur = lire_erreur(bloc, code, filename)
+        if erreur is None:
+            return None
+        candidates = [c for c in (f(erreur) for f in _CORRECTEURS.get(erreur['type'], ())) if c]
+        if not candidates:
+            return None
+        meilleure = max(candidates, key=lambda c: c['confiance'])
+        if meilleure['confiance'] < seuil:
+            return None
+        premiere = premiere or erreur
+        if not any(c['ligne'] == meilleure['ligne'] for c in corrections):
+            corrections.append(meilleure)
+
+    return {
+        'type_erreur': premiere['type'],
+        'ligne_erreur': premiere['ligne'],
+        'cause': premiere['message'],
+        'corrections': corrections,
+        'conseil': "Correction mécanique appliquée sans appel au modèle",
+        'source': 'correcteur_local',
+        'confiance': min(c['confiance'] for c in corrections)
+    }
+
+
+# ═══════════════════════════════════════════════════════════
+# Outils communs
+# ═══════════════════════════════════════════════════════════
+
+def _correction(erreur: dict, code_corrige: str, explication: str, confiance: float,
+                ligne: int = None, **extra) -> dict:
+    ligne = ligne or erreur['ligne']
+    correction = {
+        'ligne': ligne,
+        'code_original': erreur['lignes'][ligne - 1].strip(),
+        'code_corrige': code_corrige.strip(),
+        'explication': explication,
+        'confiance': confiance
+    }
+    correction.update(extra)
+    return correction
+
+
+def _noeuds_ligne(erreur: dict, types) -> list:
+    """Noeuds AST d'un type tenant entièrement sur la ligne de l'erreur."""
+    if erreur['arbre'] is None:
+        return []
+    return [
+        n for n in ast.walk(erreur['arbre'])
+        if isinstance(n, types) and n.lineno == erreur['ligne'] and n.end_lineno == erreur['ligne']
+    ]
+
+
+def _remplacer(source: str, remplacements: list) -> str:
+    """Applique des remplacements (col_debut, col_fin, texte) en offsets UTF-8 (AST)."""
+    octets = source.encode('utf-8')
+    for debut, fin, texte in sorted(remplacements, reverse=True):
+        octets = octets[:debut] + texte.encode('utf-8') + octets[fin:]
+    return octets.decode('utf-8')
+
+
+def _indentation(ligne: str) -> int:
+    return len(ligne.expandtabs(4)) - len(ligne.expandtabs(4).lstrip())
+
+
+def _pas_indentation(lignes: list) -> int:
+    """Pas d'indentation du fichier (4 par défaut)."""
+    niveaux = sorted({_indentation(l) for l in lignes if l.strip()} - {0})
+    return niveaux[0] if niveaux else 4
+
+
+def _proches(nom: str, candidats) -> list:
+    """Candidats proches d'un nom, du plus au moins ressemblant, avec leur ratio."""
+    proches = difflib.get_close_matches(nom, [c for c in candidats if c != nom], n=2, cutoff=0.75)
+    return [(p, difflib.SequenceMatcher(None, nom, p).ratio()) for p in proches]
+
+
+# ═══════════════════════════════════════════════════════════
+# Correcteurs
+# ═══════════════════════════════════════════════════════════
+
+@correcteur('ZeroDivisionError')
+def division_par_zero(erreur: dict):
+    """`a / b` → `(a / b if b != 0 else 0)` (règle du prompt système)."""
+    divisions = [
+        n for n in _noeuds_ligne(erreur, ast.BinOp)
+        if isinstance(n.op, (ast.Div, ast.FloorDiv, ast.Mod))
+        and not (isinstance(n.right, ast.Constant) and n.right.value not in (0, 0.0))
+    ]
+    if not divisions:
+        return None
+    division = max(divisions, key=lambda n: n.col_offset)
+    expression = ast.get_source_segment(erreur['code'], division)
+    diviseur = ast.get_source_segment(erreur['code'], division.right)
+    if isinstance(division.right, ast.BinOp):
+        diviseur = f"({diviseur})"
+    code_corrige = _remplacer(erreur['source'], [
+        (division.col_offset, division.end_col_offset, f"({expression} if {diviseur} != 0 else 0)")
+    ])
+    # Plusieurs divisions sur la ligne, ou diviseur évalué deux fois : moins sûr
+    confiance = 0.9 if len(divisions) == 1 else 0.6
+    if any(isinstance(n, ast.Call) for n in ast.walk(division.right)):
+        confiance = min(confiance, 0.7)
+    return _correction(erreur, code_corrige, f"Division par zéro évitée quand {diviseur} vaut 0", confiance)
+
+
+def _noms_definis(erreur: dict) -> set:
+    noms = set(dir(builtins))
+    if erreur['arbre'] is None:
+        return noms
+    for n in ast.walk(erreur['arbre']):
+        if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store):
+            noms.add(n.id)
+        elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            noms.add(n.name)
+        elif isinstance(n, ast.arg):
+            noms.add(n.arg)
+        elif isinstance(n, (ast.Import, ast.ImportFrom)):
+            noms.update((a.asname or a.name).split('.')[0] for a in n.names)
+    return noms
+
+
+def _position_import(erreur: dict) -> int:
+    """Ligne où insérer un import : après la docstring et les imports __future__."""
+    arbre = erreur['arbre']
+    position = 1
+    for noeud in arbre.body:
+        docstring = isinstance(noeud, ast.Expr) and isinstance(noeud.value, ast.Constant) \
+            and isinstance(noeud.value.value, str) and noeud is arbre.body[0]
+        if docstring or (isinstance(noeud, ast.ImportFrom) and noeud.module == '__future__'):
+            position = noeud.end_lineno + 1
+        else:
+            break
+    return position
+
+
+@correcteur('NameError', 'UnboundLocalError')
+def nom_inconnu(erreur: dict):
+    """Faute de frappe sur un nom défini, ou module standard non importé."""
+    nom = re.search(r"name '(\w+)'", erreur['message'])
+    if nom is None or erreur['arbre'] is None:
+        return None
+    nom = nom.group(1)
+    occurrences = [n for n in _noeuds_ligne(erreur, ast.Name) if n.id == nom]
+    if not occurrences:
+        return None
+
+    suggestion = _SUGGESTION.search(erreur['message'])
+    proches = _proches(nom, _noms_definis(erreur))
+    if suggestion and '.' not in suggestion.group(1):
+        remplacement, confiance = suggestion.group(1), 0.95
+    elif proches and (len(proches) == 1 or proches[0][1] - proches[1][1] >= 0.1):
+        remplacement, confiance = proches[0][0], 0.9 if proches[0][1] >= 0.85 else 0.75
+    elif nom in sys.stdlib_module_names and erreur['type'] == 'NameError':
+        attribut = any(
+            isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name) and n.value.id == nom
+            for n in ast.walk(erreur['arbre'])
+        )
+        position = _position_import(erreur)
+        return {
+            'ligne': position,
+            'action': 'insert',
+            'code_original': '',
+            'code_corrige': f"import {nom}",
+            'explication': f"Module standard '{nom}' utilisé sans être importé",
+            'confiance': 0.9 if attribut else 0.6
+        }
+    else:
+        return None
+
+    code_corrige = _remplacer(erreur['source'], [(n.col_offset, n.end_col_offset, remplacement)
+                                                 for n in occurrences])
+    return _correction(erreur, code_corrige, f"'{nom}' n'est pas défini : '{remplacement}' était attendu",
+                       confiance)
+
+
+@correcteur('AttributeError')
+def attribut_inconnu(erreur: dict):
+    """Faute de frappe sur un attribut (suggestion de l'interpréteur ou méthode proche)."""
+    attribut = re.search(r"'(\w+)' object has no attribute '(\w+)'", erreur['message'])
+    if attribut is None:
+        return None
+    type_objet, nom = attribut.groups()
+    acces = [n for n in _noeuds_ligne(erreur, ast.Attribute) if n.attr == nom]
+    if not acces:
+        return None
+
+    suggestion = _SUGGESTION.search(erreur['message'])
+    if suggestion:
+        remplacement, confiance = suggestion.group(1), 0.9
+    else:
+        candidats = [c for c in dir(getattr(builtins, type_objet, object)) if not c.startswith('_')]
+        proches = _proches(nom, candidats)
+        if not proches:
+            return None
+        remplacement, confiance = proches[0][0], 0.85 if proches[0][1] >= 0.85 else 0.7
+
+    # Seul le nom de l'attribut (fin du noeud) est remplacé
+    longueur = len(nom.encode('utf-8'))
+    code_corrige = _remplacer(erreur['source'], [(n.end_col_offset - longueur, n.end_col_offset, remplacement)
+                                                 for n in acces])
+    return _correction(erreur, code_corrige, f"'{type_objet}' n'a pas d'attribut '{nom}' : "
+                                             f"'{remplacement}' était attendu", confiance)
+
+
+@correcteur('KeyError')
+def cle_absente(erreur: dict):
+    """`d['cle']` → `d.get('cle')` : change la sémantique, confié au modèle par défaut."""
+    cle = re.match(r"^'(.*)'$", erreur['message'].strip())
+    indices = [
+        n for n in _noeuds_ligne(erreur, ast.Subscript)
+        if isinstance(n.ctx, ast.Load) and isinstance(n.slice, ast.Constant)
+        and (cle is None or str(n.slice.value) == cle.group(1))
+    ]
+    if len(indices) != 1:
+        return None
+    indice = indices[0]
+    objet = ast.get_source_segment(erreur['code'], indice.value)
+    valeur = ast.get_source_segment(erreur['code'], indice.slice)
+    code_corrige = _remplacer(erreur['source'], [(indice.col_offset, indice.end_col_offset,
+                                                  f"{objet}.get({valeur})")])
+    return _correction(erreur, code_corrige, f"Clé {valeur} absente : valeur par défaut None", 0.6)
+
+
+@correcteur('ModuleNotFoundError', 'ImportError')
+def module_mal_orthographie(erreur: dict):
+    """Faute de frappe dans le nom d'un module de la bibliothèque standard."""
+    module = re.search(r"No module named '([\w.]+)'", erreur['message'])
+    if module is None:
+        return None
+    nom = module.group(1).split('.')[0]
+    proches = _proches(nom, sys.stdlib_module_names)
+    if not proches or proches[0][1] < 0.8:
+        return None
+    remplacement = proches[0][0]
+    code_corrige, remplacements = re.subn(rf'(?<![\w.]){re.escape(nom)}\b', remplacement, erreur['source'], count=1)
+    if not remplacements:
+        return None
+    return _correction(erreur, code_corrige, f"Module '{nom}' introuvable : '{remplacement}' était attendu",
+                       0.85 if proches[0][1] >= 0.85 else 0.75)
+
+
+@correcteur('IndentationError', 'TabError')
+def indentation(erreur: dict):
+    """Réaligne la ligne fautive sur l'indentation attendue."""
+    lignes, numero, message = erreur['lignes'], erreur['ligne'], erreur['message']
+    precedentes = [l for l in lignes[:numero - 1] if l.strip() and not l.strip().startswith('#')]
+    actuelle = _indentation(erreur['source'])
+
+    if erreur['type'] == 'TabError' or 'inconsistent use of tabs' in message:
+        cible, confiance = actuelle, 0.85
+    elif 'unexpected indent' in message:
+        if not precedentes or precedentes[-1].rstrip().endswith(':'):
+            return None
+        cible, confiance = _indentation(precedentes[-1]), 0.85
+    elif 'expected an indented block' in message:
+        entete = re.search(r'on line (\d+)', message)
+        entete = lignes[int(entete.group(1)) - 1] if entete else (precedentes[-1] if precedentes else '')
+        # Ambigu : indenter la ligne ou ajouter un corps vide ? Confié au modèle par défaut
+        cible, confiance = _indentation(entete) + _pas_indentation(lignes), 0.7
+    elif 'unindent does not match' in message:
+        niveaux = sorted({_indentation(l) for l in precedentes if _indentation(l) < actuelle})
+        if not niveaux:
+            return None
+        cible, confiance = niveaux[-1], 0.8
+    else:
+        return None
+
+    return _correction(erreur, erreur['source'], f"Indentation corrigée ({actuelle} → {cible} espaces)",
+                       confiance, indentation=cible)
@@ -0,0 +1,377 @@
+"""Démon de débogage : session résidente et client léger
+
+Le démon garde en mémoire tout ce qui coûte au démarrage d'un run : backend
+LLM (client HTTP keep-alive, file de requêtes), cache des analyses, base de
+connaissances, templates de prompts et interpréteurs pré-chauffés du
+fork-server. `python main.py` lui soumet le script et affiche la progression
+au fil de l'eau.
+
+Protocole : une requête JSON par connexion, puis des messages JSON (une
+ligne chacun) sur une socket Unix (.agent_cache/agent.sock) ou, sous
+Windows, une socket TCP locale (127.0.0.1:8765). AGENT_DEMON remplace
+l'adresse ("chemin" ou "hote:port").
+
+En TCP, n'importe quel utilisateur de la machine peut se connecter : le
+démon tire un jeton aléatoire, l'écrit dans un fichier réservé à
+l'utilisateur (.agent_cache/demon.jeton) et refuse toute requête qui ne le
+présente pas. Le client le lit et l'ajoute à chaque requête ("jeton").
+
+    client → {"action": "deboguer", "script": "/chemin/absolu.py", "options": {...}}
+    démon  → {"type": "log", "texte": "..."}                  (sortie de la boucle)
+    démon  → {"type": "sortie", "ligne": "..."}               (stdout du script)
+    démon  → {"type": "confirmation", "operations": [...]}    (si auto_apply est faux)
+    client → {"reponse": true}
+    démon  → {"type": "fin", "succes": true, "mesures": {...}, "etapes": [...]}
+
+    client → {"action": "etat"}     démon → {"type": "etat", ...}
+    client → {"action": "arreter"}  démon → {"type": "arret"}
+"""
+import contextlib
+import hmac
+import io
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from src.ai_debugger import PROMPTS_DIR, AIDebugger, template_prompt
+from src.analysis_cache import AnalysisCache
+from src.base_connaissances import BaseConnaissances
+from src.fork_server import fork_server_disponible, obtenir_pool
+from src.limites import LimitesExecution
+from src.llm_backends import creer_backend
+from src.sortie import SortieParThread
+from src.tracing import Tracer, utiliser_tracer
+
+
+# Jeton d'authentification du mode TCP
+FICHIER_JETON = os.path.join('.agent_cache', 'demon.jeton')
+
+# Options de main() transmises par le client
+OPTIONS = ('auto_apply', 'fork_server', 'multi_fault', 'speculatif', 'timeout', 'conversation',
+           'max_iterations', 'max_secondes', 'budget_tokens')
+
+
+def adresse_demon():
+    """Adresse d'écoute : chemin de socket Unix ou (hôte, port)."""
+    valeur = os.environ.get('AGENT_DEMON')
+    if valeur:
+        hote, separateur, port = valeur.rpartition(':')
+        if separateur and port.isdigit():
+            return (hote or '127.0.0.1', int(port))
+        return valeur
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.join('.agent_cache', 'agent.sock')
+    return ('127.0.0.1', 8765)
+
+
+def ecrire_jeton(chemin: str = FICHIER_JETON) -> str:
+    """Tire un nouveau jeton et l'écrit dans un fichier lisible par l'utilisateur seul."""
+    jeton = secrets.token_hex(32)
+    dossier = os.path.dirname(chemin)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    if os.path.exists(chemin):
+        os.remove(chemin)
+    # O_EXCL : le fichier est créé ici avec ses droits, pas hérité d'un autre
+    fd = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(jeton)
+    return jeton
+
+
+def lire_jeton(chemin: str = FICHIER_JETON):
+    """Jeton du démon (None si aucun démon TCP ne l'a écrit)."""
+    try:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _requete(message: dict) -> dict:
+    """Ajoute le jeton du démon à une requête client."""
+    jeton = lire_jeton()
+    if jeton:
+        message['jeton'] = jeton
+    return message
+
+
+def connecter(adresse=None, timeout: float = None) -> socket.socket:
+    """Ouvre une connexion vers le démon (OSError s'il ne répond pas)."""
+    adresse = adresse or adresse_demon()
+    famille = socket.AF_UNIX if isinstance(adresse, str) else socket.AF_INET
+    connexion = socket.socket(famille, socket.SOCK_STREAM)
+    connexion.settimeout(timeout)
+    try:
+        connexion.connect(adresse)
+    except OSError:
+        connexion.close()
+        raise
+    connexion.settimeout(None)
+    return connexion
+
+
+def _envoyer(fichier, message: dict):
+    fichier.write(json.dumps(message, ensure_ascii=False) + "\n")
+    fichier.flush()
+
+
+def requete_demon(action: str, adresse=None, timeout: float = 2.0):
+    """Envoie une requête simple (etat, arreter) ; None si le démon ne répond pas."""
+    try:
+        connexion = connecter(adresse, timeout)
+    except OSError:
+        return None
+    with connexion, connexion.makefile('r', encoding='utf-8') as lecture, \
+            connexion.makefile('w', encoding='utf-8') as ecriture:
+        _envoyer(ecriture, _requete({'action': action}))
+        ligne = lecture.readline()
+    return json.loads(ligne) if ligne else None
+
+
+def soumettre(script: str, options: dict = None, adresse=None, confirmer=None, afficher=print):
+    """Soumet un script au démon et affiche sa progression (client léger).
+
+    Args:
+        script: Chemin du script à déboguer
+        options: Options de main() (voir OPTIONS), plus 'cpu' et 'memoire'
+        adresse: Adresse du démon (défaut: adresse_demon())
+        confirmer: Callback confirmer(operations) -> bool (si auto_apply est faux)
+        afficher: Fonction d'affichage des lignes reçues
+
+    Returns:
+        dict | None: Message de fin du démon, None si aucun démon n'écoute
+    """
+    try:
+        connexion = connecter(adresse, timeout=0.5)
+    except OSError:
+        return None
+    with connexion, connexion.makefile('r', encoding='utf-8') as lecture, \
+            connexion.makefile('w', encoding='utf-8') as ecriture:
+        _envoyer(ecriture, _requete({'action': 'deboguer', 'script': os.path.abspath(script),
+                                     'options': options or {}}))
+        for ligne in lecture:
+            message = json.loads(ligne)
+            if message['type'] == 'log':
+                afficher(message['texte'])
+            elif message['type'] == 'sortie':
+                afficher(f"   │ {message['ligne']}")
+            elif message['type'] == 'confirmation':
+                reponse = bool(confirmer and confirmer(message['operations']))
+                _envoyer(ecriture, {'reponse': reponse})
+            elif message['type'] in ('fin', 'refus'):
+                return message
+    raise ConnectionError("Connexion au démon interrompue avant la fin du débogage")
+
+
+class ClientDeconnecte(Exception):
+    """Le client a fermé la connexion : la session en cours est abandonnée."""
+
+
+class _Canal(io.TextIOBase):
+    """Connexion avec un client : messages JSON, et flux texte pour print()."""
+
+    def __init__(self, lecture, ecriture):
+        self.lecture = lecture
+        self.ecriture = ecriture
+        self._tampon = ""
+        self._lock = threading.Lock()
+
+    def envoyer(self, message: dict):
+        with self._lock:
+            try:
+                _envoyer(self.ecriture, message)
+            except OSError as e:
+                raise ClientDeconnecte(str(e))
+
+    def recevoir(self) -> dict:
+        ligne = self.lecture.readline()
+        if not ligne:
+            raise ClientDeconnecte("connexion fermée")
+        return json.loads(ligne)
+
+    def write(self, texte: str) -> int:
+        """Les lignes écrites (print) sont envoyées au client une par une."""
+        self._tampon += texte
+        *lignes, self._tampon = self._tampon.split("\n")
+        for ligne in lignes:
+            self.envoyer({'type': 'log', 'texte': ligne})
+        return len(texte)
+
+    def flush(self):
+        if self._tampon:
+            ligne, self._tampon = self._tampon, ""
+            self.envoyer({'type': 'log', 'texte': ligne})
+
+
+class DemonDebogage:
+    """Sessions de débogage servies par un processus résident."""
+
+    def __init__(self, boucle, adresse=None, backend=None, cache: AnalysisCache = None,
+                 connaissances: BaseConnaissances = None, fork_server: bool = False):
+        """Initialise le démon et les ressources partagées par les sessions.
+
+        Args:
+            boucle: Boucle de débogage (main.main)
+            adresse: Adresse d'écoute (défaut: adresse_demon())
+            backend: Backend LLM partagé (défaut: creer_backend())
+            cache: Cache des analyses partagé
+            connaissances: Base de connaissances partagée
+            fork_server: Exécution via interpréteurs pré-chauffés par défaut (comme
+                --fork-server ; un client peut aussi le demander par session)
+        """
+        self.boucle = boucle
+        self.adresse = adresse or adresse_demon()
+        self.backend = backend or creer_backend()
+        self.cache = cache or AnalysisCache()
+        self.connaissances = connaissances or BaseConnaissances()
+        self.fork_server = fork_server and fork_server_disponible()
+        if fork_server_disponible():
+            # Sessions simultanées : un interpréteur par CPU plutôt qu'un seul
+            # partagé (sinon un script lent bloque tous les clients)
+            obtenir_pool(sys.executable, taille=os.cpu_count() or 1)
+        self.sortie = SortieParThread(sys.stdout)
+        self.demarrage = time.time()
+        self.sessions = 0
+        self.en_cours = {}
+        self._lock = threading.Lock()
+        self._serveur = None
+        # Jeton exigé des clients (mode TCP uniquement, tiré au démarrage)
+        self.jeton = None
+
+    def prechauffer(self):
+        """Charge les templates de prompts avant la première session."""
+        for nom in sorted(os.listdir(PROMPTS_DIR)):
+            if nom.endswith('.txt'):
+                template_prompt(nom).text
+
+    def etat(self) -> dict:
+        """Sessions en cours et ressources résidentes."""
+        with self._lock:
+            en_cours = sorted(self.en_cours)
+        return {
+            'type': 'etat',
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.demarrage, 1),
+            'sessions': self.sessions,
+            'en_cours': en_cours,
+            'modele': self.backend.model,
+            'fork_server': self.fork_server,
+            'connaissances': len(self.connaissances)
+        }
+
+    def servir(self):
+        """Écoute jusqu'à l'arrêt (Ctrl+C ou requête 'arreter')."""
+        demon = self
+
+        class Gestionnaire(socketserver.StreamRequestHandler):
+            def handle(self):
+                lecture = io.TextIOWrapper(self.rfile, encoding='utf-8')
+                ecriture = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                demon.traiter(_Canal(lecture, ecriture))
+
+        if isinstance(self.adresse, str):
+            if os.path.exists(self.adresse):
+                if requete_demon('etat', self.adresse) is not None:
+                    raise RuntimeError(f"Un démon écoute déjà sur {self.adresse}")
+                os.remove(self.adresse)
+            dossier = os.path.dirname(self.adresse)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+            serveur = socketserver.ThreadingUnixStreamServer(self.adresse, Gestionnaire)
+            # Le démon exécute les scripts reçus : socket réservée à l'utilisateur
+            os.chmod(self.adresse, 0o600)
+        else:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            serveur = socketserver.ThreadingTCPServer(self.adresse, Gestionnaire)
+            # Socket accessible à tous les utilisateurs : requêtes authentifiées par jeton
+            self.jeton = ecrire_jeton()
+        serveur.daemon_threads = True
+        self._serveur = serveur
+
+        self.prechauffer()
+        print(f"🛰️  Démon de débogage à l'écoute sur {self.adresse} "
+              f"(backend {self.backend.model}, fork-server {'actif' if self.fork_server else 'inactif'})")
+        try:
+            with serveur, contextlib.redirect_stdout(self.sortie):
+                serveur.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if isinstance(self.adresse, str) and os.path.exists(self.adresse):
+                os.remove(self.adresse)
+            if self.jeton is not None and lire_jeton() == self.jeton:
+                os.remove(FICHIER_JETON)
+            print("🛑 Démon arrêté")
+
+    def traiter(self, canal: _Canal):
+        """Traite la requête d'une connexion."""
+        try:
+            requete = canal.recevoir()
+            action = requete.get('action')
+            if self.jeton is not None and not hmac.compare_digest(str(requete.get('jeton', '')), self.jeton):
+                print(f"🔒 Requête '{action}' refusée : jeton absent ou invalide")
+                canal.envoyer({'type': 'refus', 'raison': f"Jeton invalide (voir {FICHIER_JETON})"})
+            elif action == 'deboguer':
+                self.deboguer(canal, requete['script'], requete.get('options') or {})
+            elif action == 'etat':
+                canal.envoyer(self.etat())
+            elif action == 'arreter':
+                canal.envoyer({'type': 'arret'})
+                threading.Thread(target=self._serveur.shutdown, daemon=True).start()
+            else:
+                canal.envoyer({'type': 'refus', 'raison': f"Action inconnue: {action}"})
+        except (ClientDeconnecte, json.JSONDecodeError, KeyError):
+            pass
+
+    def deboguer(self, canal: _Canal, script: str, options: dict):
+        """Session de débogage d'un script, sortie envoyée au client."""
+        script = os.path.abspath(script)
+        with self._lock:
+            if script in self.en_cours:
+                canal.envoyer({'type': 'refus', 'raison': f"{script} est déjà en cours de débogage"})
+                return
+            self.en_cours[script] = time.time()
+            self.sessions += 1
+            numero = self.sessions
+        print(f"📥 Session {numero}: {script}")
+
+        def confirmer(operations: list) -> bool:
+            canal.envoyer({'type': 'confirmation', 'operations': operations})
+            return bool(canal.recevoir().get('reponse'))
+
+        def sortie_script(flux: str, ligne: str):
+            if flux == 'stdout':
+                canal.envoyer({'type': 'sortie', 'ligne': ligne})
+
+        parametres = {cle: options[cle] for cle in OPTIONS if cle in options}
+        parametres.setdefault('fork_server', self.fork_server)
+        limites = LimitesExecution(cpu_secondes=options.get('cpu'), memoire_mo=options.get('memoire'))
+        tracer = Tracer()
+        mesures = {}
+        succes = False
+        debut = time.perf_counter()
+        try:
+            with self.sortie.capturer(canal), utiliser_tracer(tracer):
+                try:
+                    debugger = AIDebugger(cache=self.cache, backend=self.backend,
+                                          connaissances=self.connaissances)
+                    succes = self.boucle(script, debugger=debugger, limites=limites, mesures=mesures,
+                                         on_line=sortie_script, confirmer=confirmer, **parametres)
+                except ClientDeconnecte:
+                    raise
+                except Exception as e:
+                    print(f"❌ Exception: {e}")
+                canal.flush()
+            canal.envoyer({'type': 'fin', 'succes': succes, 'mesures': mesures, 'etapes': tracer.resume()})
+        except ClientDeconnecte:
+            print(f"🔌 Session {numero}: client déconnecté")
+        finally:
+            with self._lock:
+                self.en_cours.pop(script, None)
+        print(f"📤 Session {numero}: {'succès' if succes else 'échec'} en {time.perf_counter() - debut:.1f}s")
@@ -1,18 +1,216 @@
 """Exécuteur de scripts Python avec capture stdout/stderr"""
+import codecs
+import io
+import json
+import locale
 import subprocess
 import sys
 import os
+import tempfile
+import threading
+import time
+from collections import deque
 
+from src.fork_server import fork_server_disponible, obtenir_pool
+from src.limites import HistoriqueDurees, LimitesExecution, classer_arret, historique_par_defaut
+from src.tracing import span
 
-def executer_script(chemin_script, venv_python=None):
+
+# Taille maximale conservée par flux (moitié début, moitié fin)
+MAX_OUTPUT = 64 * 1024
+# Au-delà, une ligne sans saut de ligne est transmise au callback par morceaux
+MAX_LIGNE = 4096
+
+
+class BoundedBuffer:
+    """Tampon borné : garde le début et la fin d'un flux, omet le milieu."""
+
+    def __init__(self, limite: int = MAX_OUTPUT):
+        """Initialise le tampon (limite en caractères)."""
+        self.max_tete = limite // 2
+        self.max_queue = limite - self.max_tete
+        self.tete = []
+        self.taille_tete = 0
+        self.queue = deque()
+        self.taille_queue = 0
+        self.omis = 0
+
+    def write(self, texte: str):
+        """Ajoute du texte au tampon."""
+        if self.taille_tete < self.max_tete:
+            morceau = texte[:self.max_tete - self.taille_tete]
+            self.tete.append(morceau)
+            self.taille_tete += len(morceau)
+            texte = texte[len(morceau):]
+        if not texte:
+            return
+        
+        self.queue.append(texte)
+        self.taille_queue += len(texte)
+        while self.taille_queue > self.max_queue:
+            exces = self.taille_queue - self.max_queue
+            premier = self.queue[0]
+            if len(premier) <= exces:
+                self.queue.popleft()
+                retire = len(premier)
+            else:
+                self.queue[0] = premier[exces:]
+                retire = exces
+            self.taille_queue -= retire
+            self.omis += retire
+
+    def getvalue(self) -> str:
+        """Contenu conservé (avec un marqueur si une partie a été omise)."""
+        milieu = f"\n... [{self.omis} caractères omis] ...\n" if self.omis else ""
+        return "".join(self.tete) + milieu + "".join(self.queue)
+
+
+def _lire_flux(pipe, nom: str, tampon: BoundedBuffer, on_line):
+    """Lit un pipe au fil de l'eau (thread dédié)."""
+    decodeur = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='replace'),
+        translate=True
+    )
+    partiel = ""
+    fd = pipe.fileno()
+    while True:
+        donnees = os.read(fd, 65536)
+        texte = decodeur.decode(donnees, final=not donnees)
+        tampon.write(texte)
+        
+        if on_line is not None:
+            partiel += texte
+            *lignes, partiel = partiel.split("\n")
+            if len(partiel) > MAX_LIGNE:
+                lignes.append(partiel)
+                partiel = ""
+            if not donnees and partiel:
+                lignes.append(partiel)
+            for ligne in lignes:
+                try:
+                    on_line(nom, ligne)
+                except Exception:
+                    pass
+        
+        if not donnees:
+            break
+    pipe.close()
+
+
+def _executer_processus(commande, timeout, env=None, on_line=None, max_output=MAX_OUTPUT,
+                        limites: LimitesExecution = None, annulation: threading.Event = None) -> dict:
+    """Lance une commande en lisant stdout/stderr en continu, avec sortie bornée.
+    
+    Le processus est tué si `annulation` est levé avant la fin.
+    
+    Returns:
+        dict: {'stdout': str, 'stderr': str, 'returncode': int, 'timeout': bool,
+               'annule': bool, 'duree': float}
+    """
+    debut = time.monotonic()
+    processus = subprocess.Popen(
+        commande,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        preexec_fn=limites.preexec() if limites is not None else None
+    )
+    tampons = {'stdout': BoundedBuffer(max_output), 'stderr': BoundedBuffer(max_output)}
+    lecteurs = [
+        threading.Thread(target=_lire_flux, args=(pipe, nom, tampons[nom], on_line), daemon=True)
+        for nom, pipe in (('stdout', processus.stdout), ('stderr', processus.stderr))
+    ]
+    for lecteur in lecteurs:
+        lecteur.start()
+    
+    timeout_atteint = False
+    annule = False
+    limite = debut + timeout if timeout is not None else float('inf')
+    while True:
+        tranche = limite - time.monotonic()
+        if annulation is not None:
+            # Attente par tranches pour réagir rapidement à l'annulation
+            tranche = min(tranche, 0.05)
+        try:
+            processus.wait(timeout=max(tranche, 0) if tranche != float('inf') else None)
+            break
+        except subprocess.TimeoutExpired:
+            if annulation is not None and annulation.is_set():
+                annule = True
+            elif time.monotonic() < limite:
+                continue
+            else:
+                timeout_atteint = True
+            processus.kill()
+            processus.wait()
+            break
+    duree = time.monotonic() - debut
+    for lecteur in lecteurs:
+        lecteur.join()
+    
+    return {
+        'stdout': tampons['stdout'].getvalue(),
+        'stderr': tampons['stderr'].getvalue(),
+        'returncode': processus.returncode,
+        'timeout': timeout_atteint,
+        'annule': annule,
+        'duree': duree
+    }
+
+
+def _finaliser(resultat: dict, timeout: float, limites: LimitesExecution = None) -> dict:
+    """Ajoute au résultat la cause d'un éventuel arrêt forcé.
+    
+    Champs ajoutés : 'duree', 'timeout', 'tue_par' (None, 'temps', 'memoire',
+    'signal' ou 'annulation') et 'signal'.
+    """
+    resultat.update(classer_arret(resultat['returncode'], resultat['timeout'], resultat['stderr'], limites))
+    if resultat.get('annule'):
+        resultat.update(tue_par='annulation', stderr="Exécution annulée", returncode=-1)
+    elif resultat['timeout']:
+        # La sortie partielle est conservée pour le diagnostic
+        resultat['stderr'] = f"Timeout dépassé ({timeout:g}s)"
+        resultat['returncode'] = -1
+    elif resultat['tue_par'] == 'temps':
+        if resultat['stderr'] and not resultat['stderr'].endswith('\n'):
+            resultat['stderr'] += '\n'
+        resultat['stderr'] += "Limite de temps CPU dépassée"
+    elif resultat['tue_par'] == 'memoire' and not resultat['stderr']:
+        resultat['stderr'] = "Limite mémoire dépassée"
+    elif resultat['tue_par'] is not None and not resultat['stderr']:
+        resultat['stderr'] = f"Processus arrêté par le signal {resultat['signal']}"
+    resultat['duree'] = round(resultat['duree'], 3)
+    return resultat
+
+
+def executer_script(chemin_script, venv_python=None, fork_server=False, env=None,
+                    on_line=None, max_output=MAX_OUTPUT, timeout=None,
+                    limites: LimitesExecution = None, historique: HistoriqueDurees = None,
+                    annulation: threading.Event = None):
     """Exécute un script Python et capture les sorties.
     
+    Les sorties sont lues au fil de l'eau et seuls le début et la fin de
+    chaque flux sont conservés (mémoire bornée quelle que soit la sortie).
+    
     Args:
         chemin_script: Chemin vers le script à exécuter
         venv_python: Chemin Python du venv (optionnel)
+        fork_server: Si True, exécute via un interpréteur pré-chauffé
+            (ignoré si os.fork n'est pas disponible, si env ou des limites sont fournis)
+        env: Variables d'environnement du processus (optionnel)
+        on_line: Callback on_line(flux, ligne) appelé pour chaque ligne
+            ('stdout' ou 'stderr') ; en mode fork-server, appelé en fin d'exécution
+        max_output: Nombre maximal de caractères conservés par flux
+        timeout: Timeout en secondes (par défaut : adaptatif selon l'historique du script)
+        limites: Limites CPU/mémoire/fichiers/processus (POSIX uniquement)
+        historique: Historique des durées (par défaut : .agent_cache/durees.json)
+        annulation: Événement qui tue le script s'il est levé (mode subprocess ;
+            une exécution fork-server va à son terme)
     
     Returns:
-        dict: {'stdout': str, 'stderr': str, 'returncode': int}
+        dict: {'stdout': str, 'stderr': str, 'returncode': int, 'duree': float,
+               'timeout': bool, 'tue_par': str | None, 'signal': int | None}
     """
     python_executable = venv_python if (venv_python and os.path.exists(venv_python)) else sys.executable
     print(f"✓ Python utilisé: {python_executable}")
@@ -20,18 +218,126 @@ def executer_script(chemin_script, venv_python=None):
     if not os.path.exists(chemin_script):
         return {'stdout': '', 'stderr': f"Fichier inexistant: {chemin_script}", 'returncode': -1}
     
-    print(f"✓ Exécution: {chemin_script}\n" + "=" * 60)
+    historique = historique or historique_par_defaut()
+    if timeout is None:
+        timeout = historique.timeout_adaptatif(chemin_script)
+    
+    print(f"✓ Exécution: {chemin_script} (timeout {timeout:g}s)\n" + "=" * 60)
+    
+    with span('execution', script=os.path.basename(chemin_script), timeout=timeout) as etape:
+        resultat = None
+        sans_limites = limites is None or not limites.actives()
+        if fork_server and env is None and sans_limites and fork_server_disponible():
+            try:
+                debut = time.monotonic()
+                resultat = obtenir_pool(python_executable).run(chemin_script, timeout=timeout,
+                                                               max_output=max_output)
+                resultat['duree'] = time.monotonic() - debut
+                etape.attributs['mode'] = 'fork-server'
+                for nom in ('stdout', 'stderr'):
+                    if on_line is not None:
+                        for ligne in resultat[nom].splitlines():
+                            on_line(nom, ligne)
+                    tampon = BoundedBuffer(max_output)
+                    tampon.write(resultat[nom])
+                    resultat[nom] = tampon.getvalue()
+            except Exception as e:
+                print(f"⚠️  Fork-server indisponible ({e}) - exécution classique")
+                resultat = None
+    
+        if resultat is None:
+            try:
+                resultat = _executer_processus(
+                    [python_executable, chemin_script],
+                    timeout=timeout,
+                    env=env,
+                    on_line=on_line,
+                    max_output=max_output,
+                    limites=limites,
+                    annulation=annulation
+                )
+            except Exception as e:
+                etape.attributs['resultat'] = 'erreur'
+                return {'stdout': '', 'stderr': f"Erreur: {e}", 'returncode': -1}
+    
+        resultat = _finaliser(resultat, timeout, limites)
+        etape.attributs.setdefault('mode', 'subprocess')
+        etape.attributs.update(returncode=resultat['returncode'], tue_par=resultat['tue_par'],
+                               resultat='succes' if not resultat['stderr'] else 'erreur')
+        # Seules les exécutions complètes renseignent la durée normale du script ;
+        # un timeout dépassé relève le suivant (script légitimement lent)
+        if resultat['tue_par'] is None and resultat['returncode'] == 0:
+            historique.enregistrer(chemin_script, resultat['duree'])
+        elif resultat.get('timeout') and not resultat.get('annule'):
+            historique.enregistrer_depassement(chemin_script, timeout)
+        return resultat
+
+
+def executer_script_multi(chemin_script, venv_python=None, on_line=None, max_output=MAX_OUTPUT,
+                          timeout=None, limites: LimitesExecution = None,
+                          historique: HistoriqueDurees = None, annulation: threading.Event = None):
+    """Exécute un script en collectant toutes ses erreurs (mode multi-erreurs).
+    
+    Chaque instruction de niveau module est isolée : une exception n'arrête
+    pas l'exécution des instructions suivantes.
+    
+    Args:
+        chemin_script: Chemin vers le script à exécuter
+        venv_python: Chemin Python du venv (optionnel)
+        on_line: Callback on_line(flux, ligne) appelé pour chaque ligne
+        max_output: Nombre maximal de caractères conservés par flux
+        timeout: Timeout en secondes (par défaut : adaptatif selon l'historique du script)
+        limites: Limites CPU/mémoire/fichiers/processus (POSIX uniquement)
+        historique: Historique des durées (par défaut : .agent_cache/durees.json)
+        annulation: Événement qui tue le script s'il est levé
+    
+    Returns:
+        dict: Champs de executer_script + 'erreurs': [{'type', 'message', 'ligne', 'traceback'}]
+    """
+    python_executable = venv_python if (venv_python and os.path.exists(venv_python)) else sys.executable
+    print(f"✓ Python utilisé: {python_executable}")
     
+    if not os.path.exists(chemin_script):
+        return {'stdout': '', 'stderr': f"Fichier inexistant: {chemin_script}", 'returncode': -1, 'erreurs': []}
+    
+    historique = historique or historique_par_defaut()
+    if timeout is None:
+        timeout = historique.timeout_adaptatif(chemin_script)
+    
+    print(f"✓ Exécution multi-erreurs: {chemin_script} (timeout {timeout:g}s)\n" + "=" * 60)
+    
+    runner = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'multi_fault_runner.py')
+    fd, sortie_json = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
     try:
-        resultat = subprocess.run(
-            [python_executable, chemin_script],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        return {'stdout': resultat.stdout, 'stderr': resultat.stderr, 'returncode': resultat.returncode}
-    
-    except subprocess.TimeoutExpired:
-        return {'stdout': '', 'stderr': "Timeout dépassé (10s)", 'returncode': -1}
+        with span('execution', script=os.path.basename(chemin_script), timeout=timeout,
+                  mode='multi-erreurs') as etape:
+            resultat = _executer_processus(
+                [python_executable, runner, os.path.abspath(chemin_script), sortie_json],
+                timeout=timeout,
+                on_line=on_line,
+                max_output=max_output,
+                limites=limites,
+                annulation=annulation
+            )
+            resultat = _finaliser(resultat, timeout, limites)
+            resultat['erreurs'] = []
+            if resultat.get('timeout') and not resultat.get('annule'):
+                historique.enregistrer_depassement(chemin_script, timeout)
+            if resultat['tue_par'] is None:
+                if resultat['returncode'] == 0:
+                    historique.enregistrer(chemin_script, resultat['duree'])
+                try:
+                    with open(sortie_json, 'r', encoding='utf-8') as f:
+                        resultat['erreurs'] = json.load(f)
+                except (OSError, ValueError):
+                    pass
+            etape.attributs.update(returncode=resultat['returncode'], tue_par=resultat['tue_par'],
+                                   erreurs=len(resultat['erreurs']),
+                                   resultat='succes' if not resultat['stderr'] else 'erreur')
+            return resultat
+    
     except Exception as e:
-        return {'stdout': '', 'stderr': f"Erreur: {e}", 'returncode': -1}
+        return {'stdout': '', 'stderr': f"Erreur: {e}", 'returncode': -1, 'erreurs': []}
+    finally:
+        os.remove(sortie_json)
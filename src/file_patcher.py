@@ -1,9 +1,74 @@
 """Système de patch automatique pour modifier fichiers source"""
+import hashlib
 import os
 import shutil
-from datetime import datetime
+import tempfile
 from typing import List, Dict
-import ast
+
+from src.backup_store import BackupStore
+from src.cibles_patch import reindenter, resoudre_cible
+from src.tracing import span
+
+
+class ConflitPatch(ValueError):
+    """Deux opérations d'un même patch modifient des lignes communes."""
+
+
+def corrections_vers_operations(corrections: dict) -> List[Dict]:
+    """Convertit la réponse de l'IA en opérations de patch.
+    
+    Args:
+        corrections: Réponse de AIDebugger.analyze_error
+    
+    Returns:
+        list: [{"action": "replace", "line": 5, "content": "..."}]
+    
+    Une correction peut préciser 'action' ('insert' pour ajouter des lignes
+    avant `ligne`, 'delete' pour supprimer), 'ligne_fin' (dernière ligne
+    remplacée), 'noeud' (cible AST désignée par `ligne`, voir
+    src/cibles_patch.py) et 'indentation' (nombre d'espaces imposé au lieu
+    de l'indentation de la ligne d'origine). `code_corrige` peut compter
+    plusieurs lignes.
+    """
+    operations = []
+    for corr in corrections.get('corrections', []):
+        ligne = corr.get('ligne')
+        code_corrige = corr.get('code_corrige')
+        action = corr.get('action') if corr.get('action') in ('insert', 'delete') else 'replace'
+        
+        if isinstance(ligne, int) and (code_corrige or action == 'delete'):
+            # Lignes vides et espaces de fin retirés, indentation relative conservée
+            operation = {
+                'action': action,
+                'line': ligne,
+                'content': str(code_corrige or '').rstrip().lstrip('\n')
+            }
+            if isinstance(corr.get('ligne_fin'), int) and corr['ligne_fin'] > ligne:
+                operation['end_line'] = corr['ligne_fin']
+            if corr.get('noeud'):
+                operation['node'] = corr['noeud']
+            if isinstance(corr.get('indentation'), int):
+                operation['indentation'] = corr['indentation']
+            operations.append(operation)
+    return operations
+
+
+def empreinte_fichier(chemin: str):
+    """Empreinte SHA-256 du texte d'un fichier (None s'il est illisible)."""
+    try:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            return hashlib.sha256(f.read().encode('utf-8')).hexdigest()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def decrire_operation(op: Dict) -> str:
+    """Résumé d'une opération : "Ligne 5: remplacement", "Lignes 5-8: suppression"..."""
+    libelle = {'insert': 'insertion', 'delete': 'suppression'}.get(op.get('action'), 'remplacement')
+    cible = f"Lignes {op['line']}-{op['end_line']}" if op.get('end_line') else f"Ligne {op['line']}"
+    if op.get('node'):
+        cible += f" ({op['node']})"
+    return f"{cible}: {libelle}"
 
 
 class FilePatcher:
@@ -12,24 +77,46 @@ class FilePatcher:
     def __init__(self, backup_dir: str = "backups"):
         """Initialise le patcher."""
         self.backup_dir = backup_dir
-        os.makedirs(backup_dir, exist_ok=True)
+        self.store = BackupStore(backup_dir)
+        # Empreinte du dernier contenu écrit par fichier (mode surveillance :
+        # les écritures de l'agent ne sont pas des modifications de l'utilisateur)
+        self.ecritures = {}
     
     def create_backup(self, file_path: str) -> str:
-        """Crée une sauvegarde avec timestamp."""
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Fichier non trouvé: {file_path}")
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.basename(file_path)
-        backup_path = os.path.join(self.backup_dir, f"{filename}.backup_{timestamp}")
+        """Crée une sauvegarde (dédupliquée par contenu).
         
-        shutil.copy2(file_path, backup_path)
-        print(f"💾 Backup créé: {backup_path}")
+        Returns:
+            str: Chemin de l'objet stocké
+        """
+        revision = self.store.snapshot(file_path)
+        backup_path = self.store.object_path(revision['hash'])
+        print(f"💾 Backup créé: {os.path.basename(file_path)} révision {revision['revision']} ({revision['hash'][:12]})")
         return backup_path
     
+    def restore_backup(self, file_path: str, revision: int = None) -> bool:
+        """Restaure le fichier à une révision (par défaut la dernière sauvegardée)."""
+        try:
+            cible = self.store.restore(file_path, revision)
+            self.ecritures[os.path.abspath(file_path)] = empreinte_fichier(file_path)
+            print(f"♻️  Restauration: {os.path.basename(file_path)} révision {cible['revision']}")
+            return True
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ Restauration impossible: {e}")
+            return False
+    
     def apply_patch(self, file_path: str, operations: List[Dict], create_backup: bool = True) -> bool:
         """Applique les opérations de patch.
         
+        Le patch est construit en mémoire en un seul passage, validé
+        (compilation du source), puis écrit de façon atomique : le fichier
+        n'est jamais laissé dans un état intermédiaire.
+        
+        Les numéros de ligne se réfèrent tous au fichier d'origine. Pour une
+        même ligne, les insertions sont placées avant la ligne, puis la ligne
+        est remplacée ou supprimée. Une opération peut viser une plage
+        ('end_line') ou un noeud AST ('node') ; deux opérations qui modifient
+        des lignes communes sont refusées (conflit).
+        
         Args:
             file_path: Chemin du fichier
             operations: Liste d'opérations [{"action": "replace", "line": 5, "content": "..."}]
@@ -38,78 +125,157 @@ class FilePatcher:
         Returns:
             bool: True si succès
         """
-        try:
-            # Backup (optionnel)
-            if create_backup:
-                backup_path = self.create_backup(file_path)
+        with span('patch', fichier=os.path.basename(file_path), operations=len(operations)) as etape:
+            try:
+                # Backup (optionnel)
+                if create_backup:
+                    self.create_backup(file_path)
+            
+                # Lecture
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
             
-            # Lecture
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+                # Application des opérations (un seul passage)
+                source = ''.join(self._appliquer_operations(lines, operations))
             
-            # Application des opérations (ordre décroissant)
-            operations_sorted = sorted(operations, key=lambda x: x.get('line', 0), reverse=True)
+                # Validation syntaxique (en mémoire, avant toute écriture)
+                if not self._validate_source(source, file_path):
+                    print("❌ Syntaxe invalide - fichier non modifié")
+                    etape.attributs['resultat'] = 'syntaxe_invalide'
+                    return False
             
-            for op in operations_sorted:
-                action = op.get('action')
-                line = op.get('line')
-                content = op.get('content', '')
-                
-                if action == 'replace' and 1 <= line <= len(lines):
-                    # Conserver l'indentation de la ligne originale
-                    original_line = lines[line-1]
-                    original_indent = len(original_line) - len(original_line.lstrip())
-                    
-                    # Appliquer l'indentation au nouveau contenu
-                    content = ' ' * original_indent + content.lstrip()
-                    
-                    if not content.endswith('\n'):
-                        content += '\n'
-                    
-                    print(f"🔄 Remplacement ligne {line}")
-                    lines[line-1] = content
-                
-                elif action == 'insert':
-                    if not content.endswith('\n'):
-                        content += '\n'
-                    print(f"➕ Insertion ligne {line}")
-                    if line == 0:
-                        lines = [content] + lines
-                    elif line > len(lines):
-                        lines.append(content)
-                    else:
-                        lines = lines[:line-1] + [content] + lines[line-1:]
-                
-                elif action == 'delete' and 1 <= line <= len(lines):
-                    print(f"🗑️  Suppression ligne {line}")
-                    lines = lines[:line-1] + lines[line:]
+                # Écriture atomique
+                self._ecrire_atomique(file_path, source)
             
-            # Écriture
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
+                print(f"✅ Patch appliqué avec succès ({len(operations)} opération(s))")
+                etape.attributs['resultat'] = 'succes'
+                return True
             
-            # Validation syntaxique
-            if not self._validate_syntax(file_path):
-                print("❌ Syntaxe invalide - Restauration du backup")
-                shutil.copy2(backup_path, file_path)
+            except ConflitPatch as e:
+                print(f"❌ Opérations en conflit ({e}) - fichier non modifié")
+                etape.attributs['resultat'] = 'conflit'
                 return False
             
-            print(f"✅ Patch appliqué avec succès ({len(operations)} opération(s))")
-            return True
+            except Exception as e:
+                print(f"❌ Erreur lors du patch: {e}")
+                etape.statut = 'erreur'
+                etape.attributs['erreur'] = str(e)
+                return False
+    
+    def _appliquer_operations(self, lines: List[str], operations: List[Dict]) -> List[str]:
+        """Construit les nouvelles lignes en un seul passage sur le buffer.
+        
+        Raises:
+            ConflitPatch: Deux opérations modifient des lignes communes
+        """
+        inserts = {}
+        # Plages remplacées ou supprimées : (début, fin) -> nouvelles lignes
+        plages = {}
+        
+        for op in operations:
+            action = op.get('action')
+            line = op.get('line')
+            content = op.get('content', '')
             
-        except Exception as e:
-            print(f"❌ Erreur lors du patch: {e}")
-            if 'backup_path' in locals():
-                shutil.copy2(backup_path, file_path)
-            return False
+            if action == 'insert':
+                # Ligne 0 : début du fichier ; au-delà de la fin : ajout en fin
+                position = min(max(line, 1), len(lines) + 1)
+                voisine = lines[position - 1] if position <= len(lines) else ''
+                prefixe = voisine[:len(voisine) - len(voisine.lstrip())]
+                if 'indentation' in op:
+                    prefixe = ' ' * op['indentation']
+                nouvelles = reindenter(content, prefixe, len(prefixe.expandtabs(4)))
+                if nouvelles in inserts.get(position, []):
+                    continue
+                print(f"➕ Insertion ligne {line}")
+                inserts.setdefault(position, []).append(nouvelles)
+                continue
+            
+            if action not in ('replace', 'delete'):
+                continue
+            if not 1 <= line <= len(lines):
+                print(f"⚠️  Ligne {line} hors du fichier - opération ignorée")
+                continue
+            if op.get('node'):
+                debut, fin = resoudre_cible(lines, line, op['node'])
+            else:
+                debut, fin = line, min(max(op.get('end_line') or line, line), len(lines))
+            
+            if action == 'replace':
+                # Indentation de la première ligne visée (sauf indentation imposée)
+                original_line = lines[debut - 1]
+                prefixe = original_line[:len(original_line) - len(original_line.lstrip())]
+                if 'indentation' in op:
+                    prefixe = ' ' * op['indentation']
+                origine = len(original_line.expandtabs(4)) - len(original_line.expandtabs(4).lstrip())
+                nouvelles = reindenter(content, prefixe, origine)
+            else:
+                nouvelles = []
+            
+            if plages.get((debut, fin)) == nouvelles:
+                continue
+            for (autre_debut, autre_fin) in plages:
+                if debut <= autre_fin and autre_debut <= fin:
+                    raise ConflitPatch(f"lignes {debut}-{fin} et {autre_debut}-{autre_fin} modifiées par deux opérations")
+            cible = f"ligne {debut}" if debut == fin else f"lignes {debut}-{fin}"
+            if op.get('node'):
+                cible = f"{op['node']} ({cible})"
+            print(f"🔄 Remplacement {cible}" if action == 'replace' else f"🗑️  Suppression {cible}")
+            plages[(debut, fin)] = nouvelles
+        
+        for position in inserts:
+            for (debut, fin) in plages:
+                if debut < position <= fin:
+                    raise ConflitPatch(f"insertion ligne {position} à l'intérieur des lignes {debut}-{fin} remplacées")
+        
+        debuts = {debut: (fin, nouvelles) for (debut, fin), nouvelles in plages.items()}
+        resultat = []
+        numero = 1
+        while numero <= len(lines):
+            for bloc in inserts.get(numero, ()):
+                resultat.extend(bloc)
+            if numero in debuts:
+                fin, nouvelles = debuts[numero]
+                resultat.extend(nouvelles)
+                numero = fin + 1
+                continue
+            resultat.append(lines[numero - 1])
+            numero += 1
+        for bloc in inserts.get(len(lines) + 1, ()):
+            resultat.extend(bloc)
+        
+        # La dernière ligne d'origine peut ne pas finir par un saut de ligne
+        for i in range(len(resultat) - 1):
+            if not resultat[i].endswith('\n'):
+                resultat[i] += '\n'
+        return resultat
     
-    def _validate_syntax(self, file_path: str) -> bool:
-        """Valide la syntaxe Python du fichier."""
+    def _ecrire_atomique(self, file_path: str, source: str):
+        """Écrit via un fichier temporaire puis os.replace (atomique)."""
+        dossier = os.path.dirname(os.path.abspath(file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=dossier, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                ast.parse(f.read())
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(source)
+            shutil.copymode(file_path, tmp_path)
+            self.ecritures[os.path.abspath(file_path)] = hashlib.sha256(source.encode('utf-8')).hexdigest()
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def _validate_source(self, source: str, file_path: str = "<patch>") -> bool:
+        """Valide la syntaxe Python d'un source en mémoire."""
+        try:
+            compile(source, file_path, 'exec', dont_inherit=True)
             print("✓ Syntaxe Python valide")
             return True
-        except SyntaxError as e:
+        except (SyntaxError, ValueError) as e:
             print(f"✗ Erreur de syntaxe: {e}")
             return False
+    
+    def _validate_syntax(self, file_path: str) -> bool:
+        """Valide la syntaxe Python du fichier."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return self._validate_source(f.read(), file_path)
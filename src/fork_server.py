@@ -0,0 +1,335 @@
+"""Serveur de fork : interpréteurs pré-chauffés pour exécuter les scripts
+
+Un serveur est un interpréteur Python (celui du venv) lancé une seule fois,
+qui importe les modules stables du script cible puis, pour chaque exécution,
+fork un enfant neuf qui lance le script avec `runpy`. L'enfant hérite des
+imports déjà faits : seul le code propre au script est exécuté.
+
+Les sorties de l'enfant sont lues par le serveur pendant l'exécution et
+seuls leur début et leur fin sont conservés (comme BoundedBuffer pour une
+exécution classique) : ni la mémoire ni le disque ne croissent avec elles.
+"""
+import ast
+import atexit
+import json
+import os
+import queue
+import subprocess
+import threading
+
+
+# Code exécuté par l'interpréteur du venv (autonome : aucun import du projet)
+_BOOTSTRAP = r'''
+import importlib, json, os, runpy, select, signal, sys, time, traceback
+
+# Le canal de contrôle est isolé : les prints des imports partent vers devnull
+_controle = os.fdopen(os.dup(1), "w", encoding="utf-8")
+os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+_requetes = sys.stdin
+
+for _nom in json.loads(sys.argv[1]):
+    try:
+        importlib.import_module(_nom)
+    except BaseException:
+        pass
+
+
+def _afficher_traceback(exc):
+    te = traceback.TracebackException.from_exception(exc)
+    te.stack = traceback.StackSummary.from_list(
+        [f for f in te.stack if f.filename not in (runpy.__file__, "<frozen runpy>", "<string>")]
+    )
+    sys.stderr.write("".join(te.format()))
+
+
+class _Borne:
+    """Début et fin d'un flux d'octets, le milieu est omis."""
+
+    def __init__(self, limite):
+        self.max_tete = limite // 2
+        self.max_queue = limite - self.max_tete
+        self.tete = bytearray()
+        self.queue = bytearray()
+        self.omis = 0
+
+    def write(self, donnees):
+        place = max(self.max_tete - len(self.tete), 0)
+        self.tete += donnees[:place]
+        self.queue += donnees[place:]
+        exces = len(self.queue) - self.max_queue
+        if exces > 0:
+            del self.queue[:exces]
+            self.omis += exces
+
+    def texte(self):
+        milieu = f"\n... [{self.omis} octets omis] ...\n".encode() if self.omis else b""
+        return (bytes(self.tete) + milieu + bytes(self.queue)).decode("utf-8", errors="replace")
+
+
+def _lire(fd, flux, ouverts):
+    """Lit les données disponibles d'un tube ; False s'il est vide ou fermé."""
+    try:
+        donnees = os.read(fd, 65536)
+    except BlockingIOError:
+        return False
+    if not donnees:
+        ouverts.discard(fd)
+        return False
+    flux[fd].write(donnees)
+    return True
+
+
+def _enfant(script, tubes):
+    _controle.close()
+    for _lecture, _ in tubes:
+        os.close(_lecture)
+    os.dup2(tubes[0][1], 1)
+    os.dup2(tubes[1][1], 2)
+    for _, _ecriture in tubes:
+        os.close(_ecriture)
+    entree = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(entree, 0)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(script)
+    code = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            sys.stderr.write(f"{e.code}\n")
+            code = 1
+    except BaseException as e:
+        _afficher_traceback(e)
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+    os._exit(code)
+
+
+_controle.write(json.dumps({"pret": True}) + "\n")
+_controle.flush()
+
+for _ligne in _requetes:
+    _req = json.loads(_ligne)
+    _script = os.path.abspath(_req["script"])
+    _tubes = [os.pipe(), os.pipe()]
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _pid = os.fork()
+    if _pid == 0:
+        _enfant(_script, _tubes)
+    _flux = {}
+    for _lecture, _ecriture in _tubes:
+        os.close(_ecriture)
+        os.set_blocking(_lecture, False)
+        _flux[_lecture] = _Borne(_req["max_output"])
+    _ouverts = set(_flux)
+    _limite = time.monotonic() + _req["timeout"]
+    _timeout = False
+    while True:
+        if _ouverts:
+            for _fd in select.select(list(_ouverts), [], [], 0.002)[0]:
+                _lire(_fd, _flux, _ouverts)
+        else:
+            time.sleep(0.002)
+        _fini, _statut = os.waitpid(_pid, os.WNOHANG)
+        if _fini:
+            break
+        if time.monotonic() > _limite:
+            os.kill(_pid, signal.SIGKILL)
+            _fini, _statut = os.waitpid(_pid, 0)
+            _timeout = True
+            break
+    # Reste des tubes, sans attendre un éventuel petit-enfant qui les garderait ouverts
+    for _fd in list(_ouverts):
+        while _lire(_fd, _flux, _ouverts):
+            pass
+    _resultat = {}
+    for _cle, (_lecture, _) in zip(("stdout", "stderr"), _tubes):
+        _resultat[_cle] = _flux[_lecture].texte()
+        os.close(_lecture)
+    _resultat["returncode"] = os.waitstatus_to_exitcode(_statut)
+    _resultat["timeout"] = _timeout
+    _controle.write(json.dumps(_resultat) + "\n")
+    _controle.flush()
+'''
+
+
+def fork_server_disponible() -> bool:
+    """Le mode fork-server nécessite os.fork (indisponible sous Windows)."""
+    return hasattr(os, 'fork')
+
+
+def modules_stables(chemin_script: str) -> set:
+    """Liste les modules importés par le script qui ne sont pas locaux.
+
+    Les modules situés à côté du script (fichier .py ou package) sont exclus :
+    ils peuvent être modifiés entre deux itérations et doivent être ré-importés.
+    """
+    try:
+        with open(chemin_script, 'r', encoding='utf-8') as f:
+            arbre = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return set()
+
+    noms = set()
+    for noeud in ast.walk(arbre):
+        if isinstance(noeud, ast.Import):
+            noms.update(alias.name.split('.')[0] for alias in noeud.names)
+        elif isinstance(noeud, ast.ImportFrom) and noeud.level == 0 and noeud.module:
+            noms.add(noeud.module.split('.')[0])
+
+    dossier = os.path.dirname(os.path.abspath(chemin_script))
+    return {
+        nom for nom in noms
+        if nom != '__future__'
+        and not os.path.exists(os.path.join(dossier, f"{nom}.py"))
+        and not os.path.isdir(os.path.join(dossier, nom))
+    }
+
+
+class ForkServer:
+    """Un interpréteur pré-chauffé qui fork un enfant par exécution."""
+
+    def __init__(self, python_executable: str, modules=()):
+        """Initialise le serveur (démarré à la première exécution)."""
+        self.python_executable = python_executable
+        self.modules = sorted(modules)
+        self._process = None
+
+    def start(self):
+        """Démarre l'interpréteur et attend la fin des imports."""
+        self._process = subprocess.Popen(
+            [self.python_executable, '-c', _BOOTSTRAP, json.dumps(self.modules)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        ligne = self._process.stdout.readline()
+        if not ligne:
+            self.close()
+            raise RuntimeError("Le fork-server n'a pas démarré")
+
+    def run(self, chemin_script: str, timeout: float = 10, max_output: int = 64 * 1024) -> dict:
+        """Exécute le script dans un enfant forké.
+
+        Args:
+            chemin_script: Script à exécuter
+            timeout: Timeout en secondes
+            max_output: Nombre maximal d'octets conservés par flux (début et fin)
+
+        Returns:
+            dict: {'stdout': str, 'stderr': str, 'returncode': int, 'timeout': bool}
+        """
+        if self._process is None or self._process.poll() is not None:
+            self.start()
+
+        requete = {'script': os.path.abspath(chemin_script), 'timeout': timeout, 'max_output': max_output}
+        try:
+            self._process.stdin.write(json.dumps(requete) + "\n")
+            self._process.stdin.flush()
+            ligne = self._process.stdout.readline()
+        except (BrokenPipeError, OSError):
+            ligne = ''
+
+        if not ligne:
+            self.close()
+            raise RuntimeError("Le fork-server s'est arrêté pendant l'exécution")
+        return json.loads(ligne)
+
+    def close(self):
+        """Arrête l'interpréteur."""
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=2)
+        except Exception:
+            self._process.kill()
+        self._process = None
+
+
+class ForkServerPool:
+    """Pool de serveurs pré-chauffés pour un même exécutable Python."""
+
+    def __init__(self, python_executable: str, taille: int = 1):
+        """Initialise le pool (serveurs démarrés à la demande)."""
+        self.python_executable = python_executable
+        self.taille = taille
+        self.modules = set()
+        self._lock = threading.Lock()
+        self._serveurs = []
+        self._libres = queue.Queue()
+
+    def _rechauffer(self, modules: set):
+        """Redémarre les serveurs si le script importe de nouveaux modules."""
+        anciens = []
+        with self._lock:
+            if modules <= self.modules and self._serveurs:
+                return
+            self.modules |= modules
+            self._serveurs = [ForkServer(self.python_executable, self.modules) for _ in range(self.taille)]
+            # File unique : les threads déjà en attente reçoivent les nouveaux serveurs
+            while True:
+                try:
+                    anciens.append(self._libres.get_nowait())
+                except queue.Empty:
+                    break
+            for serveur in self._serveurs:
+                self._libres.put(serveur)
+        # Les serveurs occupés sont fermés à leur libération (voir run)
+        for serveur in anciens:
+            serveur.close()
+
+    def run(self, chemin_script: str, timeout: float = 10, max_output: int = 64 * 1024) -> dict:
+        """Exécute le script sur un serveur libre du pool."""
+        self._rechauffer(modules_stables(chemin_script))
+        serveur = self._libres.get()
+        try:
+            return serveur.run(chemin_script, timeout, max_output)
+        finally:
+            with self._lock:
+                if serveur in self._serveurs:
+                    self._libres.put(serveur)
+                else:
+                    serveur.close()
+
+    def close(self):
+        """Arrête tous les serveurs du pool."""
+        with self._lock:
+            for serveur in self._serveurs:
+                serveur.close()
+            self._serveurs = []
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obtenir_pool(python_executable: str, taille: int = 1) -> ForkServerPool:
+    """Retourne le pool associé à un exécutable Python (créé une seule fois)."""
+    with _pools_lock:
+        if python_executable not in _pools:
+            _pools[python_executable] = ForkServerPool(python_executable, taille)
+        return _pools[python_executable]
+
+
+@atexit.register
+def fermer_pools():
+    """Arrête tous les serveurs à la sortie du processus."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,176 @@
+"""File de jobs partagée entre les sessions, avec pool de workers borné
+
+Chaque session soumet ses débogages (DebugWorker) à une file commune. Un
+nombre fixe de threads exécute les jobs : c'est le plafond global de
+boucles simultanées (CPU et appels API). L'ordonnancement est équitable :
+les sessions sont servies à tour de rôle, une session qui soumet beaucoup
+de jobs ne bloque pas les autres.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Statuts d'un job
+EN_ATTENTE = 'en_attente'
+EN_COURS = 'en_cours'
+TERMINE = 'termine'
+ANNULE = 'annule'
+
+
+class Job:
+    """Un débogage soumis à la file."""
+
+    def __init__(self, job_id: int, session: str, worker):
+        self.id = job_id
+        self.session = session
+        self.worker = worker
+        self.statut = EN_ATTENTE
+        self.soumis_le = time.time()
+        self.demarre_le = None
+        self.termine_le = None
+
+    def duree(self) -> float:
+        """Durée d'exécution (en cours ou terminée), en secondes."""
+        if self.demarre_le is None:
+            return 0.0
+        return (self.termine_le or time.time()) - self.demarre_le
+
+
+class JobQueue:
+    """File de jobs équitable entre sessions, exécutée par un pool borné."""
+
+    def __init__(self, max_concurrent: int = 2, historique: int = 100):
+        """Initialise la file et démarre le pool.
+
+        Args:
+            max_concurrent: Nombre maximal de jobs exécutés simultanément
+            historique: Nombre de jobs terminés conservés pour l'affichage
+        """
+        self.max_concurrent = max_concurrent
+        self.historique = historique
+        self._condition = threading.Condition()
+        self._files = OrderedDict()    # session -> deque de jobs en attente
+        self._jobs = OrderedDict()     # job_id -> Job
+        self._durees = deque(maxlen=20)
+        self._compteur = itertools.count(1)
+        self._threads = [
+            threading.Thread(target=self._boucle, name=f"job-worker-{i + 1}", daemon=True)
+            for i in range(max_concurrent)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def soumettre(self, session: str, worker) -> Job:
+        """Ajoute un job (DebugWorker non démarré) à la file de la session."""
+        with self._condition:
+            job = Job(next(self._compteur), session, worker)
+            self._jobs[job.id] = job
+            self._files.setdefault(session, deque()).append(job)
+            self._condition.notify()
+            return job
+
+    def annuler(self, job_id: int):
+        """Annule un job : retiré de la file s'il attend, arrêté s'il tourne."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.statut in (TERMINE, ANNULE):
+                return
+            if job.statut == EN_ATTENTE:
+                self._files[job.session].remove(job)
+                job.statut = ANNULE
+                job.termine_le = time.time()
+                return
+        job.worker.annuler()
+
+    def job(self, job_id: int) -> Job:
+        """Retourne un job (None s'il est inconnu ou purgé)."""
+        return self._jobs.get(job_id)
+
+    def etat(self, job_id: int) -> dict:
+        """Statut d'un job : position dans la file et temps d'attente estimé.
+
+        Returns:
+            dict: {'statut', 'position', 'eta', 'etape', 'iteration', 'duree'}
+            (position et eta valent None si le job n'attend pas)
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            position = self._position(job) if job.statut == EN_ATTENTE else None
+            return {
+                'statut': job.statut,
+                'position': position,
+                'eta': self._eta(position) if position is not None else None,
+                'etape': job.worker.etape,
+                'iteration': job.worker.iteration,
+                'duree': round(job.duree(), 1)
+            }
+
+    def apercu(self) -> list:
+        """Liste des jobs connus (du plus ancien au plus récent) pour l'affichage."""
+        with self._condition:
+            return [
+                {
+                    'id': job.id,
+                    'session': job.session,
+                    'script': job.worker.script_path,
+                    'statut': job.statut,
+                    'etape': job.worker.etape,
+                    'iteration': job.worker.iteration,
+                    'duree': round(job.duree(), 1)
+                }
+                for job in self._jobs.values()
+            ]
+
+    def _suivant(self) -> Job:
+        """Prochain job à exécuter : sessions servies à tour de rôle."""
+        for session in list(self._files):
+            attente = self._files[session]
+            if attente:
+                # La session servie passe en fin de tour
+                self._files.move_to_end(session)
+                return attente.popleft()
+            del self._files[session]
+        return None
+
+    def _position(self, job: Job) -> int:
+        """Position (1 = prochain) d'un job selon l'ordre du tourniquet."""
+        files = [list(attente) for attente in self._files.values()]
+        ordre = [j for tour in itertools.zip_longest(*files) for j in tour if j is not None]
+        return ordre.index(job) + 1
+
+    def _eta(self, position: int) -> float:
+        """Temps d'attente estimé à partir de la durée moyenne des jobs."""
+        moyenne = sum(self._durees) / len(self._durees) if self._durees else 60.0
+        vagues = (position - 1) // self.max_concurrent + 1
+        return round(vagues * moyenne, 0)
+
+    def _purger(self):
+        """Oublie les jobs terminés les plus anciens au-delà de l'historique."""
+        termines = [j for j in self._jobs.values() if j.statut in (TERMINE, ANNULE)]
+        for job in termines[:max(0, len(termines) - self.historique)]:
+            del self._jobs[job.id]
+
+    def _boucle(self):
+        """Thread du pool : exécute les jobs tant qu'il y en a."""
+        while True:
+            with self._condition:
+                job = self._suivant()
+                while job is None:
+                    self._condition.wait()
+                    job = self._suivant()
+                job.statut = EN_COURS
+                job.demarre_le = time.time()
+
+            try:
+                # Exécuté dans le thread du pool (le worker n'est pas démarré)
+                job.worker.run()
+            finally:
+                with self._condition:
+                    job.termine_le = time.time()
+                    job.statut = ANNULE if job.worker.annule else TERMINE
+                    self._durees.append(job.duree())
+                    self._purger()
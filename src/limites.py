@@ -0,0 +1,184 @@
+"""Limites de ressources et timeouts adaptatifs pour l'exécution des scripts"""
+import json
+import os
+import signal
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows : pas de setrlimit
+    resource = None
+
+
+class LimitesExecution:
+    """Limites appliquées au processus du script (via setrlimit, POSIX uniquement)."""
+
+    def __init__(self, cpu_secondes: int = None, memoire_mo: int = None,
+                 fichiers_ouverts: int = None, processus: int = None):
+        """Initialise les limites (None = pas de limite).
+
+        Args:
+            cpu_secondes: Temps CPU maximal (RLIMIT_CPU)
+            memoire_mo: Espace d'adressage maximal en Mo (RLIMIT_AS)
+            fichiers_ouverts: Nombre maximal de descripteurs (RLIMIT_NOFILE)
+            processus: Nombre maximal de processus de l'utilisateur (RLIMIT_NPROC)
+        """
+        self.cpu_secondes = cpu_secondes
+        self.memoire_mo = memoire_mo
+        self.fichiers_ouverts = fichiers_ouverts
+        self.processus = processus
+
+    def actives(self) -> bool:
+        """True si au moins une limite est définie."""
+        return any(v is not None for v in (
+            self.cpu_secondes, self.memoire_mo, self.fichiers_ouverts, self.processus
+        ))
+
+    def preexec(self):
+        """Fonction à exécuter dans l'enfant avant le script (None si inapplicable)."""
+        if resource is None or not self.actives():
+            return None
+
+        regles = []
+        if self.cpu_secondes is not None:
+            # Dépassement de la limite douce : SIGXCPU, de la limite dure : SIGKILL
+            regles.append((resource.RLIMIT_CPU, (self.cpu_secondes, self.cpu_secondes + 1)))
+        if self.memoire_mo is not None:
+            octets = self.memoire_mo * 1024 * 1024
+            regles.append((resource.RLIMIT_AS, (octets, octets)))
+        if self.fichiers_ouverts is not None:
+            regles.append((resource.RLIMIT_NOFILE, (self.fichiers_ouverts, self.fichiers_ouverts)))
+        if self.processus is not None and hasattr(resource, 'RLIMIT_NPROC'):
+            regles.append((resource.RLIMIT_NPROC, (self.processus, self.processus)))
+
+        def appliquer():
+            for ressource, valeurs in regles:
+                resource.setrlimit(ressource, valeurs)
+        return appliquer
+
+
+def classer_arret(returncode: int, timeout: bool, stderr: str, limites: LimitesExecution = None) -> dict:
+    """Détermine pourquoi un processus s'est arrêté.
+
+    Returns:
+        dict: {'tue_par': None | 'temps' | 'memoire' | 'signal', 'signal': int | None}
+    """
+    numero = -returncode if returncode is not None and returncode < 0 else None
+
+    if timeout:
+        return {'tue_par': 'temps', 'signal': numero}
+    if numero is not None and numero == getattr(signal, 'SIGXCPU', None):
+        return {'tue_par': 'temps', 'signal': numero}
+    if 'MemoryError' in stderr:
+        return {'tue_par': 'memoire', 'signal': numero}
+    if numero is not None:
+        # Sous RLIMIT_AS, un échec d'allocation en C finit souvent en SIGSEGV/SIGABRT
+        signaux_memoire = {getattr(signal, nom, None) for nom in ('SIGSEGV', 'SIGABRT', 'SIGKILL', 'SIGBUS')}
+        if limites is not None and limites.memoire_mo is not None and numero in signaux_memoire:
+            return {'tue_par': 'memoire', 'signal': numero}
+        return {'tue_par': 'signal', 'signal': numero}
+    return {'tue_par': None, 'signal': None}
+
+
+class HistoriqueDurees:
+    """Historique des durées d'exécution par script, pour un timeout adaptatif.
+
+    Chaque script a ses dernières durées réussies et, s'il a été tué par le
+    timeout, un plancher (le timeout dépassé) : tant que l'historique est
+    insuffisant, le timeout suivant double ce plancher au lieu de reprendre
+    la valeur par défaut. Les scripts disparus et les moins récemment
+    exécutés au-delà de `max_scripts` sont oubliés.
+    """
+
+    def __init__(self, path: str = os.path.join(".agent_cache", "durees.json"), taille: int = 20,
+                 max_scripts: int = 200):
+        """Initialise l'historique.
+
+        Args:
+            path: Fichier JSON de persistance (None pour rester en mémoire)
+            taille: Nombre de durées conservées par script
+            max_scripts: Nombre de scripts conservés (les moins récents sont oubliés)
+        """
+        self.path = path
+        self.taille = taille
+        self.max_scripts = max_scripts
+        self._lock = threading.Lock()
+        self._scripts = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    donnees = json.load(f)
+            except (OSError, ValueError):
+                donnees = {}
+            for cle, entree in donnees.items():
+                # Ancien format : liste de durées
+                if isinstance(entree, list):
+                    entree = {'durees': entree, 'plancher': None, 'acces': 0}
+                self._scripts[cle] = entree
+
+    def _entree(self, chemin_script: str) -> dict:
+        """Entrée d'un script, créée si besoin (appelé sous verrou)."""
+        entree = self._scripts.setdefault(os.path.abspath(chemin_script),
+                                          {'durees': [], 'plancher': None, 'acces': 0})
+        entree['acces'] = time.time()
+        return entree
+
+    def _sauvegarder(self):
+        """Oublie les scripts disparus ou en excès puis écrit le fichier (appelé sous verrou)."""
+        for cle in [c for c in self._scripts if not os.path.exists(c)]:
+            del self._scripts[cle]
+        if len(self._scripts) > self.max_scripts:
+            anciens = sorted(self._scripts, key=lambda c: self._scripts[c]['acces'])
+            for cle in anciens[:len(self._scripts) - self.max_scripts]:
+                del self._scripts[cle]
+        if self.path:
+            dossier = os.path.dirname(self.path)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self._scripts, f)
+
+    def enregistrer(self, chemin_script: str, duree: float):
+        """Ajoute la durée d'une exécution terminée normalement."""
+        with self._lock:
+            durees = self._entree(chemin_script)['durees']
+            durees.append(round(duree, 3))
+            del durees[:-self.taille]
+            self._sauvegarder()
+
+    def enregistrer_depassement(self, chemin_script: str, timeout: float):
+        """Note qu'une exécution a dépassé `timeout` : le script dure au moins autant."""
+        with self._lock:
+            entree = self._entree(chemin_script)
+            entree['plancher'] = max(entree['plancher'] or 0, timeout)
+            self._sauvegarder()
+
+    def timeout_adaptatif(self, chemin_script: str, defaut: float = 10, minimum: float = 10,
+                          maximum: float = 300, facteur: float = 3) -> float:
+        """Timeout dérivé des durées passées : facteur × p95, borné.
+
+        Sans historique suffisant (moins de 3 exécutions), retourne `defaut`,
+        ou le double du dernier timeout dépassé (plafonné à `maximum`).
+        """
+        with self._lock:
+            entree = self._scripts.get(os.path.abspath(chemin_script), {})
+            durees = sorted(entree.get('durees', []))
+            plancher = entree.get('plancher')
+        if len(durees) < 3:
+            if plancher:
+                return round(min(maximum, max(defaut, plancher * 2)), 1)
+            return defaut
+        p95 = durees[min(len(durees) - 1, int(round(0.95 * (len(durees) - 1))))]
+        return round(min(maximum, max(minimum, p95 * facteur)), 1)
+
+
+_historique = None
+
+
+def historique_par_defaut() -> HistoriqueDurees:
+    """Historique partagé (persisté dans .agent_cache/durees.json)."""
+    global _historique
+    if _historique is None:
+        _historique = HistoriqueDurees()
+    return _historique
@@ -0,0 +1,397 @@
+"""Backends LLM interchangeables pour AIDebugger
+
+- GroqBackend : API Groq (par défaut)
+- OpenAICompatibleBackend : tout serveur compatible OpenAI (/chat/completions),
+  par exemple un modèle local servi par Ollama, llama.cpp ou vLLM
+- RuleBasedBackend : répondeur local déterministe, sans réseau, avec latence
+  simulée (benchmarks, CI)
+- CassetteBackend : rejoue des réponses enregistrées dans un fichier JSON,
+  et enregistre les réponses manquantes si un backend réel est fourni
+
+Groq est toujours placé derrière un PlanificateurRequetes (src/planificateur.py) :
+limites de débit du fournisseur, réessais et échéances.
+
+Un backend expose `model` et `complete(messages, temperature, max_tokens, top_p)`
+qui retourne {'texte': str, 'tokens_entree': int, 'tokens_sortie': int}.
+"""
+import builtins
+import difflib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from src.analysis_cache import cle_analyse, normaliser_traceback
+from src.context_slicer import estimer_tokens
+
+
+class LLMBackend:
+    """Interface commune des backends."""
+
+    model = None
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        """Retourne {'texte', 'tokens_entree', 'tokens_sortie'}."""
+        raise NotImplementedError
+
+
+class GroqBackend(LLMBackend):
+    """Appels à l'API Groq (un seul client HTTP keep-alive)."""
+
+    def __init__(self, model: str = "llama-3.3-70b-versatile", timeout: float = 60.0):
+        """Initialise le client Groq (clé lue dans config.GROQ_API_KEY).
+
+        Args:
+            model: Modèle Groq
+            timeout: Délai maximal d'une requête (secondes), pour ne jamais bloquer la boucle
+        """
+        from groq import Groq
+        import config
+
+        # Réessais gérés par PlanificateurRequetes (limites partagées, Retry-After)
+        self.client = Groq(api_key=config.GROQ_API_KEY, timeout=timeout, max_retries=0)
+        self.model = model
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p
+        )
+        usage = getattr(response, 'usage', None)
+        return {
+            'texte': response.choices[0].message.content.strip(),
+            'tokens_entree': getattr(usage, 'prompt_tokens', 0) or 0,
+            'tokens_sortie': getattr(usage, 'completion_tokens', 0) or 0
+        }
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Serveur compatible OpenAI (API /chat/completions), sans dépendance."""
+
+    def __init__(self, model: str, base_url: str = "http://localhost:11434/v1",
+                 api_key: str = None, timeout: float = 60.0):
+        """Initialise le client.
+
+        Args:
+            model: Nom du modèle côté serveur
+            base_url: URL de base de l'API (se termine par /v1)
+            api_key: Clé d'API (défaut: variable OPENAI_API_KEY, facultative en local)
+            timeout: Délai maximal d'une requête (secondes)
+        """
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        self.timeout = timeout
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        entetes = {'Content-Type': 'application/json'}
+        if self.api_key:
+            entetes['Authorization'] = f"Bearer {self.api_key}"
+        requete = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps({'model': self.model, 'messages': messages, 'temperature': temperature,
+                             'max_tokens': max_tokens, 'top_p': top_p}).encode('utf-8'),
+            headers=entetes
+        )
+        # HTTPError porte status_code via .code et les en-têtes (Retry-After)
+        try:
+            with urllib.request.urlopen(requete, timeout=self.timeout) as reponse:
+                contenu = json.load(reponse)
+        except urllib.error.HTTPError as e:
+            e.status_code = e.code
+            e.response = e
+            raise
+        usage = contenu.get('usage') or {}
+        return {
+            'texte': contenu['choices'][0]['message']['content'].strip(),
+            'tokens_entree': usage.get('prompt_tokens', 0) or 0,
+            'tokens_sortie': usage.get('completion_tokens', 0) or 0
+        }
+
+
+# Frame de traceback suivie de la ligne de source affichée par Python
+_FRAME = re.compile(r'^\s*File "([^"]+)", line (\d+)[^\n]*\n((?: {4,}[^\n]*\n?)?)', re.MULTILINE)
+# Ligne finale d'exception : "NomErreur: message"
+_EXCEPTION = re.compile(r'^(\w+(?:\.\w+)*(?:Error|Exception|Warning))(?::\s*(.*))?$', re.MULTILINE)
+_BLOC_ERREUR = re.compile(r'^--- Erreur \d+/\d+.*---$', re.MULTILINE)
+# Méthodes d'autres langages et leur équivalent Python (AttributeError)
+_ALIAS_METHODES = {'push': 'append', 'add': 'append', 'toUpperCase': 'upper',
+                   'toLowerCase': 'lower', 'trim': 'strip'}
+
+
+class RuleBasedBackend(LLMBackend):
+    """Répondeur local : corrige les erreurs courantes par règles, sans réseau.
+
+    Les réponses sont déterministes (même prompt → même réponse) et au format
+    JSON attendu par AIDebugger. Une latence peut être simulée pour mesurer
+    le comportement de la boucle comme avec une API réelle.
+    """
+
+    model = "regles-locales"
+
+    def __init__(self, latence: float = 0.0, gigue: float = 0.0, graine: int = 0):
+        """Initialise le répondeur.
+
+        Args:
+            latence: Latence simulée par requête (secondes)
+            gigue: Variation aléatoire maximale ajoutée à la latence (secondes)
+            graine: Graine du générateur de gigue (reproductibilité)
+        """
+        self.latence = latence
+        self.gigue = gigue
+        self._aleatoire = random.Random(graine)
+        self._lock = threading.Lock()
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        if self.latence or self.gigue:
+            with self._lock:
+                attente = self.latence + self._aleatoire.uniform(0, self.gigue)
+            time.sleep(attente)
+
+        prompt = messages[-1]['content']
+        texte = json.dumps(self.repondre(prompt), ensure_ascii=False)
+        return {
+            'texte': texte,
+            'tokens_entree': sum(estimer_tokens(m['content']) for m in messages),
+            'tokens_sortie': estimer_tokens(texte)
+        }
+
+    def repondre(self, prompt: str) -> dict:
+        """Construit la réponse JSON pour un prompt utilisateur."""
+        fichier = re.search(r'FICHIER:\**\s*(\S+)', prompt)
+        fichier = fichier.group(1) if fichier else None
+        identifiants = set(re.findall(r'\b[A-Za-z_]\w*\b', prompt))
+
+        # Mode multi-erreurs : un bloc par erreur
+        blocs = _BLOC_ERREUR.split(prompt)
+        blocs = blocs[1:] if len(blocs) > 1 else blocs
+
+        corrections = []
+        premiere = None
+        for bloc in blocs:
+            erreur = self._lire_erreur(bloc, fichier)
+            if erreur is None:
+                continue
+            premiere = premiere or erreur
+            code_corrige = self._corriger(erreur, identifiants)
+            if code_corrige is None or any(c['ligne'] == erreur['ligne'] for c in corrections):
+                continue
+            corrections.append({
+                'ligne': erreur['ligne'],
+                'code_original': erreur['source'],
+                'code_corrige': code_corrige,
+                'explication': f"Règle locale pour {erreur['type']}"
+            })
+
+        if premiere is None:
+            return {'type_erreur': 'Inconnue', 'cause': "Traceback non reconnue", 'corrections': []}
+        return {
+            'type_erreur': premiere['type'],
+            'ligne_erreur': premiere['ligne'],
+            'cause': premiere['message'],
+            'corrections': corrections,
+            'conseil': "Réponse générée par le répondeur local (sans IA)"
+        }
+
+    @staticmethod
+    def _lire_erreur(texte: str, fichier: str):
+        """Dernière frame du fichier analysé et exception finale d'une traceback."""
+        frames = [
+            (chemin, int(ligne), source.strip())
+            for chemin, ligne, source in _FRAME.findall(texte)
+        ]
+        if fichier:
+            frames = [f for f in frames if os.path.basename(f[0].replace('\\', '/')) == fichier] or frames
+        exceptions = _EXCEPTION.findall(texte)
+        if not frames or not exceptions or not frames[-1][2]:
+            return None
+        _, ligne, source = frames[-1]
+        type_erreur, message = exceptions[-1]
+        return {'type': type_erreur.split('.')[-1], 'message': message, 'ligne': ligne, 'source': source}
+
+    @staticmethod
+    def _corriger(erreur: dict, identifiants: set):
+        """Ligne corrigée (sans indentation) ou None si aucune règle ne s'applique."""
+        source, message = erreur['source'], erreur['message']
+        code, _, commentaire = source.partition('  #')
+        code = code.rstrip()
+        type_erreur = erreur['type']
+
+        if type_erreur == 'ZeroDivisionError':
+            division = re.search(r'([\w\.\]\)]+)\s*(/{1,2}|%)\s*([\w\.]+)', code)
+            if division:
+                expression = division.group(0)
+                corrige = code.replace(expression, f"({expression} if {division.group(3)} != 0 else 0)", 1)
+                return corrige
+
+        elif type_erreur in ('NameError', 'UnboundLocalError'):
+            nom = re.search(r"name '(\w+)'", message)
+            if nom:
+                nom = nom.group(1)
+                proches = difflib.get_close_matches(nom, identifiants - {nom}, n=1, cutoff=0.8)
+                remplacement = proches[0] if proches else repr(nom)
+                return re.sub(rf'\b{nom}\b', remplacement, code, count=1)
+
+        elif type_erreur == 'KeyError':
+            cle = re.search(r"\[\s*(['\"][^'\"]*['\"])\s*\]", code)
+            if cle:
+                return code.replace(cle.group(0), f".get({cle.group(1)})", 1)
+
+        elif type_erreur == 'AttributeError':
+            attribut = re.search(r"'(\w+)' object has no attribute '(\w+)'", message)
+            if attribut:
+                type_objet, nom = attribut.groups()
+                candidats = dir(getattr(builtins, type_objet, object))
+                proches = difflib.get_close_matches(nom, [c for c in candidats if not c.startswith('_')],
+                                                    n=1, cutoff=0.6)
+                if _ALIAS_METHODES.get(nom) in candidats:
+                    proches = [_ALIAS_METHODES[nom]]
+                if proches:
+                    return re.sub(rf'\.{nom}\b', f'.{proches[0]}', code, count=1)
+
+        elif type_erreur == 'TypeError' and ('concatenate' in message or 'unsupported operand' in message):
+            # Conversion en str des opérandes non textuels d'une concaténation
+            corrige = re.sub(r'\+\s*(?!str\()(\d+(?:\.\d+)?|[A-Za-z_][\w\.]*)(?![\w\.\(])',
+                             r'+ str(\1)', code)
+            corrige = re.sub(r'(?<![\w\.])(\d+(?:\.\d+)?)\s*\+\s*(?=["\'])', r'str(\1) + ', corrige)
+            if corrige != code:
+                return corrige
+
+        elif type_erreur in ('ModuleNotFoundError', 'ImportError') and re.match(r'(from|import)\b', code):
+            # Import introuvable : retiré (les usages restants lèveront une erreur visible)
+            return f"pass  # {code}"
+
+        # Erreur non reconnue : aucune correction, plutôt que de supprimer la
+        # ligne et de mesurer un « succès » qui a effacé la logique du script
+        return None
+
+
+class CassetteBackend(LLMBackend):
+    """Rejoue des réponses enregistrées ; enregistre celles qui manquent.
+
+    La clé d'une réponse dépend du modèle, de la température et des messages
+    (chemins et adresses normalisés), pas de l'emplacement des fichiers.
+    """
+
+    def __init__(self, path: str, backend: LLMBackend = None):
+        """Initialise la cassette.
+
+        Args:
+            path: Fichier JSON des réponses enregistrées
+            backend: Backend interrogé pour les réponses absentes (None : rejeu seul)
+        """
+        self.path = path
+        self.backend = backend
+        self.model = backend.model if backend is not None else None
+        self._lock = threading.Lock()
+        self._reponses = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                contenu = json.load(f)
+            self.model = self.model or contenu.get('model')
+            self._reponses = contenu.get('reponses', {})
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        cle = cle_analyse(
+            model=self.model,
+            temperature=temperature,
+            messages=[(m['role'], normaliser_traceback(m['content'])) for m in messages]
+        )
+        with self._lock:
+            if cle in self._reponses:
+                return dict(self._reponses[cle])
+        if self.backend is None:
+            raise KeyError(f"Réponse absente de la cassette {self.path}")
+
+        reponse = self.backend.complete(messages, temperature, max_tokens, top_p)
+        with self._lock:
+            self._reponses[cle] = reponse
+            self._sauvegarder()
+        return dict(reponse)
+
+    def _sauvegarder(self):
+        """Écrit la cassette de façon atomique."""
+        dossier = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dossier, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dossier, prefix='.cassette.', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model, 'reponses': self._reponses}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def creer_backend(spec: str = None, requetes_par_minute: float = None,
+                  tokens_par_minute: float = None, max_concurrent: int = None) -> LLMBackend:
+    """Crée un backend à partir d'une description (défaut : variable AGENT_LLM).
+
+    Formats acceptés :
+        groq[:modele]             API Groq (défaut: llama-3.3-70b-versatile)
+        openai:modele[@url]       serveur compatible OpenAI (défaut: Ollama local)
+        regles[:latence]          répondeur local (latence en secondes)
+        cassette:chemin           rejeu seul
+        cassette:chemin:groq      rejeu, réponses manquantes demandées à Groq
+
+    Sans description explicite, AGENT_LLM_SECOURS (descriptions séparées par
+    des virgules) ajoute des backends de secours interrogés en couverture, et
+    AGENT_LLM_RAPIDE un modèle rapide pour les erreurs simples (src/routage.py).
+
+    Args:
+        spec: Description du backend
+        requetes_par_minute: Limite de requêtes/min (Groq : AGENT_LLM_RPM, 30 par défaut)
+        tokens_par_minute: Limite de tokens/min (Groq : AGENT_LLM_TPM, 6000 par défaut)
+        max_concurrent: Requêtes simultanées (Groq : AGENT_LLM_CONCURRENT, 4 par défaut)
+
+    Les backends locaux ne sont planifiés que si une limite est donnée.
+    """
+    from src.planificateur import PlanificateurRequetes
+
+    limites = {'requetes_par_minute': requetes_par_minute, 'tokens_par_minute': tokens_par_minute,
+               'max_concurrent': max_concurrent}
+    if spec is None:
+        secours = [s.strip() for s in os.environ.get('AGENT_LLM_SECOURS', '').split(',') if s.strip()]
+        rapide = os.environ.get('AGENT_LLM_RAPIDE')
+        backend = creer_backend(os.environ.get('AGENT_LLM', 'groq'), **limites)
+        if secours or rapide:
+            from src.routage import BackendCouvert, BackendRoute
+            if secours:
+                backend = BackendCouvert(backend, [creer_backend(s, **limites) for s in secours])
+            if rapide:
+                backend = BackendRoute(backend, creer_backend(rapide, **limites))
+        return backend
+
+    nom, _, reste = spec.partition(':')
+
+    if nom == 'groq':
+        # Les limites de Groq s'appliquent par modèle : un planificateur par backend
+        return PlanificateurRequetes(
+            GroqBackend(model=reste) if reste else GroqBackend(),
+            requetes_par_minute=requetes_par_minute or float(os.environ.get('AGENT_LLM_RPM', 30)),
+            tokens_par_minute=tokens_par_minute or float(os.environ.get('AGENT_LLM_TPM', 6000)),
+            max_concurrent=max_concurrent or int(os.environ.get('AGENT_LLM_CONCURRENT', 4))
+        )
+    if nom == 'openai' and reste:
+        modele, _, url = reste.partition('@')
+        backend = OpenAICompatibleBackend(modele, url) if url else OpenAICompatibleBackend(modele)
+    elif nom == 'regles':
+        backend = RuleBasedBackend(latence=float(reste) if reste else 0.0)
+    elif nom == 'cassette' and reste:
+        chemin, _, source = reste.rpartition(':') if reste.endswith((':groq', ':regles')) else (reste, '', '')
+        return CassetteBackend(chemin, creer_backend(source, **limites) if source else None)
+    else:
+        raise ValueError(f"Backend LLM inconnu: {spec}")
+
+    if any(limites.values()):
+        return PlanificateurRequetes(backend, requetes_par_minute, tokens_par_minute, max_concurrent or 4)
+    return backend
@@ -0,0 +1,101 @@
+"""Exécuteur instrumenté : collecte toutes les erreurs en une seule exécution
+
+Lancé par l'interpréteur du venv (autonome : aucun import du projet) :
+
+    python multi_fault_runner.py <script> <fichier_json>
+
+Chaque instruction de niveau module est exécutée séparément dans un espace
+de noms partagé. Une exception est affichée et enregistrée, puis l'exécution
+continue à l'instruction suivante. Les NameError provoquées par une
+instruction précédente en échec (nom jamais défini) sont ignorées pour ne
+pas signaler deux fois la même cause.
+"""
+import ast
+import builtins
+import json
+import os
+import sys
+import traceback
+
+
+def _noms_definis(noeud) -> set:
+    """Noms qu'une instruction de niveau module aurait dû définir."""
+    noms = set()
+    for n in ast.walk(noeud):
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            noms.add(n.name)
+        elif isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store):
+            noms.add(n.id)
+        elif isinstance(n, ast.alias):
+            noms.add((n.asname or n.name).split('.')[0])
+    return noms
+
+
+def _enregistrer(exc, script: str) -> dict:
+    """Affiche la traceback (sans les frames du runner) et retourne l'erreur."""
+    te = traceback.TracebackException.from_exception(exc)
+    te.stack = traceback.StackSummary.from_list(
+        [f for f in te.stack if f.filename != __file__]
+    )
+    texte = "".join(te.format())
+    sys.stderr.write(texte)
+
+    lignes = [f.lineno for f in te.stack if f.filename == script]
+    return {
+        'type': type(exc).__name__,
+        'message': str(exc),
+        'ligne': lignes[-1] if lignes else None,
+        'traceback': texte
+    }
+
+
+def executer(script: str) -> tuple:
+    """Exécute le script instruction par instruction.
+
+    Returns:
+        tuple: (liste des erreurs, code retour)
+    """
+    with open(script, 'r', encoding='utf-8') as f:
+        source = f.read()
+
+    try:
+        arbre = ast.parse(source, filename=script)
+    except SyntaxError as e:
+        return [_enregistrer(e, script)], 1
+
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(script)
+    espace = {'__name__': '__main__', '__file__': script, '__builtins__': builtins}
+
+    erreurs = []
+    vues = set()
+    manquants = set()
+    for noeud in arbre.body:
+        module = ast.Module(body=[noeud], type_ignores=[])
+        try:
+            exec(compile(module, script, 'exec'), espace)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            return erreurs, code or (1 if erreurs else 0)
+        except KeyboardInterrupt:
+            raise
+        except BaseException as e:
+            manquants |= _noms_definis(noeud)
+            if isinstance(e, NameError) and getattr(e, 'name', None) in manquants:
+                continue
+            erreur = _enregistrer(e, script)
+            signature = (erreur['type'], erreur['ligne'], erreur['message'])
+            if signature not in vues:
+                vues.add(signature)
+                erreurs.append(erreur)
+    return erreurs, 1 if erreurs else 0
+
+
+if __name__ == "__main__":
+    chemin = os.path.abspath(sys.argv[1])
+    sortie_json = sys.argv[2]
+    erreurs, code = executer(chemin)
+    sys.stdout.flush()
+    with open(sortie_json, 'w', encoding='utf-8') as f:
+        json.dump(erreurs, f)
+    sys.exit(code)
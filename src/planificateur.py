@@ -0,0 +1,228 @@
+"""Planification des requêtes LLM : limites de débit, réessais et échéances
+
+Toutes les sessions qui partagent un backend passent par le même
+planificateur :
+
+- deux seaux à jetons (requêtes/min et tokens/min) calés sur les limites du
+  fournisseur ; les réservations sont servies dans l'ordre d'arrivée
+- un nombre borné de requêtes simultanées
+- les erreurs transitoires (429, 5xx, timeouts, coupures réseau) sont
+  réessayées avec un backoff exponentiel à gigue, en respectant Retry-After
+  (qui suspend aussi les autres sessions)
+- chaque requête a une échéance : attente en file et réessais compris
+"""
+import email.utils
+import random
+import threading
+import time
+
+from src.context_slicer import estimer_tokens
+from src.llm_backends import LLMBackend
+from src.tracing import span
+
+
+# Codes HTTP pour lesquels un nouvel essai a un sens
+CODES_TRANSITOIRES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class SeauJetons:
+    """Seau à jetons thread-safe, avec réservation à l'avance (file FIFO)."""
+
+    def __init__(self, par_minute: float, capacite: float = None):
+        """Initialise le seau (plein).
+
+        Args:
+            par_minute: Jetons ajoutés par minute
+            capacite: Jetons maximaux accumulés (défaut: une minute de débit)
+        """
+        self.debit = par_minute / 60.0
+        self.capacite = capacite or par_minute
+        self.jetons = self.capacite
+        self._maj = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _remplir(self, maintenant: float):
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self._maj) * self.debit)
+        self._maj = maintenant
+
+    def reserver(self, quantite: float) -> float:
+        """Réserve des jetons et retourne l'attente (secondes) avant de les utiliser.
+
+        Le solde peut devenir négatif : les réservations suivantes attendent
+        d'autant plus longtemps, ce qui sert les demandes dans l'ordre.
+        """
+        with self._lock:
+            maintenant = time.monotonic()
+            self._remplir(maintenant)
+            self.jetons -= min(quantite, self.capacite)
+            return max(0.0, -self.jetons / self.debit)
+
+    def rendre(self, quantite: float):
+        """Restitue des jetons (réservation annulée ou surestimée)."""
+        with self._lock:
+            self._remplir(time.monotonic())
+            self.jetons = min(self.capacite, self.jetons + quantite)
+
+    def suspendre(self, secondes: float):
+        """Aucun jeton disponible avant `secondes` (Retry-After du fournisseur)."""
+        with self._lock:
+            self._remplir(time.monotonic())
+            self.jetons = min(self.jetons, -secondes * self.debit)
+
+
+def retry_after(exc: Exception):
+    """Délai Retry-After (secondes) porté par l'exception, ou None."""
+    reponse = getattr(exc, 'response', None)
+    entetes = getattr(reponse, 'headers', None) or {}
+    try:
+        if entetes.get('retry-after-ms'):
+            return float(entetes['retry-after-ms']) / 1000
+        valeur = entetes.get('retry-after')
+        if valeur is None:
+            return None
+        try:
+            return max(0.0, float(valeur))
+        except ValueError:
+            date = email.utils.parsedate_to_datetime(valeur)
+            return max(0.0, date.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def est_transitoire(exc: Exception) -> bool:
+    """True si l'erreur peut disparaître en réessayant (limite, surcharge, réseau)."""
+    code = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if code is not None:
+        return code in CODES_TRANSITOIRES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # Exceptions du SDK sans code HTTP (APITimeoutError, APIConnectionError)
+    return any(mot in type(exc).__name__ for mot in ('Timeout', 'Connection'))
+
+
+class EcheanceDepassee(TimeoutError):
+    """La requête n'a pas pu aboutir avant son échéance."""
+
+
+class PlanificateurRequetes(LLMBackend):
+    """Enveloppe un backend : file d'attente, limites de débit et réessais."""
+
+    def __init__(self, backend: LLMBackend, requetes_par_minute: float = None,
+                 tokens_par_minute: float = None, max_concurrent: int = 4,
+                 tentatives: int = 5, delai_base: float = 1.0, delai_max: float = 60.0,
+                 echeance: float = 180.0, graine: int = None):
+        """Initialise le planificateur.
+
+        Args:
+            backend: Backend enveloppé
+            requetes_par_minute: Limite de requêtes/min (None : pas de limite)
+            tokens_par_minute: Limite de tokens/min, prompt + max_tokens (None : pas de limite)
+            max_concurrent: Requêtes simultanées maximales
+            tentatives: Nombre maximal d'essais par requête
+            delai_base: Premier délai de backoff (secondes)
+            delai_max: Délai de backoff maximal (secondes)
+            echeance: Durée maximale d'une requête, file et réessais compris
+            graine: Graine de la gigue (reproductibilité)
+        """
+        self.backend = backend
+        self.model = backend.model
+        self.requetes = SeauJetons(requetes_par_minute) if requetes_par_minute else None
+        self.tokens = SeauJetons(tokens_par_minute) if tokens_par_minute else None
+        self.tentatives = tentatives
+        self.delai_base = delai_base
+        self.delai_max = delai_max
+        self.echeance = echeance
+        self._places = threading.BoundedSemaphore(max_concurrent)
+        self._aleatoire = random.Random(graine)
+        self._lock = threading.Lock()
+        # Statistiques (observabilité)
+        self.reessais = 0
+        self.attente_totale = 0.0
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        limite = time.monotonic() + self.echeance
+        estimation = sum(estimer_tokens(m['content']) for m in messages) + max_tokens
+
+        for essai in range(1, self.tentatives + 1):
+            self._attendre_tour(estimation, limite)
+            restant = limite - time.monotonic()
+            if restant <= 0 or not self._places.acquire(timeout=restant):
+                self._rendre(estimation)
+                raise EcheanceDepassee(f"Échéance de {self.echeance:g}s dépassée (file d'attente LLM)")
+            try:
+                reponse = self.backend.complete(messages, temperature, max_tokens, top_p)
+                erreur = None
+            except Exception as e:
+                erreur = e
+            finally:
+                self._places.release()
+
+            if erreur is None:
+                # Tokens réellement consommés : la différence est restituée (ou prélevée)
+                if self.tokens is not None and reponse.get('tokens_entree'):
+                    self.tokens.rendre(estimation - reponse['tokens_entree'] - reponse.get('tokens_sortie', 0))
+                return reponse
+
+            if self.tokens is not None:
+                self.tokens.rendre(estimation)
+            if not est_transitoire(erreur) or essai == self.tentatives:
+                raise erreur
+            delai = self._delai(essai, erreur)
+            if time.monotonic() + delai > limite:
+                raise EcheanceDepassee(f"Échéance de {self.echeance:g}s dépassée après {essai} essai(s): {erreur}")
+            with self._lock:
+                self.reessais += 1
+            print(f"⏳ Requête LLM refusée ({type(erreur).__name__}), nouvel essai dans {delai:.1f}s "
+                  f"({essai + 1}/{self.tentatives})")
+            if not self._suspendre(retry_after(erreur)):
+                time.sleep(delai)
+
+    def _attendre_tour(self, estimation: int, limite: float):
+        """Réserve la place de la requête dans les seaux et attend son tour."""
+        attente = 0.0
+        if self.requetes is not None:
+            attente = max(attente, self.requetes.reserver(1))
+        if self.tokens is not None:
+            attente = max(attente, self.tokens.reserver(estimation))
+        if attente <= 0:
+            return
+        if time.monotonic() + attente > limite:
+            self._rendre(estimation)
+            raise EcheanceDepassee(f"Échéance de {self.echeance:g}s dépassée "
+                                   f"(attente prévue {attente:.1f}s pour les limites de débit)")
+        with span('file_llm', attente=round(attente, 3)):
+            time.sleep(attente)
+        with self._lock:
+            self.attente_totale += attente
+
+    def _rendre(self, estimation: int):
+        if self.requetes is not None:
+            self.requetes.rendre(1)
+        if self.tokens is not None:
+            self.tokens.rendre(estimation)
+
+    def _suspendre(self, attente) -> bool:
+        """Applique Retry-After aux seaux : toutes les sessions respectent la pause.
+
+        Returns:
+            bool: True si la pause est prise en charge par les seaux (l'essai
+            suivant attendra son tour), False s'il faut dormir soi-même
+        """
+        if attente is None or (self.requetes is None and self.tokens is None):
+            return False
+        attente = min(attente, self.delai_max)
+        if self.requetes is not None:
+            self.requetes.suspendre(attente)
+        if self.tokens is not None:
+            self.tokens.suspendre(attente)
+        return True
+
+    def _delai(self, essai: int, exc: Exception) -> float:
+        """Délai avant le prochain essai : Retry-After, sinon backoff exponentiel à gigue."""
+        attente = retry_after(exc)
+        if attente is not None:
+            return min(attente, self.delai_max)
+        plafond = min(self.delai_max, self.delai_base * 2 ** (essai - 1))
+        with self._lock:
+            return self._aleatoire.uniform(plafond / 2, plafond)
@@ -0,0 +1,122 @@
+"""Suivi de la progression de la boucle de correction
+
+Chaque itération est résumée par une empreinte : signature normalisée de
+l'erreur + hash du contenu du fichier. L'historique des empreintes permet de
+détecter :
+
+- les oscillations (le fichier revient à un état déjà vu)
+- les répétitions (la même erreur plusieurs fois de suite)
+- la stagnation (ni baisse du nombre d'erreurs, ni erreur nouvelle)
+
+ainsi que le meilleur état rencontré, pour y revenir en dernier recours.
+"""
+import hashlib
+import time
+
+from src.analysis_cache import signature_erreur
+
+
+class BudgetSession:
+    """Budgets d'une session de débogage (None = illimité)."""
+
+    def __init__(self, iterations: int = None, secondes: float = None, tokens: int = None):
+        """Initialise les budgets.
+
+        Args:
+            iterations: Nombre maximal d'itérations
+            secondes: Durée maximale de la session
+            tokens: Tokens maximaux consommés (envoyés + reçus)
+        """
+        self.iterations = iterations
+        self.secondes = secondes
+        self.tokens = tokens
+        self.debut = time.monotonic()
+
+    def depasse(self, iteration: int, tokens: int = 0) -> str:
+        """Raison du dépassement avant de commencer l'itération, ou None."""
+        if self.iterations is not None and iteration > self.iterations:
+            return f"limite de {self.iterations} itération(s) atteinte"
+        if self.secondes is not None and time.monotonic() - self.debut > self.secondes:
+            return f"durée maximale de {self.secondes:g}s dépassée"
+        if self.tokens is not None and tokens > self.tokens:
+            return f"budget de {self.tokens} tokens épuisé ({tokens} consommés)"
+        return None
+
+
+def nombre_erreurs(resultat: dict) -> int:
+    """Nombre d'erreurs d'une exécution (toutes en mode multi-erreurs, sinon 0 ou 1)."""
+    return len(resultat.get('erreurs') or []) or (1 if resultat['stderr'] else 0)
+
+
+class SuiviProgression:
+    """Historique des itérations et détection d'absence de progrès."""
+
+    def __init__(self, repetitions_max: int = 3, stagnation_max: int = 4):
+        """Initialise le suivi.
+
+        Args:
+            repetitions_max: Même signature d'erreur N fois de suite = pas de progrès
+            stagnation_max: N itérations sans progrès (baisse du nombre d'erreurs
+                ou erreur jamais vue) = stagnation
+        """
+        self.repetitions_max = repetitions_max
+        self.stagnation_max = stagnation_max
+        self.historique = []
+        self.meilleur = None
+        self.niveau = 0
+        self._signatures = set()
+        # Dernière itération ayant progressé
+        self._progres = None
+        # Après une escalade, répétitions et stagnation sont recomptées
+        self._reprise = 0
+
+    def observer(self, iteration: int, code: str, resultat: dict, revision: int = None) -> str:
+        """Enregistre l'état d'une itération.
+
+        Args:
+            iteration: Numéro de l'itération
+            code: Contenu actuel du fichier
+            resultat: Résultat de l'exécution (executer_script / executer_script_multi)
+            revision: Révision BackupStore correspondant à ce contenu
+
+        Returns:
+            str | None: Description du problème détecté (None si la boucle progresse)
+        """
+        erreurs = nombre_erreurs(resultat)
+        etat = {
+            'iteration': iteration,
+            'hash': hashlib.sha256(code.encode('utf-8')).hexdigest(),
+            'signature': signature_erreur(resultat['stderr']) if resultat['stderr'] else None,
+            'erreurs': erreurs,
+            'revision': revision
+        }
+
+        probleme = None
+        deja_vu = [e for e in self.historique if e['hash'] == etat['hash']]
+        recents = self.historique[self._reprise:][-(self.repetitions_max - 1):]
+        # En mode une erreur à la fois, chaque correction fait apparaître l'erreur
+        # suivante : une signature jamais vue compte comme un progrès
+        progres = (self.meilleur is None or erreurs < self.meilleur['erreurs']
+                   or etat['signature'] not in self._signatures)
+        # Stagnation comptée depuis le dernier progrès ou la dernière escalade
+        reference = self._progres if self._progres is not None else iteration
+        if self._reprise:
+            reference = max(reference, self.historique[self._reprise - 1]['iteration'])
+        if deja_vu:
+            probleme = f"oscillation : le fichier est revenu à l'état de l'itération {deja_vu[-1]['iteration']}"
+        elif (len(recents) == self.repetitions_max - 1
+              and all(e['signature'] == etat['signature'] for e in recents)):
+            probleme = f"même erreur {self.repetitions_max} fois de suite"
+        elif not progres and iteration - reference >= self.stagnation_max:
+            probleme = f"aucune amélioration depuis {iteration - reference} itération(s)"
+
+        self.historique.append(etat)
+        self._signatures.add(etat['signature'])
+        if progres:
+            self._progres = iteration
+        if self.meilleur is None or erreurs < self.meilleur['erreurs']:
+            self.meilleur = etat
+        if probleme:
+            self.niveau += 1
+            self._reprise = len(self.historique)
+        return probleme
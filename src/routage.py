@@ -0,0 +1,200 @@
+"""Routage et couverture des requêtes entre plusieurs backends LLM
+
+- BackendCouvert : si le backend principal n'a pas répondu au bout d'un
+  seuil (percentile de ses latences récentes), un backend de secours est
+  interrogé en parallèle ; la première réponse JSON valide l'emporte
+- BackendRoute : les erreurs simples (NameError, KeyError...) sont envoyées
+  à un modèle plus petit et plus rapide, les autres au modèle principal
+
+Les deux exposent l'interface LLMBackend et se composent librement.
+"""
+import json
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.llm_backends import LLMBackend
+from src.tracing import span, tracer_actif, utiliser_tracer
+
+
+# Types d'erreurs qu'un petit modèle corrige aussi bien qu'un grand
+TYPES_SIMPLES = {
+    'NameError', 'UnboundLocalError', 'ZeroDivisionError', 'KeyError', 'IndexError',
+    'AttributeError', 'ModuleNotFoundError', 'ImportError', 'IndentationError', 'SyntaxError'
+}
+_EXCEPTION = re.compile(r'^(?:\w+\.)*(\w+(?:Error|Exception))(?::|$)', re.MULTILINE)
+
+
+def json_valide(texte: str) -> bool:
+    """True si le texte contient un objet JSON exploitable (comme _parse_response)."""
+    objet = re.search(r'\{.*\}', texte, re.DOTALL)
+    try:
+        return isinstance(json.loads(objet.group(0) if objet else texte), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+def percentile(valeurs, q: float) -> float:
+    """Percentile (plus proche rang) d'une liste de valeurs."""
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(q * (len(valeurs) - 1))))]
+
+
+class BackendCouvert(LLMBackend):
+    """Requêtes couvertes : un secours est lancé si le principal tarde."""
+
+    def __init__(self, principal: LLMBackend, secours: list, quantile: float = 0.95,
+                 seuil_initial: float = 4.0, seuil_min: float = 0.5, fenetre: int = 50,
+                 echantillons_min: int = 5):
+        """Initialise la couverture.
+
+        Args:
+            principal: Backend interrogé en premier
+            secours: Backends lancés tour à tour quand le seuil est dépassé
+            quantile: Percentile des latences du principal servant de seuil
+            seuil_initial: Seuil (secondes) tant que les mesures sont insuffisantes
+            seuil_min: Seuil minimal (secondes)
+            fenetre: Nombre de latences récentes conservées
+            echantillons_min: Mesures nécessaires avant d'utiliser le percentile
+        """
+        self.principal = principal
+        self.secours = list(secours)
+        self.model = principal.model
+        self.quantile = quantile
+        self.seuil_initial = seuil_initial
+        self.seuil_min = seuil_min
+        self.echantillons_min = echantillons_min
+        self._latences = deque(maxlen=fenetre)
+        self._pool = ThreadPoolExecutor(max_workers=4 * (1 + len(self.secours)),
+                                        thread_name_prefix='couverture')
+        self._lock = threading.Lock()
+        # Statistiques : requêtes couvertes, victoires des secours, tokens des perdants
+        self.couvertes = 0
+        self.victoires_secours = 0
+        self.tokens_perdus = 0
+
+    def seuil(self) -> float:
+        """Délai avant de lancer un secours : percentile des latences du principal."""
+        with self._lock:
+            if len(self._latences) < self.echantillons_min:
+                return self.seuil_initial
+            return max(self.seuil_min, percentile(self._latences, self.quantile))
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        backends = [self.principal] + self.secours
+        tracer = tracer_actif()
+        seuil = self.seuil()
+        debut = time.monotonic()
+        en_cours = {}
+        erreur = None
+        invalide = None
+
+        def lancer(index):
+            futur = self._pool.submit(self._appeler, tracer, index, backends[index],
+                                      messages, temperature, max_tokens, top_p)
+            en_cours[futur] = index
+
+        with span('couverture', seuil=round(seuil, 3)) as etape:
+            lancer(0)
+            suivant = 1
+            while en_cours:
+                delai = None
+                if suivant < len(backends):
+                    delai = max(0.0, debut + seuil * suivant - time.monotonic())
+                termines, _ = wait(en_cours, timeout=delai, return_when=FIRST_COMPLETED)
+                if not termines:
+                    # Seuil dépassé : un secours est lancé en parallèle
+                    if suivant == 1:
+                        with self._lock:
+                            self.couvertes += 1
+                    lancer(suivant)
+                    suivant += 1
+                    continue
+
+                for futur in termines:
+                    index = en_cours.pop(futur)
+                    try:
+                        reponse = futur.result()
+                    except Exception as e:
+                        erreur = e
+                        continue
+                    if not json_valide(reponse['texte']):
+                        invalide = invalide or reponse
+                        continue
+
+                    for perdant in en_cours:
+                        perdant.add_done_callback(self._compter_perdant)
+                    etape.attributs.update(gagnant=reponse['modele'], lances=suivant)
+                    if index > 0:
+                        with self._lock:
+                            self.victoires_secours += 1
+                    return reponse
+
+                # Tous les backends lancés ont échoué : le secours suivant part aussitôt
+                if not en_cours and suivant < len(backends):
+                    lancer(suivant)
+                    suivant += 1
+
+            etape.attributs['lances'] = suivant
+            if invalide is not None:
+                return invalide
+            raise erreur
+
+    def _appeler(self, tracer, index: int, backend: LLMBackend, messages: list,
+                 temperature: float, max_tokens: int, top_p: float) -> dict:
+        """Appel d'un backend dans le pool (latence du principal enregistrée)."""
+        debut = time.monotonic()
+        with utiliser_tracer(tracer):
+            reponse = dict(backend.complete(messages, temperature, max_tokens, top_p))
+        if index == 0:
+            with self._lock:
+                self._latences.append(time.monotonic() - debut)
+        reponse.setdefault('modele', backend.model)
+        return reponse
+
+    def _compter_perdant(self, futur):
+        """Tokens consommés par une requête dont la réponse n'a pas été retenue."""
+        if futur.cancelled() or futur.exception() is not None:
+            return
+        reponse = futur.result()
+        with self._lock:
+            self.tokens_perdus += reponse['tokens_entree'] + reponse['tokens_sortie']
+
+
+class BackendRoute(LLMBackend):
+    """Envoie les erreurs simples à un modèle rapide, les autres au principal."""
+
+    def __init__(self, principal: LLMBackend, rapide: LLMBackend, types_simples: set = None):
+        """Initialise le routage.
+
+        Args:
+            principal: Backend des erreurs complexes
+            rapide: Backend (petit modèle) des erreurs simples
+            types_simples: Types d'exceptions routés vers le modèle rapide
+        """
+        self.principal = principal
+        self.rapide = rapide
+        self.model = principal.model
+        self.types_simples = TYPES_SIMPLES if types_simples is None else set(types_simples)
+        self._lock = threading.Lock()
+        self.routees = 0
+
+    def choisir(self, messages: list) -> LLMBackend:
+        """Backend adapté aux erreurs du dernier message."""
+        types = set(_EXCEPTION.findall(messages[-1]['content']))
+        if types and types <= self.types_simples:
+            return self.rapide
+        return self.principal
+
+    def complete(self, messages: list, temperature: float = 0.1,
+                 max_tokens: int = 1500, top_p: float = 0.95) -> dict:
+        backend = self.choisir(messages)
+        if backend is self.rapide:
+            with self._lock:
+                self.routees += 1
+        reponse = dict(backend.complete(messages, temperature, max_tokens, top_p))
+        reponse.setdefault('modele', backend.model)
+        return reponse
@@ -0,0 +1,41 @@
+"""Routage de sys.stdout par thread
+
+Plusieurs boucles de débogage tournent dans le même processus (lot, démon) :
+chaque thread enregistré écrit dans son propre flux (journal, client), les
+autres dans le flux par défaut.
+"""
+import contextlib
+import io
+import threading
+
+
+class SortieParThread(io.TextIOBase):
+    """Remplace sys.stdout : chaque thread enregistré écrit dans son propre flux.
+
+    Les threads non enregistrés (boucle asyncio, progression) écrivent dans
+    le flux par défaut.
+    """
+
+    def __init__(self, defaut):
+        self.defaut = defaut
+        self._flux = {}
+        self._lock = threading.Lock()
+
+    def write(self, texte: str) -> int:
+        flux = self._flux.get(threading.get_ident(), self.defaut)
+        return flux.write(texte)
+
+    def flush(self):
+        self.defaut.flush()
+
+    @contextlib.contextmanager
+    def capturer(self, flux):
+        """Redirige les écritures du thread courant vers `flux`."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._flux[ident] = flux
+        try:
+            yield flux
+        finally:
+            with self._lock:
+                self._flux.pop(ident, None)
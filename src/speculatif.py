@@ -0,0 +1,126 @@
+"""Mode spéculatif : validation parallèle de corrections candidates
+
+Chaque jeu de corrections proposé par l'IA est appliqué sur une copie du
+script dans un dossier temporaire, puis exécuté. Les exécutions tournent en
+parallèle (chacune dans son propre interpréteur, avec le timeout et les
+limites de la session) et le meilleur candidat est retenu avant de toucher
+au vrai fichier ; les candidats encore en cours sont alors tués.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.analysis_cache import signature_erreur
+from src.executeur import executer_script
+from src.file_patcher import FilePatcher, corrections_vers_operations
+from src.limites import HistoriqueDurees, LimitesExecution, historique_par_defaut
+
+
+# Ordre de préférence des statuts d'un candidat
+_RANG = {'succes': 0, 'progres': 1}
+
+
+def _evaluer_candidat(script_path: str, corrections: dict, venv_python: str, timeout: float,
+                      limites: LimitesExecution, historique: HistoriqueDurees, arret: threading.Event):
+    """Applique un candidat dans un espace temporaire et l'exécute.
+
+    Returns:
+        dict | None: {'corrections', 'operations', 'resultat'} ou None si le
+        patch est invalide
+    """
+    operations = corrections_vers_operations(corrections)
+    if not operations:
+        return None
+
+    espace = tempfile.mkdtemp(prefix='agent_spec_')
+    try:
+        copie = os.path.join(espace, os.path.basename(script_path))
+        shutil.copy2(script_path, copie)
+        patcher = FilePatcher(backup_dir=os.path.join(espace, 'backups'))
+        if not patcher.apply_patch(copie, operations, create_backup=False):
+            return None
+
+        # Les imports locaux du script doivent rester résolus depuis la copie
+        env = dict(os.environ)
+        dossier = os.path.dirname(os.path.abspath(script_path))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [dossier, env.get('PYTHONPATH')]))
+
+        resultat = executer_script(copie, venv_python, env=env, timeout=timeout, limites=limites,
+                                   historique=historique, annulation=arret)
+        return {'corrections': corrections, 'operations': operations, 'resultat': resultat}
+    finally:
+        shutil.rmtree(espace, ignore_errors=True)
+
+
+def _statut(evaluation, signature_initiale: str) -> str:
+    """Classe un candidat : succes, progres (autre erreur), echec ou invalide."""
+    if evaluation is None:
+        return 'invalide'
+    stderr = evaluation['resultat']['stderr']
+    if not stderr:
+        return 'succes'
+    if signature_erreur(stderr) == signature_initiale:
+        return 'echec'
+    return 'progres'
+
+
+def evaluer_candidats(script_path: str, candidats: list, erreur_initiale: str,
+                      venv_python: str = None, strategie: str = 'premier',
+                      max_workers: int = None, timeout: float = None,
+                      limites: LimitesExecution = None):
+    """Évalue les candidats en parallèle et retourne le meilleur.
+
+    Args:
+        script_path: Script d'origine (jamais modifié)
+        candidats: Jeux de corrections (AIDebugger.propose_candidates)
+        erreur_initiale: stderr de l'exécution qui a échoué
+        venv_python: Chemin Python du venv (optionnel)
+        strategie: 'premier' (premier succès) ou 'meilleur' (attend tous les candidats)
+        max_workers: Exécutions simultanées (défaut: nombre de CPU)
+        timeout: Timeout de chaque exécution (défaut: timeout adaptatif du script d'origine)
+        limites: Limites de ressources de la session
+
+    Returns:
+        dict | None: {'index', 'statut', 'corrections', 'operations', 'resultat'}
+        pour le meilleur candidat qui fait disparaître l'erreur initiale
+    """
+    if not candidats:
+        return None
+
+    signature_initiale = signature_erreur(erreur_initiale)
+    max_workers = max_workers or min(len(candidats), os.cpu_count() or 1)
+    if timeout is None:
+        timeout = historique_par_defaut().timeout_adaptatif(script_path)
+    print(f"⚡ Évaluation de {len(candidats)} candidat(s) en parallèle ({max_workers} workers)")
+
+    # Les copies temporaires n'entrent pas dans l'historique partagé des durées
+    historique = HistoriqueDurees(path=None)
+    arret = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {
+        pool.submit(_evaluer_candidat, script_path, corrections, venv_python, timeout, limites,
+                    historique, arret): index
+        for index, corrections in enumerate(candidats)
+    }
+    retenus = []
+    try:
+        for future in as_completed(futures):
+            evaluation = future.result()
+            statut = _statut(evaluation, signature_initiale)
+            print(f"   • Candidat {futures[future] + 1}: {statut}")
+            if statut not in _RANG:
+                continue
+            evaluation.update({'index': futures[future], 'statut': statut})
+            retenus.append(evaluation)
+            if strategie == 'premier' and statut == 'succes':
+                return evaluation
+    finally:
+        # Les candidats encore en cours sont tués (leur espace est nettoyé en arrière-plan)
+        arret.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if not retenus:
+        return None
+    return min(retenus, key=lambda e: (_RANG[e['statut']], len(e['operations']), e['index']))
@@ -0,0 +1,290 @@
+"""Mode surveillance : relance la boucle de débogage à chaque enregistrement
+
+Le script cible et ses imports locaux sont surveillés (inotify sous Linux,
+scrutation des dates de modification ailleurs). Les enregistrements
+rapprochés sont regroupés (anti-rebond) ; une session devenue obsolète est
+annulée (exécution tuée, analyse ignorée) avant d'en relancer une sur le
+nouveau contenu. Les écritures de l'agent lui-même (patchs, retours
+arrière) ne déclenchent pas de nouvelle session.
+"""
+import ast
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from src.file_patcher import FilePatcher, empreinte_fichier
+
+
+# Masque inotify : fichier fermé après écriture, renommé ou créé dans le dossier, supprimé
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+_EVENEMENT = struct.Struct('iIII')
+
+
+def _module_local(dossier: str, nom: str):
+    """Fichier d'un module importable depuis `dossier` (None s'il n'y est pas)."""
+    chemin = os.path.join(dossier, *nom.split('.'))
+    for candidat in (f"{chemin}.py", os.path.join(chemin, '__init__.py')):
+        if os.path.isfile(candidat):
+            return os.path.abspath(candidat)
+    return None
+
+
+def fichiers_locaux(chemin_script: str) -> list:
+    """Script et modules locaux qu'il importe (récursivement).
+
+    Un module est local s'il se trouve à côté du script (fichier .py ou
+    package), comme pour fork_server.modules_stables.
+    """
+    racine = os.path.dirname(os.path.abspath(chemin_script))
+    a_visiter = [os.path.abspath(chemin_script)]
+    trouves = []
+    while a_visiter:
+        chemin = a_visiter.pop()
+        if chemin in trouves:
+            continue
+        trouves.append(chemin)
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                arbre = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            continue
+
+        dossier = os.path.dirname(chemin)
+        for noeud in ast.walk(arbre):
+            modules = []
+            if isinstance(noeud, ast.Import):
+                modules = [(racine, alias.name) for alias in noeud.names]
+            elif isinstance(noeud, ast.ImportFrom):
+                base = racine
+                if noeud.level:
+                    base = dossier
+                    for _ in range(noeud.level - 1):
+                        base = os.path.dirname(base)
+                prefixe = f"{noeud.module}." if noeud.module else ""
+                if noeud.module:
+                    modules.append((base, noeud.module))
+                # "from paquet import module" : les noms peuvent être des sous-modules
+                modules += [(base, prefixe + alias.name) for alias in noeud.names if alias.name != '*']
+            for base, nom in modules:
+                fichier = _module_local(base, nom)
+                if fichier is not None:
+                    a_visiter.append(fichier)
+    return trouves
+
+
+class ObservateurScrutation:
+    """Détecte les modifications en comparant dates et tailles (toutes plateformes)."""
+
+    def __init__(self, chemins: list, intervalle: float = 0.25):
+        self.intervalle = intervalle
+        self.surveiller(chemins)
+
+    def _etat(self, chemin: str):
+        try:
+            infos = os.stat(chemin)
+            return infos.st_mtime_ns, infos.st_size
+        except OSError:
+            return None
+
+    def surveiller(self, chemins: list):
+        """Remplace la liste des fichiers surveillés."""
+        self._etats = {chemin: self._etat(chemin) for chemin in chemins}
+
+    def attendre(self, timeout: float) -> set:
+        """Fichiers modifiés pendant au plus `timeout` secondes (ensemble vide sinon)."""
+        limite = time.monotonic() + timeout
+        while True:
+            modifies = set()
+            for chemin, etat in self._etats.items():
+                nouveau = self._etat(chemin)
+                if nouveau != etat:
+                    self._etats[chemin] = nouveau
+                    modifies.add(chemin)
+            restant = limite - time.monotonic()
+            if modifies or restant <= 0:
+                return modifies
+            time.sleep(min(self.intervalle, restant))
+
+    def fermer(self):
+        pass
+
+
+class ObservateurInotify:
+    """Détecte les modifications via inotify (Linux), sans scrutation.
+
+    Les dossiers sont surveillés plutôt que les fichiers : les éditeurs
+    enregistrent souvent en écrivant un fichier temporaire puis en le
+    renommant, ce qui ferait perdre une surveillance posée sur le fichier.
+    """
+
+    def __init__(self, chemins: list):
+        nom = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(nom or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dossiers = {}
+        self.surveiller(chemins)
+
+    def surveiller(self, chemins: list):
+        """Remplace la liste des fichiers surveillés."""
+        self._chemins = set(chemins)
+        for dossier in {os.path.dirname(c) for c in chemins} - set(self._dossiers.values()):
+            descripteur = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(dossier), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            )
+            if descripteur < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {dossier}")
+            self._dossiers[descripteur] = dossier
+
+    def attendre(self, timeout: float) -> set:
+        """Fichiers modifiés pendant au plus `timeout` secondes (ensemble vide sinon)."""
+        limite = time.monotonic() + timeout
+        while True:
+            restant = limite - time.monotonic()
+            if restant <= 0 or not select.select([self._fd], [], [], restant)[0]:
+                return set()
+            modifies = set()
+            donnees = os.read(self._fd, 65536)
+            position = 0
+            while position < len(donnees):
+                descripteur, masque, _, taille = _EVENEMENT.unpack_from(donnees, position)
+                nom = donnees[position + _EVENEMENT.size:position + _EVENEMENT.size + taille].rstrip(b'\0')
+                position += _EVENEMENT.size + taille
+                if masque & IN_Q_OVERFLOW:
+                    # Événements perdus : tous les fichiers sont considérés modifiés
+                    return set(self._chemins)
+                chemin = os.path.join(self._dossiers.get(descripteur, ''), os.fsdecode(nom))
+                if chemin in self._chemins:
+                    modifies.add(chemin)
+            if modifies:
+                return modifies
+
+    def fermer(self):
+        os.close(self._fd)
+
+
+def creer_observateur(chemins: list, scrutation: bool = False):
+    """Observateur inotify si disponible, scrutation sinon."""
+    if not scrutation and hasattr(select, 'select') and os.path.isdir('/proc/sys/fs/inotify'):
+        try:
+            return ObservateurInotify(chemins)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify indisponible ({e}) - scrutation des fichiers")
+    return ObservateurScrutation(chemins)
+
+
+class Surveillance:
+    """Relance une session de débogage après chaque modification des fichiers."""
+
+    def __init__(self, script_path: str, lancer, patcher: FilePatcher = None,
+                 anti_rebond: float = 0.3, scrutation: bool = False):
+        """Initialise la surveillance.
+
+        Args:
+            script_path: Script à déboguer
+            lancer: Fonction lancer(annulation) -> bool exécutant une session sans
+                interaction (annulation: threading.Event levé si la session devient obsolète)
+            patcher: FilePatcher utilisé par les sessions (ses écritures sont ignorées)
+            anti_rebond: Délai sans nouvelle modification avant de relancer (secondes)
+            scrutation: Si True, scrute les fichiers même si inotify est disponible
+        """
+        self.script_path = os.path.abspath(script_path)
+        self.lancer = lancer
+        self.patcher = patcher
+        self.anti_rebond = anti_rebond
+        self.scrutation = scrutation
+        self.sessions = 0
+        self.annulees = 0
+        self._fichiers = fichiers_locaux(self.script_path)
+        self._empreintes = {chemin: empreinte_fichier(chemin) for chemin in self._fichiers}
+        self._thread = None
+        self._annulation = None
+
+    def _demarrer(self):
+        """Lance une session dans un thread."""
+        self.sessions += 1
+        self._annulation = threading.Event()
+        annulation = self._annulation
+
+        def session():
+            succes = self.lancer(annulation)
+            if not annulation.is_set():
+                etat = "✅ Script corrigé" if succes else "⚠️  Session terminée sans succès"
+                print(f"\n{etat} - 👀 en attente de modifications (Ctrl+C pour quitter)")
+
+        self._thread = threading.Thread(target=session, name=f"session-{self.sessions}", daemon=True)
+        self._thread.start()
+
+    def _annuler(self, delai: float = 10.0):
+        """Annule la session en cours et attend qu'elle se termine (au plus `delai` secondes).
+
+        Une session bloquée (appel LLM, exécution en fork-server) est abandonnée :
+        son thread est un démon et l'annulation l'empêche d'appliquer un patch.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self.annulees += 1
+            print("\n⏹️  Modification pendant la session - annulation")
+            self._annulation.set()
+            self._thread.join(timeout=delai)
+            if self._thread.is_alive():
+                print(f"⚠️  Session {self._thread.name} toujours active après {delai:.0f}s - abandonnée")
+
+    def _modifications_reelles(self, chemins: set) -> list:
+        """Fichiers dont le contenu a changé, hors écritures de l'agent."""
+        reels = []
+        ecritures = self.patcher.ecritures if self.patcher is not None else {}
+        for chemin in sorted(chemins):
+            empreinte = empreinte_fichier(chemin)
+            if empreinte != self._empreintes.get(chemin) and empreinte != ecritures.get(chemin):
+                reels.append(chemin)
+            self._empreintes[chemin] = empreinte
+        return reels
+
+    def executer(self):
+        """Boucle de surveillance (jusqu'à Ctrl+C)."""
+        observateur = creer_observateur(self._fichiers, self.scrutation)
+        mode = 'inotify' if isinstance(observateur, ObservateurInotify) else 'scrutation'
+        print(f"👀 Surveillance ({mode}) de {len(self._fichiers)} fichier(s): "
+              f"{', '.join(os.path.relpath(f) for f in self._fichiers)}")
+        self._demarrer()
+        try:
+            while True:
+                modifies = observateur.attendre(1.0)
+                if not modifies:
+                    continue
+                # Anti-rebond : on attend que les enregistrements cessent
+                while True:
+                    suivants = observateur.attendre(self.anti_rebond)
+                    if not suivants:
+                        break
+                    modifies |= suivants
+
+                reels = self._modifications_reelles(modifies)
+                if not reels:
+                    continue
+                print(f"\n💾 Modifié: {', '.join(os.path.relpath(f) for f in reels)}")
+                self._annuler()
+
+                # Les imports locaux ont pu changer
+                self._fichiers = fichiers_locaux(self.script_path)
+                for chemin in self._fichiers:
+                    self._empreintes.setdefault(chemin, empreinte_fichier(chemin))
+                observateur.surveiller(self._fichiers)
+                self._demarrer()
+        except KeyboardInterrupt:
+            print("\n🛑 Surveillance arrêtée")
+            if self._annulation is not None:
+                self._annulation.set()
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+        finally:
+            observateur.fermer()
@@ -0,0 +1,272 @@
+"""Budget de tokens des requêtes et compression des tracebacks
+
+Le prompt envoyé au modèle est borné quelle que soit la taille de l'erreur
+ou du fichier :
+
+- la traceback est compressée (frames de bibliothèques omises, séquences de
+  frames répétées regroupées, chaîne d'exceptions réduite aux dernières)
+- le code est tronqué par priorité (lignes de la traceback et leur voisinage,
+  puis imports, puis le reste) en conservant les vrais numéros de ligne
+- `max_tokens` est dimensionné selon le nombre d'erreurs à corriger
+"""
+import re
+
+from src.context_slicer import estimer_tokens, formater_extrait, lignes_traceback
+
+
+# Séparateurs d'une chaîne d'exceptions
+_CHAINE = re.compile(
+    r'^\s*(?:During handling of the above exception, another exception occurred:'
+    r'|The above exception was the direct cause of the following exception:)\s*$',
+    re.MULTILINE
+)
+_FRAME = re.compile(r'^\s*File "([^"]+)", line (\d+)')
+# En-têtes des erreurs du mode multi-erreurs (voir texte_erreurs)
+_BLOC_ERREUR = re.compile(r'^--- Erreur \d+/\d+.*---$', re.MULTILINE)
+# Chemins des bibliothèques (stdlib, site-packages) et frames internes
+_BIBLIOTHEQUE = re.compile(r'[\\/](?:site-packages|dist-packages|lib[\\/]python\d[\d.]*)[\\/]|^<frozen ')
+
+# Regroupement des frames répétées : période maximale et répétitions minimales
+PERIODE_MAX = 4
+REPETITIONS_MIN = 3
+# Exceptions de la chaîne conservées avec leurs frames
+EXCEPTIONS_GARDEES = 2
+
+
+def _decouper_frames(bloc: str):
+    """Sépare un bloc de traceback en (en-tête, frames, fin).
+
+    Chaque frame est une liste de lignes : la ligne 'File ...' suivie de la
+    source et des marqueurs '^^^'. La fin contient la ligne d'exception.
+    """
+    entete, frames, fin = [], [], []
+    for ligne in bloc.splitlines():
+        if _FRAME.match(ligne) and not fin:
+            frames.append([ligne])
+        elif frames and not fin and ligne.startswith('    '):
+            frames[-1].append(ligne)
+        elif frames and not fin and ligne.strip().startswith('[Previous line repeated'):
+            frames[-1].append(ligne)
+        elif frames:
+            fin.append(ligne)
+        else:
+            entete.append(ligne)
+    return entete, frames, fin
+
+
+def _regrouper_repetitions(frames: list) -> list:
+    """Remplace les séquences de frames répétées (récursion) par un marqueur."""
+    cles = [tuple(f) for f in frames]
+    resultat = []
+    i = 0
+    while i < len(frames):
+        for periode in range(1, min(PERIODE_MAX, len(frames) - i) + 1):
+            motif = cles[i:i + periode]
+            repetitions = 1
+            while cles[i + repetitions * periode:i + (repetitions + 1) * periode] == motif:
+                repetitions += 1
+            if repetitions >= REPETITIONS_MIN:
+                resultat.extend(frames[i:i + periode])
+                resultat.append([f"  [... séquence de {periode} frame(s) répétée "
+                                 f"{repetitions - 1} fois de plus ...]"])
+                i += repetitions * periode
+                break
+        else:
+            resultat.append(frames[i])
+            i += 1
+    return resultat
+
+
+def _omettre_bibliotheques(frames: list, filename: str = None) -> list:
+    """Remplace les frames de bibliothèques consécutives par un marqueur.
+
+    La dernière frame (là où l'exception est levée) est toujours gardée.
+    """
+    resultat = []
+    omises = 0
+    for index, frame in enumerate(frames):
+        chemin = _FRAME.match(frame[0])
+        externe = (
+            chemin is not None
+            and _BIBLIOTHEQUE.search(chemin.group(1))
+            and not (filename and re.split(r'[\\/]', chemin.group(1))[-1] == filename)
+            and index < len(frames) - 1
+        )
+        if externe:
+            omises += 1
+            continue
+        if omises:
+            resultat.append([f"  [... {omises} frame(s) de bibliothèques omise(s) ...]"])
+            omises = 0
+        resultat.append(frame)
+    return resultat
+
+
+def compresser_traceback(error: str, filename: str = None, max_tokens: int = 1500) -> str:
+    """Réduit une traceback à l'essentiel en respectant un budget de tokens.
+
+    En mode multi-erreurs, chaque bloc '--- Erreur i/n ---' est compressé
+    séparément avec une part égale du budget.
+
+    Args:
+        error: Sortie d'erreur (stderr) complète
+        filename: Fichier analysé (ses frames ne sont jamais omises)
+        max_tokens: Taille maximale du résultat
+
+    Returns:
+        str: Traceback compressée (inchangée si elle tient déjà dans le budget
+        et ne contient pas de répétitions)
+    """
+    entetes = _BLOC_ERREUR.findall(error)
+    if not entetes:
+        return _compresser_bloc(error, filename, max_tokens)
+
+    preambule, *blocs = _BLOC_ERREUR.split(error)
+    part = max(max_tokens - estimer_tokens(preambule), 100) // len(entetes)
+    texte = [preambule.strip("\n")] if preambule.strip() else []
+    for entete, bloc in zip(entetes, blocs):
+        compresse = _compresser_bloc(bloc.strip("\n"), filename, part)
+        texte.append(f"{entete}\n{compresse.rstrip()}")
+    return "\n\n".join(texte) + "\n"
+
+
+def _compresser_bloc(error: str, filename: str, max_tokens: int) -> str:
+    """Compresse une traceback unique (éventuellement chaînée)."""
+    morceaux = _CHAINE.split(error)
+    separateurs = _CHAINE.findall(error)
+
+    blocs = []
+    for index, morceau in enumerate(morceaux):
+        entete, frames, fin = _decouper_frames(morceau)
+        if index < len(morceaux) - EXCEPTIONS_GARDEES:
+            # Exceptions anciennes de la chaîne : seulement la ligne d'exception
+            resume = [l for l in fin if l.strip()][-1:] or ["(exception)"]
+            blocs.append("[... traceback omise ...]\n" + "\n".join(resume))
+        else:
+            frames = _omettre_bibliotheques(_regrouper_repetitions(frames), filename)
+            blocs.append("\n".join(entete + [l for f in frames for l in f] + fin))
+
+    texte = ""
+    for index, bloc in enumerate(blocs):
+        if index:
+            texte += "\n\n" + separateurs[index - 1].strip() + "\n\n"
+        texte += bloc.strip("\n")
+    texte = texte.strip("\n") + "\n"
+
+    if estimer_tokens(texte) <= max_tokens:
+        return texte
+
+    # Toujours trop long : début et fin conservés (la fin porte l'exception)
+    max_caracteres = max_tokens * 4
+    debut = texte[:max_caracteres // 4]
+    fin = texte[-(max_caracteres - len(debut)):]
+    debut = debut[:debut.rfind("\n") + 1] or debut
+    fin = fin[fin.find("\n") + 1:] if "\n" in fin[:-1] else fin
+    omis = len(texte) - len(debut) - len(fin)
+    return f"{debut}[... {omis} caractères omis ...]\n{fin}"
+
+
+def tronquer_code(code: str, error: str, filename: str, max_tokens: int, lignes: list = None) -> str:
+    """Réduit le code au budget en gardant les lignes les plus utiles.
+
+    Priorité : lignes de la traceback et leur voisinage (du plus proche au
+    plus lointain), puis imports, puis le début du fichier. Le résultat est
+    un extrait numéroté (vrais numéros de ligne).
+
+    Args:
+        code: Code source complet
+        error: Traceback (pour les lignes prioritaires)
+        filename: Nom du fichier analysé
+        max_tokens: Taille maximale de l'extrait
+        lignes: Lignes candidates (extrait déjà découpé) ; par défaut toutes
+    """
+    lignes_source = code.splitlines()
+    candidates = lignes or list(range(1, len(lignes_source) + 1))
+    frames = [n for n in lignes_traceback(error, filename) if 1 <= n <= len(lignes_source)]
+
+    def priorite(n):
+        if frames:
+            distance = min(abs(n - f) for f in frames)
+        else:
+            distance = n
+        if lignes_source[n - 1].lstrip().startswith(('import ', 'from ')):
+            distance = min(distance, 10)
+        return (distance, n)
+
+    budget = max_tokens * 4
+    gardees = []
+    taille = 0
+    for n in sorted(candidates, key=priorite):
+        cout = len(lignes_source[n - 1]) + 12
+        if taille + cout <= budget:
+            gardees.append(n)
+            taille += cout
+
+    # Les marqueurs d'omission s'ajoutent : on retire les lignes les moins prioritaires
+    texte = formater_extrait(lignes_source, sorted(gardees), filename)
+    while gardees and estimer_tokens(texte) > max_tokens:
+        del gardees[-max(1, len(gardees) // 8):]
+        texte = formater_extrait(lignes_source, sorted(gardees), filename)
+    return texte
+
+
+class TokenBudget:
+    """Répartition du budget de tokens d'une requête."""
+
+    def __init__(self, limite_prompt: int = 12000, part_erreur: float = 0.25,
+                 tokens_min: int = 1500, tokens_max: int = 4000, tokens_par_correction: int = 600):
+        """Initialise le budget.
+
+        Args:
+            limite_prompt: Taille maximale du prompt (system + user), en tokens
+            part_erreur: Part maximale du budget restant accordée à la traceback
+            tokens_min: max_tokens minimal d'une réponse (une correction complète :
+                cause, code d'origine et corrigé, explication, conseil)
+            tokens_max: max_tokens maximal d'une réponse
+            tokens_par_correction: Tokens de réponse prévus par erreur à corriger
+        """
+        self.limite_prompt = limite_prompt
+        self.part_erreur = part_erreur
+        self.tokens_min = tokens_min
+        self.tokens_max = tokens_max
+        self.tokens_par_correction = tokens_par_correction
+
+    def repartir(self, fixe: str, code: str, error: str, filename: str, contexte: dict = None) -> dict:
+        """Ajuste code et erreur pour que le prompt tienne dans le budget.
+
+        Args:
+            fixe: Texte incompressible (system prompt + template utilisateur)
+            code: Code source complet
+            error: Traceback
+            filename: Nom du fichier
+            contexte: Résultat de decouper_contexte (None : code envoyé entier)
+
+        Returns:
+            dict: {'code', 'error', 'tokens': {'fixe', 'code', 'erreur'},
+                   'code_tronque': bool, 'erreur_compressee': bool}
+        """
+        tokens_fixe = estimer_tokens(fixe)
+        disponible = max(self.limite_prompt - tokens_fixe, 200)
+
+        erreur = compresser_traceback(error, filename, int(disponible * self.part_erreur))
+        disponible_code = max(disponible - estimer_tokens(erreur), 100)
+
+        envoye = contexte['code'] if contexte else code
+        code_tronque = estimer_tokens(envoye) > disponible_code
+        if code_tronque:
+            lignes = contexte.get('lignes') if contexte else None
+            envoye = tronquer_code(code, error, filename, disponible_code, lignes)
+
+        return {
+            'code': envoye,
+            'error': erreur,
+            'tokens': {'fixe': tokens_fixe, 'code': estimer_tokens(envoye), 'erreur': estimer_tokens(erreur)},
+            'code_tronque': code_tronque,
+            # Comparaison des tailles : la compression normalise aussi les sauts de ligne
+            'erreur_compressee': len(erreur.strip()) < len(error.strip())
+        }
+
+    def max_tokens_reponse(self, error: str) -> int:
+        """max_tokens adapté au nombre d'erreurs à corriger."""
+        erreurs = max(1, len(re.findall(r'^--- Erreur \d+/\d+', error, re.MULTILINE)))
+        return max(self.tokens_min, min(self.tokens_max, 900 + erreurs * self.tokens_par_correction))
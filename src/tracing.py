@@ -0,0 +1,202 @@
+"""Traces d'exécution par étape (spans) et export des métriques
+
+Chaque étape instrumentée ouvre un span :
+
+    with span('analyse', fichier=filename) as s:
+        ...
+        s.attributs['cache'] = 'hit'
+
+Un span mesure sa durée, connaît son parent (spans imbriqués dans le même
+thread) et porte des attributs libres (tokens, cache, résultat). Les spans
+terminés sont exportables en JSON lines et en format texte Prometheus, et
+résumés dans un tableau.
+
+Le tracer actif est propre au thread : un worker peut collecter ses propres
+spans avec `utiliser_tracer`, les autres threads utilisent le tracer global.
+"""
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class Span:
+    """Étape mesurée."""
+
+    def __init__(self, span_id: int, nom: str, parent: int = None, attributs: dict = None):
+        self.id = span_id
+        self.nom = nom
+        self.parent = parent
+        self.attributs = attributs or {}
+        self.debut = time.time()
+        self.duree = None
+        self.statut = 'ok'
+        self._chrono = time.perf_counter()
+
+    def terminer(self, erreur: BaseException = None):
+        """Fige la durée (et le statut si une exception est remontée)."""
+        self.duree = time.perf_counter() - self._chrono
+        if erreur is not None:
+            self.statut = 'erreur'
+            self.attributs.setdefault('erreur', f"{type(erreur).__name__}: {erreur}")
+
+    def to_dict(self) -> dict:
+        """Représentation JSON du span."""
+        return {
+            'id': self.id,
+            'nom': self.nom,
+            'parent': self.parent,
+            'debut': round(self.debut, 6),
+            'duree': round(self.duree or 0.0, 6),
+            'statut': self.statut,
+            'attributs': self.attributs
+        }
+
+
+class Tracer:
+    """Collecte des spans terminés (les plus récents, en mémoire)."""
+
+    def __init__(self, max_spans: int = 10000):
+        """Initialise le tracer (max_spans : nombre de spans conservés)."""
+        self.spans = deque(maxlen=max_spans)
+        self._compteur = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pile = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, nom: str, **attributs):
+        """Ouvre un span pour la durée du bloc."""
+        pile = self._pile.__dict__.setdefault('spans', [])
+        courant = Span(next(self._compteur), nom, pile[-1].id if pile else None, attributs)
+        pile.append(courant)
+        try:
+            yield courant
+        except BaseException as e:
+            courant.terminer(e)
+            raise
+        else:
+            courant.terminer()
+        finally:
+            pile.pop()
+            with self._lock:
+                self.spans.append(courant)
+
+    def vider(self):
+        """Oublie tous les spans collectés."""
+        with self._lock:
+            self.spans.clear()
+
+    def _termines(self) -> list:
+        with self._lock:
+            return list(self.spans)
+
+    def exporter_jsonl(self, path: str):
+        """Ajoute les spans (une ligne JSON chacun) à un fichier."""
+        dossier = os.path.dirname(path)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for s in self._termines():
+                f.write(json.dumps(s.to_dict(), ensure_ascii=False) + "\n")
+
+    def resume(self) -> list:
+        """Statistiques par nom de span, dans l'ordre de première apparition.
+
+        Returns:
+            list: [{'etape', 'appels', 'total', 'moyenne', 'p95', 'erreurs',
+                    'tokens_entree', 'tokens_sortie', 'cache_hits'}]
+        """
+        groupes = {}
+        for s in self._termines():
+            groupes.setdefault(s.nom, []).append(s)
+
+        lignes = []
+        for nom, spans in groupes.items():
+            durees = sorted(s.duree for s in spans)
+            lignes.append({
+                'etape': nom,
+                'appels': len(spans),
+                'total': round(sum(durees), 4),
+                'moyenne': round(sum(durees) / len(durees), 4),
+                'p95': round(durees[min(len(durees) - 1, int(round(0.95 * (len(durees) - 1))))], 4),
+                'erreurs': sum(s.statut == 'erreur' for s in spans),
+                'tokens_entree': sum(s.attributs.get('tokens_entree', 0) for s in spans),
+                'tokens_sortie': sum(s.attributs.get('tokens_sortie', 0) for s in spans),
+                'cache_hits': sum(s.attributs.get('cache') == 'hit' for s in spans)
+            })
+        return lignes
+
+    def tableau(self) -> str:
+        """Tableau texte du résumé (affiché en fin de run)."""
+        return tableau_resume(self.resume())
+
+    def prometheus(self, prefixe: str = "agent_debug") -> str:
+        """Métriques au format texte Prometheus."""
+        lignes = self.resume()
+        texte = [
+            f"# HELP {prefixe}_etape_duree_secondes Durée des étapes de la boucle de débogage",
+            f"# TYPE {prefixe}_etape_duree_secondes summary"
+        ]
+        for l in lignes:
+            texte.append(f'{prefixe}_etape_duree_secondes{{etape="{l["etape"]}",quantile="0.95"}} {l["p95"]}')
+            texte.append(f'{prefixe}_etape_duree_secondes_sum{{etape="{l["etape"]}"}} {l["total"]}')
+            texte.append(f'{prefixe}_etape_duree_secondes_count{{etape="{l["etape"]}"}} {l["appels"]}')
+
+        compteurs = [
+            ('etape_erreurs_total', "Étapes terminées en erreur", 'erreurs'),
+            ('tokens_entree_total', "Tokens envoyés au modèle", 'tokens_entree'),
+            ('tokens_sortie_total', "Tokens reçus du modèle", 'tokens_sortie'),
+            ('cache_hits_total', "Analyses servies par le cache", 'cache_hits'),
+        ]
+        for nom, aide, champ in compteurs:
+            texte.append(f"# HELP {prefixe}_{nom} {aide}")
+            texte.append(f"# TYPE {prefixe}_{nom} counter")
+            for l in lignes:
+                texte.append(f'{prefixe}_{nom}{{etape="{l["etape"]}"}} {l[champ]}')
+        return "\n".join(texte) + "\n"
+
+
+def tableau_resume(lignes: list) -> str:
+    """Tableau texte d'un résumé (Tracer.resume, éventuellement reçu du démon)."""
+    if not lignes:
+        return "Aucune mesure"
+    texte = [
+        f"{'Étape':<14}{'Appels':>8}{'Total (s)':>11}{'Moy. (ms)':>11}{'p95 (ms)':>10}"
+        f"{'Erreurs':>9}{'Tokens':>9}{'Cache':>7}",
+        "-" * 79
+    ]
+    for l in lignes:
+        texte.append(
+            f"{l['etape']:<14}{l['appels']:>8}{l['total']:>11.3f}{l['moyenne'] * 1000:>11.1f}"
+            f"{l['p95'] * 1000:>10.1f}{l['erreurs']:>9}{l['tokens_entree'] + l['tokens_sortie']:>9}"
+            f"{l['cache_hits']:>7}"
+        )
+    return "\n".join(texte)
+
+
+_global = Tracer()
+_actif = threading.local()
+
+
+def tracer_actif() -> Tracer:
+    """Tracer du thread courant (le tracer global par défaut)."""
+    return getattr(_actif, 'tracer', None) or _global
+
+
+@contextlib.contextmanager
+def utiliser_tracer(tracer: Tracer):
+    """Redirige les spans du thread courant vers `tracer` le temps du bloc."""
+    precedent = getattr(_actif, 'tracer', None)
+    _actif.tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _actif.tracer = precedent
+
+
+def span(nom: str, **attributs):
+    """Ouvre un span sur le tracer actif (à utiliser avec `with`)."""
+    return tracer_actif().span(nom, **attributs)
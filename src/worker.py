@@ -0,0 +1,189 @@
+"""Boucle de débogage en arrière-plan, pilotée par événements
+
+Le worker exécute le cycle exécution → analyse → confirmation → patch dans
+un thread et publie sa progression dans une file d'événements. L'interface
+(Streamlit ou autre) se contente de lire la file et de transmettre les
+décisions de l'utilisateur.
+
+Événements publiés (dict) :
+    {'type': 'log', 'message': str}
+    {'type': 'etape', 'etape': str, 'iteration': int}
+    {'type': 'confirmation', 'operations': list}
+    {'type': 'fin', 'succes': bool}
+"""
+import os
+import queue
+import threading
+
+from src.executeur import executer_script, executer_script_multi
+from src.file_patcher import FilePatcher, corrections_vers_operations
+from src.tracing import Tracer, span, utiliser_tracer
+
+
+# Libellés des étapes de la boucle
+ETAPES = {
+    'execution': "Exécution du script",
+    'analyse': "Analyse IA des erreurs",
+    'confirmation': "En attente de confirmation",
+    'patch': "Application du patch",
+}
+
+
+class DebugWorker(threading.Thread):
+    """Boucle de débogage exécutée dans un thread, publiant ses événements."""
+
+    def __init__(self, script_path: str, venv_python: str = None, debugger_factory=None,
+                 auto_apply: bool = False, fork_server: bool = False, multi_fault: bool = False,
+                 create_backup: bool = False):
+        """Initialise le worker.
+
+        Args:
+            script_path: Chemin du script à déboguer
+            venv_python: Chemin Python du venv
+            debugger_factory: Fonction retournant l'AIDebugger (appelée à la première erreur)
+            auto_apply: Si True, applique les corrections sans confirmation
+            fork_server: Si True, exécute via un interpréteur pré-chauffé
+            multi_fault: Si True, collecte toutes les erreurs d'une exécution
+            create_backup: Si True, crée un backup avant chaque patch
+        """
+        super().__init__(daemon=True)
+        self.script_path = script_path
+        self.venv_python = venv_python
+        self.debugger_factory = debugger_factory
+        self.auto_apply = auto_apply
+        self.fork_server = fork_server
+        self.multi_fault = multi_fault
+        self.create_backup = create_backup
+
+        self.events = queue.Queue()
+        self.etape = None
+        self.iteration = 0
+        self.total_corrections = 0
+        self.succes = None
+        # Mesures des étapes de ce worker uniquement
+        self.tracer = Tracer()
+        self._decisions = queue.Queue()
+        self._arret = threading.Event()
+
+    def confirmer(self, appliquer: bool):
+        """Transmet la décision de l'utilisateur sur les corrections proposées."""
+        self._decisions.put(appliquer)
+
+    def annuler(self):
+        """Demande l'arrêt de la boucle (effectif à la prochaine étape)."""
+        self._arret.set()
+        self._decisions.put(False)
+
+    @property
+    def annule(self) -> bool:
+        """True si l'arrêt a été demandé."""
+        return self._arret.is_set()
+
+    def log(self, message: str):
+        """Publie une ligne de log."""
+        self.events.put({'type': 'log', 'message': message})
+
+    def run(self):
+        """Point d'entrée du thread."""
+        try:
+            with utiliser_tracer(self.tracer):
+                self.succes = self._boucle()
+        except Exception as e:
+            self.log(f"\n❌ Erreur inattendue: {e}")
+            self.succes = False
+        finally:
+            self.etape = None
+            self.events.put({'type': 'fin', 'succes': self.succes})
+
+    def _changer_etape(self, etape: str):
+        """Publie le passage à une nouvelle étape."""
+        self.etape = etape
+        self.events.put({'type': 'etape', 'etape': etape, 'iteration': self.iteration})
+
+    def _publier_sortie(self, flux: str, ligne: str):
+        """Callback de l'exécuteur : sortie standard du script en direct."""
+        if flux == 'stdout':
+            self.log(f"   │ {ligne}")
+
+    def _boucle(self) -> bool:
+        """Boucle jusqu'au succès, à l'annulation ou à un échec."""
+        debugger = None
+        patcher = FilePatcher()
+
+        while not self._arret.is_set():
+            self.iteration += 1
+
+            # Exécution
+            self._changer_etape('execution')
+            if self.multi_fault:
+                resultat = executer_script_multi(self.script_path, self.venv_python,
+                                                 on_line=self._publier_sortie)
+            else:
+                resultat = executer_script(self.script_path, self.venv_python,
+                                           fork_server=self.fork_server, on_line=self._publier_sortie)
+
+            if not resultat['stderr']:
+                self.log("\n" + "=" * 70)
+                self.log("✅ SUCCESS ! Le script fonctionne sans erreur !")
+                self.log(f"📊 Corrections appliquées: {self.total_corrections}")
+                self.log("=" * 70)
+                return True
+
+            # Analyse IA
+            self._changer_etape('analyse')
+            with span('lecture', fichier=os.path.basename(self.script_path)):
+                with open(self.script_path, 'r', encoding='utf-8') as f:
+                    code_source = f.read()
+
+            try:
+                if debugger is None:
+                    debugger = self.debugger_factory()
+                if resultat.get('erreurs'):
+                    corrections = debugger.analyze_errors(
+                        code=code_source,
+                        erreurs=resultat['erreurs'],
+                        filename=os.path.basename(self.script_path)
+                    )
+                else:
+                    corrections = debugger.analyze_error(
+                        code=code_source,
+                        error=resultat['stderr'],
+                        filename=os.path.basename(self.script_path)
+                    )
+            except Exception as e:
+                self.log(f"\n❌ Erreur API: {e}")
+                return False
+
+            if not corrections.get('corrections'):
+                self.log("\n⚠️  Aucune correction proposée")
+                return False
+
+            self.log(f"\nCorrection {self.total_corrections + 1} :")
+            for corr in corrections['corrections']:
+                self.log(f"  📍 Ligne: {corr.get('ligne')}")
+                self.log(f"  🔴 Type: {corrections.get('type_erreur', 'N/A')}")
+                self.log(f"  ❌ Code actuel: {corr.get('code_original', 'N/A')}")
+                self.log(f"  ✅ Code corrigé: {corr.get('code_corrige', 'N/A')}")
+
+            operations = corrections_vers_operations(corrections)
+            if not operations:
+                self.log("  ⚠️ Aucune opération valide")
+                return False
+
+            # Confirmation
+            if not self.auto_apply:
+                self._changer_etape('confirmation')
+                self.events.put({'type': 'confirmation', 'operations': operations})
+                if not self._decisions.get() or self._arret.is_set():
+                    break
+
+            # Patch
+            self._changer_etape('patch')
+            if not patcher.apply_patch(self.script_path, operations, create_backup=self.create_backup):
+                self.log("  ❌ Échec de l'application")
+                return False
+            self.log("  ✅ Appliqué")
+            self.total_corrections += 1
+
+        self.log("\n❌ Débogage annulé par l'utilisateur")
+        return False